@@ -0,0 +1,316 @@
+"""
+Respaldo y restauración completos de la base de datos en JSONL comprimido.
+
+Cada tabla mapeada en server.py se escribe en <directorio>/<tabla>.jsonl.gz,
+recorriéndola por keyset sobre la clave primaria con cursores del lado del
+servidor: la memoria usada no depende del tamaño de la base. Cada lote se
+escribe como un miembro gzip independiente y manifest.json guarda, por tabla,
+la última clave y el tamaño del archivo confirmado, así `--resume` retoma un
+respaldo interrumpido descartando lo escrito después del último checkpoint.
+
+La restauración crea el esquema e inserta las tablas en orden de foreign keys
+con INSERT multi-fila por lotes, cada lote en su propia transacción. Como los
+archivos se insertan en orden, `--resume` retoma contando las filas que ya
+están en cada tabla. Las referencias a la misma tabla (categorías padre) se
+cargan en una segunda pasada.
+
+Uso (desde backend/, con DATABASE_URL del entorno o del .env como server.py):
+    python backup.py dump /ruta/respaldo [--resume] [--batch-size 5000]
+    python backup.py restore /ruta/respaldo [--resume] [--replace]
+"""
+
+import argparse
+import base64
+import enum
+import gzip
+import json
+import logging
+import os
+import sys
+from datetime import datetime, date, time, timezone
+from decimal import Decimal
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+logging.disable(logging.INFO)
+# Sin precalentamiento del servidor: estos scripts no atienden requests
+os.environ.setdefault('STARTUP_WARMUP', 'false')
+
+from sqlalchemy import select, func, tuple_, bindparam, DateTime, Date, Time
+
+from server import Base, engine
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_FORMAT = 1
+DEFAULT_BATCH_SIZE = 5000
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def encode_row(row) -> bytes:
+    return json.dumps(dict(row), default=_encode_value, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def row_decoder(table):
+    """Convierte una línea del respaldo en parámetros de INSERT para `table`"""
+    converters = {}
+    for column in table.columns:
+        if isinstance(column.type, DateTime):
+            converters[column.name] = datetime.fromisoformat
+        elif isinstance(column.type, Date):
+            converters[column.name] = date.fromisoformat
+        elif isinstance(column.type, Time):
+            converters[column.name] = time.fromisoformat
+        else:
+            converters[column.name] = None
+
+    def decode(record: dict) -> dict:
+        row = {}
+        for name, convert in converters.items():
+            if name not in record:
+                continue
+            value = record[name]
+            if convert is not None and value is not None:
+                value = convert(value)
+            row[name] = value
+        return row
+    return decode
+
+
+def load_manifest(directory: Path) -> dict:
+    path = directory / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(directory: Path, manifest: dict):
+    """Escritura atómica: un corte a mitad nunca deja un manifest corrupto"""
+    path = directory / MANIFEST_NAME
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _primary_key(table):
+    columns = list(table.primary_key.columns)
+    if not columns:
+        raise SystemExit(f"La tabla {table.name} no tiene clave primaria; no se puede recorrer por keyset")
+    return columns
+
+
+def dump_table(conn, table, directory: Path, manifest: dict, batch_size: int):
+    state = manifest['tables'].setdefault(table.name, {'rows': 0, 'bytes': 0, 'last_key': None, 'done': False})
+    if state['done']:
+        print(f"  {table.name}: ya respaldada ({state['rows']} filas)", flush=True)
+        return
+
+    pk = _primary_key(table)
+    path = directory / f"{table.name}.jsonl.gz"
+    if not path.exists():
+        path.touch()
+
+    with open(path, 'r+b') as raw:
+        # Lo escrito después del último checkpoint pertenece a un lote no confirmado
+        raw.truncate(state['bytes'])
+        raw.seek(state['bytes'])
+        while True:
+            query = select(table).order_by(*pk).limit(batch_size)
+            if state['last_key'] is not None:
+                if len(pk) == 1:
+                    query = query.where(pk[0] > state['last_key'][0])
+                else:
+                    query = query.where(tuple_(*pk) > tuple(state['last_key']))
+
+            count = 0
+            last_row = None
+            with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as gz:
+                result = conn.execution_options(stream_results=True, yield_per=1000).execute(query)
+                for row in result.mappings():
+                    gz.write(encode_row(row))
+                    last_row = row
+                    count += 1
+            if count == 0:
+                # El miembro gzip vacío no aporta filas; se descarta para dejar el archivo limpio
+                raw.truncate(state['bytes'])
+                break
+
+            raw.flush()
+            os.fsync(raw.fileno())
+            state['rows'] += count
+            state['bytes'] = raw.tell()
+            state['last_key'] = [_encode_key(last_row[c.name]) for c in pk]
+            save_manifest(directory, manifest)
+            print(f"  {table.name}: {state['rows']} filas", flush=True)
+            if count < batch_size:
+                break
+
+    state['done'] = True
+    save_manifest(directory, manifest)
+
+
+def _encode_key(value):
+    return value if isinstance(value, (str, int, float)) or value is None else _encode_value(value)
+
+
+def dump(directory: Path, resume: bool, batch_size: int):
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(directory) if resume else {}
+    if not manifest:
+        if (directory / MANIFEST_NAME).exists() and not resume:
+            raise SystemExit(f"{directory} ya contiene un respaldo; use --resume o un directorio nuevo")
+        manifest = {
+            'format': MANIFEST_FORMAT,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'dialect': engine.dialect.name,
+            'order': [t.name for t in Base.metadata.sorted_tables],
+            'tables': {}
+        }
+        save_manifest(directory, manifest)
+
+    started = perf_counter()
+    # Una sola transacción: en InnoDB (REPEATABLE READ) todas las tablas se leen del mismo snapshot
+    with engine.connect() as conn, conn.begin():
+        for table in Base.metadata.sorted_tables:
+            dump_table(conn, table, directory, manifest, batch_size)
+
+    manifest['completed_at'] = datetime.now(timezone.utc).isoformat()
+    save_manifest(directory, manifest)
+    total = sum(t['rows'] for t in manifest['tables'].values())
+    print(f"Respaldo completo: {total} filas en {perf_counter() - started:.1f}s -> {directory}")
+
+
+def _insert_batch(table, rows: list):
+    with engine.begin() as conn:
+        conn.execute(table.insert(), rows)
+
+
+def restore_table(table, directory: Path, batch_size: int):
+    path = directory / f"{table.name}.jsonl.gz"
+    if not path.exists():
+        print(f"  {table.name}: sin archivo en el respaldo, se omite", flush=True)
+        return
+
+    with engine.connect() as conn:
+        already = conn.execute(select(func.count()).select_from(table)).scalar()
+    self_refs = [fk.parent.name for fk in table.foreign_keys if fk.column.table is table]
+    decode = row_decoder(table)
+
+    inserted = 0
+    batch = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for position, line in enumerate(f):
+            if position < already:
+                continue
+            row = decode(json.loads(line))
+            for name in self_refs:
+                row[name] = None
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _insert_batch(table, batch)
+                inserted += len(batch)
+                batch = []
+                print(f"  {table.name}: {already + inserted} filas", flush=True)
+    if batch:
+        _insert_batch(table, batch)
+        inserted += len(batch)
+    print(f"  {table.name}: {already + inserted} filas ({inserted} nuevas)", flush=True)
+
+    if self_refs:
+        restore_self_references(table, path, self_refs, batch_size)
+
+
+def restore_self_references(table, path: Path, self_refs: list, batch_size: int):
+    """Segunda pasada: asigna las columnas que apuntan a la misma tabla una vez que existen todas las filas"""
+    pk = _primary_key(table)
+    statement = table.update().where(*[c == bindparam(f'_pk_{c.name}') for c in pk]).values(
+        {name: bindparam(f'_ref_{name}') for name in self_refs}
+    )
+    batch = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if all(record.get(name) is None for name in self_refs):
+                continue
+            params = {f'_pk_{c.name}': record[c.name] for c in pk}
+            params.update({f'_ref_{name}': record.get(name) for name in self_refs})
+            batch.append(params)
+            if len(batch) >= batch_size:
+                with engine.begin() as conn:
+                    conn.execute(statement, batch)
+                batch = []
+    if batch:
+        with engine.begin() as conn:
+            conn.execute(statement, batch)
+
+
+def restore(directory: Path, resume: bool, replace: bool, batch_size: int):
+    manifest = load_manifest(directory)
+    if not manifest:
+        raise SystemExit(f"{directory} no contiene {MANIFEST_NAME}")
+    if manifest.get('format') != MANIFEST_FORMAT:
+        raise SystemExit(f"Formato de respaldo no soportado: {manifest.get('format')}")
+    if not manifest.get('completed_at'):
+        raise SystemExit("El respaldo está incompleto; termínelo con 'dump --resume' antes de restaurar")
+
+    Base.metadata.create_all(bind=engine)
+    tables = Base.metadata.sorted_tables
+
+    if replace:
+        with engine.begin() as conn:
+            for table in reversed(tables):
+                self_refs = [fk.parent.name for fk in table.foreign_keys if fk.column.table is table]
+                if self_refs:
+                    conn.execute(table.update().values({name: None for name in self_refs}))
+                conn.execute(table.delete())
+    elif not resume:
+        with engine.connect() as conn:
+            non_empty = [t.name for t in tables if conn.execute(select(func.count()).select_from(t)).scalar()]
+        if non_empty:
+            raise SystemExit(f"Tablas con datos en el destino: {', '.join(non_empty)}. Use --replace o --resume")
+
+    started = perf_counter()
+    for table in tables:
+        restore_table(table, directory, batch_size)
+    print(f"Restauración completa en {perf_counter() - started:.1f}s desde {directory}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Respaldo/restauración de TNA Office en JSONL comprimido")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    dump_parser = sub.add_parser('dump', help="Respaldar todas las tablas")
+    dump_parser.add_argument('directory', type=Path)
+    dump_parser.add_argument('--resume', action='store_true', help="Retomar un respaldo interrumpido")
+    dump_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    restore_parser = sub.add_parser('restore', help="Restaurar un respaldo en la base de DATABASE_URL")
+    restore_parser.add_argument('directory', type=Path)
+    restore_parser.add_argument('--resume', action='store_true', help="Retomar una restauración interrumpida")
+    restore_parser.add_argument('--replace', action='store_true', help="Borrar los datos actuales del destino antes de restaurar")
+    restore_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    args = parser.parse_args()
+    if args.command == 'dump':
+        dump(args.directory, args.resume, args.batch_size)
+    else:
+        restore(args.directory, args.resume, args.replace, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
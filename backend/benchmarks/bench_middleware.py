@@ -0,0 +1,182 @@
+"""
+Benchmark del stack de middleware HTTP.
+
+Compara el stack anterior (log_query_count con @app.middleware("http") y
+CORSErrorMiddleware, ambos sobre BaseHTTPMiddleware) con RequestContextMiddleware
+(ASGI puro), sobre la misma app mínima con CORSMiddleware. Las requests se
+despachan llamando la app ASGI directamente, sin servidor ni red, así que la
+diferencia es el costo propio del middleware.
+
+También verifica que una StreamingResponse llegue al cliente por partes: el
+primer bloque debe salir antes de que el generador termine.
+
+Uso (desde backend/):
+    python benchmarks/bench_middleware.py --requests 5000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+from time import perf_counter
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('STARTUP_WARMUP', 'false')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import logging
+logging.disable(logging.ERROR)
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+import server
+from server import RequestContextMiddleware, request_query_count, request_info, record_request_metrics, cors_origins
+
+ORIGIN = cors_origins[0] if cors_origins else 'http://localhost:3000'
+STREAM_CHUNKS = 5
+STREAM_DELAY = 0.02
+
+
+class LegacyCORSErrorMiddleware(BaseHTTPMiddleware):
+    """Copia de CORSErrorMiddleware antes del middleware ASGI puro"""
+    async def dispatch(self, request: Request, call_next):
+        try:
+            return await call_next(request)
+        except Exception:
+            response = JSONResponse(status_code=500, content={"detail": "Error interno del servidor"})
+            origin = request.headers.get("origin", "")
+            if origin in cors_origins:
+                response.headers["Access-Control-Allow-Origin"] = origin
+                response.headers["Access-Control-Allow-Credentials"] = "true"
+            return response
+
+
+async def legacy_log_query_count(request: Request, call_next):
+    """Copia de log_query_count antes del middleware ASGI puro"""
+    counter = [0, 0.0]
+    token = request_query_count.set(counter)
+    info_token = request_info.set({'method': request.method, 'scope': request.scope, 'user_id': None})
+    started = perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        request_query_count.reset(token)
+        request_info.reset(info_token)
+        record_request_metrics(request.scope, status_code, perf_counter() - started, counter)
+    server.logger.log(logging.INFO, f"{request.method} {request.url.path} -> {status_code} ({counter[0]} consultas SQL)")
+    return response
+
+
+def build_app(stack: str) -> FastAPI:
+    app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    @app.get("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(STREAM_CHUNKS):
+                yield f"fila {i}\n".encode()
+                await asyncio.sleep(STREAM_DELAY)
+        return StreamingResponse(chunks(), media_type='text/csv')
+
+    app.add_middleware(CORSMiddleware, allow_origins=cors_origins, allow_credentials=True,
+                       allow_methods=["*"], allow_headers=["*"], expose_headers=["*"])
+    if stack == 'anterior':
+        app.add_middleware(LegacyCORSErrorMiddleware)
+        app.middleware("http")(legacy_log_query_count)
+    elif stack == 'nuevo':
+        app.add_middleware(RequestContextMiddleware)
+    return app
+
+
+async def call(app, path: str):
+    """Despacha una request GET y retorna (status, [(segundos, bloque)], headers)"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+        'headers': [(b'host', b'bench'), (b'origin', ORIGIN.encode())],
+        'client': ('127.0.0.1', 1), 'server': ('bench', 80),
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Event().wait()
+        received = True
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    started = perf_counter()
+    result = {'status': None, 'headers': {}, 'chunks': []}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            result['status'] = message['status']
+            result['headers'] = {k.decode(): v.decode() for k, v in message['headers']}
+        elif message['type'] == 'http.response.body' and message.get('body'):
+            result['chunks'].append((perf_counter() - started, message['body']))
+
+    await app(scope, receive, send)
+    return result
+
+
+async def per_request_us(app, count: int, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        started = perf_counter()
+        for _ in range(count):
+            await call(app, '/ping')
+        elapsed = (perf_counter() - started) / count * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+async def main_async(args):
+    apps = {name: build_app(name) for name in ('sin middleware', 'anterior', 'nuevo')}
+    for app in apps.values():
+        await call(app, '/ping')
+
+    print(f"{'stack':<16} {'us/request':>11} {'overhead':>9}")
+    baseline = await per_request_us(apps['sin middleware'], args.requests, args.repeat)
+    print(f"{'sin middleware':<16} {baseline:>11.1f} {'-':>9}")
+    for name in ('anterior', 'nuevo'):
+        us = await per_request_us(apps[name], args.requests, args.repeat)
+        print(f"{name:<16} {us:>11.1f} {us - baseline:>8.1f}us")
+
+    print(f"\nStreaming ({STREAM_CHUNKS} bloques cada {STREAM_DELAY * 1000:.0f} ms) y error 500:")
+    for name in ('anterior', 'nuevo'):
+        streamed = await call(apps[name], '/stream')
+        times = [t for t, _ in streamed['chunks']]
+        error = await call(apps[name], '/boom')
+        print(f"  {name:<9} bloques={len(times)} primer bloque={times[0] * 1000:.1f} ms "
+              f"último={times[-1] * 1000:.1f} ms | /boom -> {error['status']} "
+              f"CORS={error['headers'].get('access-control-allow-origin', '-')}")
+
+    streamed = await call(apps['nuevo'], '/stream')
+    assert len(streamed['chunks']) == STREAM_CHUNKS, "la respuesta se envió en un solo bloque"
+    assert streamed['chunks'][0][0] < STREAM_DELAY * (STREAM_CHUNKS - 1), "el primer bloque esperó al generador completo"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark de serialización de /tickets y /bookings.
+
+Compara el camino anterior (db_to_dict genérico + jsonable_encoder de FastAPI +
+JSONResponse) con los serializadores precompilados + FastJSONResponse, sobre
+objetos ORM en memoria (no requiere base de datos).
+
+Uso (desde backend/):
+    python benchmarks/bench_serialization.py --tickets 2000 --items 5 --bookings 5000
+"""
+
+import argparse
+import enum
+import os
+import sys
+import uuid
+from datetime import datetime, date, time, timedelta
+from pathlib import Path
+from time import perf_counter
+
+# Solo se serializan objetos en memoria: una BD SQLite en memoria basta para importar server
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('STARTUP_WARMUP', 'false')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import logging
+logging.disable(logging.INFO)
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import server
+from server import TicketDB, TicketItemDB, BookingDB, FastJSONResponse, db_to_dict
+
+
+def legacy_db_to_dict(obj, exclude=None) -> dict:
+    """Copia de db_to_dict antes de los serializadores precompilados"""
+    if obj is None:
+        return None
+    exclude = exclude or []
+    result = {}
+    for column in obj.__table__.columns:
+        if column.name not in exclude:
+            value = getattr(obj, column.name)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif isinstance(value, date):
+                value = value.isoformat()
+            elif isinstance(value, time):
+                value = value.strftime("%H:%M")
+            elif isinstance(value, timedelta):
+                total_seconds = int(value.total_seconds())
+                hours, remainder = divmod(total_seconds, 3600)
+                minutes = remainder // 60
+                value = f"{hours:02d}:{minutes:02d}"
+            elif isinstance(value, enum.Enum):
+                value = value.value
+            result[column.name] = value
+    return result
+
+
+def build_tickets(count: int, items_per_ticket: int) -> list:
+    now = datetime(2026, 1, 1, 9, 0)
+    tickets = []
+    for i in range(count):
+        ticket = TicketDB(
+            id=str(uuid.uuid4()), ticket_number=i + 1, client_name=f"Cliente {i}",
+            client_email=f"cliente{i}@example.cl", ticket_date=now + timedelta(minutes=i),
+            subtotal=0.0, tax=0.0, total_amount=1000.0 * items_per_ticket, total_commission=50.0,
+            payment_status='pending', commission_status='pending', status='pending',
+            notes='', created_at=now + timedelta(minutes=i)
+        )
+        ticket.items = [
+            TicketItemDB(
+                id=str(uuid.uuid4()), ticket_id=ticket.id, product_id=None, product_name=f"Producto {j}",
+                category='Cafetería', quantity=1, unit_price=1000.0, subtotal=1000.0,
+                commission_percentage=5.0, commission_amount=50.0, created_at=now
+            )
+            for j in range(items_per_ticket)
+        ]
+        tickets.append(ticket)
+    return tickets
+
+
+def build_bookings(count: int) -> list:
+    start_day = date(2024, 1, 1)
+    return [
+        BookingDB(
+            id=str(uuid.uuid4()), resource_type='room', resource_id=str(uuid.uuid4()),
+            resource_name='Sala 1', client_name=f"Cliente {i}", client_email=f"c{i}@example.cl",
+            date=start_day + timedelta(days=i % 900), start_time=time(9 + i % 8, 0),
+            end_time=time(10 + i % 8, 0), duration_hours=1.0, total_price=15000.0,
+            status='confirmed', created_at=datetime(2024, 1, 1)
+        )
+        for i in range(count)
+    ]
+
+
+def tickets_payload(tickets, to_dict):
+    result = []
+    for ticket in tickets:
+        ticket_dict = to_dict(ticket)
+        ticket_dict['items'] = [to_dict(item) for item in ticket.items]
+        result.append(ticket_dict)
+    return result
+
+
+def bookings_payload(bookings, to_dict):
+    result = []
+    for b in bookings:
+        booking_dict = to_dict(b)
+        if b.date and b.start_time:
+            booking_dict['start_datetime'] = f"{b.date.isoformat()}T{b.start_time.strftime('%H:%M:%S')}"
+        if b.date and b.end_time:
+            booking_dict['end_datetime'] = f"{b.date.isoformat()}T{b.end_time.strftime('%H:%M:%S')}"
+        result.append(booking_dict)
+    return result
+
+
+def legacy_render(payload) -> bytes:
+    # Lo que hace FastAPI cuando el endpoint retorna una lista de dicts
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def fast_render(payload) -> bytes:
+    return FastJSONResponse(payload).body
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        fn()
+        timings.append(perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickets', type=int, default=2000)
+    parser.add_argument('--items', type=int, default=5)
+    parser.add_argument('--bookings', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tickets = build_tickets(args.tickets, args.items)
+    bookings = build_bookings(args.bookings)
+
+    cases = [
+        ("/tickets", lambda f: tickets_payload(tickets, f)),
+        ("/bookings", lambda f: bookings_payload(bookings, f)),
+    ]
+    print(f"orjson: {'sí' if server.orjson is not None else 'no'}")
+    print(f"{'endpoint':<10} {'anterior (ms)':>14} {'nuevo (ms)':>11} {'mejora':>8}")
+    for name, payload in cases:
+        assert legacy_render(payload(legacy_db_to_dict)) == JSONResponse(payload(db_to_dict)).body
+        before = best_of(lambda: legacy_render(payload(legacy_db_to_dict)), args.repeat)
+        after = best_of(lambda: fast_render(payload(db_to_dict)), args.repeat)
+        print(f"{name:<10} {before * 1000:>14.1f} {after * 1000:>11.1f} {before / after:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
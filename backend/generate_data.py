@@ -0,0 +1,591 @@
+"""
+Generador de datos sintéticos para pruebas de rendimiento.
+
+Llena todas las tablas de server.py con datos realistas y consistentes entre
+sí, a la escala pedida: clientes con contactos y documentos de contrato,
+oficinas ocupadas con contratos vigentes y vencidos, estacionamientos y
+bodegas, reservas de salas y cabinas repartidas en varios años sin choques de
+horario, tickets con items y comisionistas (con su ledger de stock),
+solicitudes, cotizaciones, ventas y facturas.
+
+Todo es determinista: la misma semilla, escala y fecha de referencia (--today,
+por defecto hoy) producen exactamente las mismas filas (ids incluidos), así
+cada prueba de rendimiento parte del mismo estado. Las filas se generan por lotes y se insertan con INSERT multi-fila,
+sin pasar por el ORM, con memoria acotada.
+
+El usuario admin@tnaoffice.cl / admin123 queda creado igual que con /seed; los
+comisionistas usan la contraseña comisionista123.
+
+Uso (desde backend/, con DATABASE_URL del entorno o del .env como server.py):
+    python generate_data.py --scale 100000
+    python generate_data.py --clients 20000 --bookings 500000 --tickets 1000000 --replace
+"""
+
+import argparse
+import logging
+import math
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, date, time, timedelta
+from pathlib import Path
+from typing import Optional
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+logging.disable(logging.INFO)
+# Sin precalentamiento del servidor: estos scripts no atienden requests
+os.environ.setdefault('STARTUP_WARMUP', 'false')
+
+import bcrypt
+from sqlalchemy import select, func, text, update, bindparam
+
+from server import (
+    Base, engine, BCRYPT_ROUNDS, product_is_low_stock, AVAILABLE_MODULES,
+    ProfileDB, UserDB, CategoryDB, ProductDB, ClientDB, ClientDocumentDB, ClientContactDB, OfficeDB,
+    ParkingStorageDB, RoomDB, BoothDB, BookingDB, MonthlyServiceCatalogDB, MonthlyServiceDB, TicketDB,
+    TicketItemDB, StockMovementDB, RequestDB, QuoteDB, QuoteTemplateDB, SaleDB, FloorPlanCoordinateDB, InvoiceDB
+)
+
+DEFAULT_SEED = 1
+DEFAULT_BATCH_SIZE = 5000
+BOOKING_HOURS = range(8, 20)
+# Las salas se dimensionan para que la ocupación no supere este porcentaje de los bloques de una hora
+MAX_ROOM_OCCUPANCY = 0.5
+
+FIRST_NAMES = ['José', 'María', 'Juan', 'Ana', 'Pedro', 'Camila', 'Diego', 'Valentina', 'Luis', 'Francisca',
+               'Carlos', 'Javiera', 'Felipe', 'Constanza', 'Matías', 'Catalina', 'Sebastián', 'Fernanda',
+               'Tomás', 'Daniela', 'Nicolás', 'Paula', 'Ignacio', 'Carolina', 'Andrés', 'Isidora']
+LAST_NAMES = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez',
+              'Sepúlveda', 'Morales', 'Rodríguez', 'López', 'Fuentes', 'Hernández', 'Torres', 'Araya',
+              'Flores', 'Espinoza', 'Valenzuela', 'Castillo', 'Tapia', 'Reyes', 'Gutiérrez', 'Castro']
+COMPANY_WORDS = ['Constructora', 'Inversiones', 'Comercial', 'Servicios', 'Asesorías', 'Inmobiliaria',
+                 'Transportes', 'Consultora', 'Tecnologías', 'Ingeniería', 'Distribuidora', 'Logística']
+COMPANY_SUFFIXES = ['SpA', 'Ltda', 'Limitada', 'S.A.', 'EIRL']
+BUSINESS_TYPES = ['Tecnología', 'Construcción', 'Legal', 'Contabilidad', 'Marketing', 'Salud', 'Educación', 'Retail']
+POSITIONS = ['Gerente General', 'Administración', 'Finanzas', 'Operaciones', 'Recepción', 'Socio']
+CATALOG = {
+    'Cafetería': ['Café Americano', 'Café Cortado', 'Capuccino', 'Té', 'Agua Mineral', 'Jugo Natural'],
+    'Snacks': ['Sándwich', 'Galletas', 'Barra de Cereal', 'Ensalada', 'Empanada'],
+    'Impresiones': ['Impresión B/N', 'Impresión Color', 'Escaneo', 'Anillado', 'Plastificado'],
+    'Servicios': ['Recepción de Correspondencia', 'Domicilio Tributario', 'Uso de Locker', 'Estacionamiento Visita'],
+    'Eventos': ['Coffee Break', 'Arriendo Proyector', 'Catering Básico', 'Catering Premium'],
+}
+MONTHLY_SERVICES = [('Internet Dedicado', 'Conectividad', 1.5), ('Telefonía IP', 'Conectividad', 0.8),
+                    ('Aseo Oficina', 'Mantención', 1.2), ('Domicilio Tributario', 'Legal', 0.9),
+                    ('Recepción de Llamadas', 'Secretaría', 1.0), ('Locker', 'Almacenamiento', 0.4)]
+
+
+class Generator:
+    """Fuente de datos reproducible (ids, nombres, fechas) a partir de una semilla"""
+
+    def __init__(self, seed: int, today: date):
+        self.rng = random.Random(seed)
+        self.today = today
+        self.now = datetime.combine(today, time(12, 0))
+
+    def id(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def person(self) -> str:
+        return f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+
+    def company(self) -> str:
+        rng = self.rng
+        return f"{rng.choice(COMPANY_WORDS)} {rng.choice(LAST_NAMES)} {rng.choice(COMPANY_SUFFIXES)}"
+
+    def rut(self, number: int) -> str:
+        body = 76_000_000 + number
+        # Dígito verificador módulo 11, como en un RUT real
+        total, factor = 0, 2
+        for digit in reversed(str(body)):
+            total += int(digit) * factor
+            factor = 2 if factor == 7 else factor + 1
+        check = 11 - total % 11
+        return f"{body:,}".replace(',', '.') + '-' + {10: 'K', 11: '0'}.get(check, str(check))
+
+    def password_hash(self, password: str) -> str:
+        """Hash bcrypt como get_password_hash, pero con sal derivada de la semilla"""
+        alphabet = './ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+        # El último carácter de la sal solo aporta 2 bits: debe ser uno de '.Oeu'
+        salt = ''.join(self.rng.choice(alphabet) for _ in range(21)) + self.rng.choice('.Oeu')
+        return bcrypt.hashpw(password.encode('utf-8'), f"$2b${BCRYPT_ROUNDS:02d}${salt}".encode()).decode('utf-8')
+
+    def phone(self) -> str:
+        return f"+569{self.rng.randint(10_000_000, 99_999_999)}"
+
+    def email(self, name: str, domain: str) -> str:
+        local = name.lower().translate(str.maketrans('áéíóúñ ', 'aeioun.'))
+        return f"{local}@{domain}"
+
+    def moment(self, days_back: int, days_forward: int = 0) -> datetime:
+        """Instante al azar entre hace days_back días y dentro de days_forward días (horario hábil)"""
+        day = self.today + timedelta(days=self.rng.randint(-days_back, days_forward))
+        return datetime.combine(day, time(self.rng.randint(8, 19), self.rng.randint(0, 59), self.rng.randint(0, 59)))
+
+
+class Loader:
+    """Inserta filas por lotes en una conexión, confirmando cada lote"""
+
+    def __init__(self, conn, batch_size: int):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.counts = {}
+
+    def load(self, model, rows):
+        table = model.__table__
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._flush(table, batch)
+                batch = []
+        if batch:
+            self._flush(table, batch)
+        print(f"  {table.name}: {self.counts.get(table.name, 0)} filas", flush=True)
+
+    def _flush(self, table, batch: list):
+        self.conn.execute(table.insert(), batch)
+        self.conn.commit()
+        self.counts[table.name] = self.counts.get(table.name, 0) + len(batch)
+
+
+def generate(conn, scale: dict, seed: int, today: date, years: int, batch_size: int):
+    g = Generator(seed, today)
+    rng = g.rng
+    loader = Loader(conn, batch_size)
+    history_days = 365 * years
+    now = g.now
+
+    # --- Perfiles y usuarios ---
+    admin_profile_id, receptionist_profile_id = g.id(), g.id()
+    loader.load(ProfileDB, [
+        {'id': admin_profile_id, 'name': 'ADMIN', 'description': 'Administrador con acceso total',
+         'allowed_modules': AVAILABLE_MODULES, 'is_system': True, 'created_at': now},
+        {'id': receptionist_profile_id, 'name': 'Recepcionista', 'description': 'Acceso a módulos de atención',
+         'allowed_modules': ['dashboard', 'resources', 'requests', 'tickets', 'clients'], 'is_system': False,
+         'created_at': now},
+    ])
+    admin_id = g.id()
+    users = [{'id': admin_id, 'email': 'admin@tnaoffice.cl', 'password': g.password_hash('admin123'),
+              'name': 'Administrador', 'role': 'admin', 'profile_id': admin_profile_id, 'commission_percentage': 0.0,
+              'is_active': True, 'created_at': now - timedelta(days=history_days)}]
+    staff_ids = [admin_id]
+    comisionista_hash = g.password_hash('comisionista123')
+    comisionistas = []
+    for i in range(scale['comisionistas']):
+        name = g.person()
+        user = {'id': g.id(), 'email': g.email(f"{name} {i}", 'tnaoffice.cl'), 'password': comisionista_hash,
+                'name': name, 'role': 'comisionista', 'profile_id': None,
+                'commission_percentage': rng.choice([5.0, 7.5, 10.0, 12.0]), 'is_active': rng.random() > 0.1,
+                'created_at': g.moment(history_days)}
+        users.append(user)
+        comisionistas.append(user)
+    for i in range(3):
+        name = g.person()
+        users.append({'id': g.id(), 'email': g.email(f"{name} {i}", 'tnaoffice.cl'), 'password': comisionista_hash,
+                      'name': name, 'role': 'cliente', 'profile_id': receptionist_profile_id,
+                      'commission_percentage': 0.0, 'is_active': True, 'created_at': g.moment(history_days)})
+        staff_ids.append(users[-1]['id'])
+    loader.load(UserDB, users)
+
+    # --- Categorías (con subcategorías) y productos ---
+    categories, products = [], []
+    for name, product_names in CATALOG.items():
+        parent_id = g.id()
+        categories.append({'id': parent_id, 'name': name, 'description': f"Productos de {name.lower()}",
+                           'parent_id': None, 'is_active': True, 'created_at': now})
+        for product_name in product_names:
+            cost = float(rng.randint(3, 60) * 100)
+            products.append({
+                'id': g.id(), 'name': product_name, 'description': '', 'category_id': parent_id, 'category': name,
+                'base_price': cost * 1.3, 'sale_price': round(cost * rng.uniform(1.5, 2.5), -1), 'cost': cost,
+                'unit': 'unidad', 'is_active': True, 'created_at': now - timedelta(days=history_days),
+                'commission_percentage': rng.choice([0.0, 5.0, 10.0]), 'min_order': 1, 'provider': '',
+                'image_url': '', 'featured': rng.random() < 0.2, 'featured_text': '',
+                'stock_control_enabled': name in ('Cafetería', 'Snacks'), 'current_stock': 0,
+                'min_stock_alert': 10, 'low_stock': False
+            })
+    for name in ('Bebidas Frías', 'Bebidas Calientes'):
+        categories.append({'id': g.id(), 'name': name, 'description': '', 'parent_id': categories[0]['id'],
+                           'is_active': True, 'created_at': now})
+    loader.load(CategoryDB, categories)
+    loader.load(ProductDB, products)
+
+    # --- Clientes, contactos y documentos ---
+    client_names = []
+    client_ids = []
+
+    def clients():
+        for i in range(scale['clients']):
+            name = g.company()
+            contact = g.person()
+            domain = f"empresa{i}.cl"
+            client_ids.append(g.id())
+            client_names.append(name)
+            yield {'id': client_ids[-1], 'company_name': name, 'rut': g.rut(i), 'business_type': rng.choice(BUSINESS_TYPES),
+                   'address': f"Av. Providencia {rng.randint(100, 3999)}, oficina {rng.randint(100, 1999)}",
+                   'phone': g.phone(), 'email': f"contacto@{domain}", 'contact_name': contact, 'contact_phone': g.phone(),
+                   'contact_email': g.email(contact, domain), 'notes': None, 'is_active': rng.random() > 0.05,
+                   'created_at': g.moment(history_days)}
+    loader.load(ClientDB, clients())
+
+    def contacts():
+        for i, client_id in enumerate(client_ids):
+            for j in range(rng.choice((1, 1, 2, 3))):
+                name = g.person()
+                yield {'id': g.id(), 'client_id': client_id, 'name': name, 'position': rng.choice(POSITIONS),
+                       'phone': g.phone(), 'email': g.email(name, f"empresa{i}.cl"), 'is_primary': j == 0,
+                       'created_at': now}
+    loader.load(ClientContactDB, contacts())
+
+    def documents():
+        for i, client_id in enumerate(client_ids):
+            if rng.random() > 0.3:
+                continue
+            start = g.today - timedelta(days=rng.randint(30, history_days))
+            end = start + timedelta(days=rng.choice((180, 365, 730)))
+            yield {'id': g.id(), 'client_id': client_id, 'name': f"Contrato {client_names[i]}", 'file_url': None,
+                   'document_type': 'contrato', 'expiry_date': end, 'notifications_enabled': rng.random() < 0.7,
+                   'notification_days': rng.choice((15, 30, 60)), 'contract_start_date': start,
+                   'contract_end_date': end, 'notes': None, 'created_at': datetime.combine(start, time(10, 0))}
+    loader.load(ClientDocumentDB, documents())
+
+    # --- Oficinas, plano, estacionamientos y bodegas (ocupados por clientes distintos) ---
+    tenants = rng.sample(range(len(client_ids)), min(len(client_ids), scale['offices'] + scale['parking']))
+    offices = []
+    for i in range(scale['offices']):
+        floor = 1 + i // 20
+        occupied = i < len(tenants) and rng.random() < 0.75
+        start = g.today - timedelta(days=rng.randint(0, history_days)) if occupied else None
+        billed = round(rng.uniform(8, 40), 1) if occupied else 0.0
+        cost = round(billed * rng.uniform(0.4, 0.7), 1) if occupied else round(rng.uniform(4, 15), 1)
+        offices.append({
+            'id': g.id(), 'office_number': f"{floor}{i % 20 + 1:02d}", 'floor': floor, 'location': f"Piso {floor}",
+            'square_meters': float(rng.choice((12, 18, 24, 36, 48))), 'capacity': rng.choice((2, 4, 6, 8)),
+            'status': 'occupied' if occupied else rng.choice(('available', 'available', 'maintenance')),
+            'client_id': client_ids[tenants[i]] if occupied else None, 'sale_value_uf': round(billed * 1.1, 1),
+            'billed_value_uf': billed, 'cost_uf': cost, 'cost_difference_uf': round(billed - cost, 1),
+            'contract_start': start, 'contract_end': start + timedelta(days=rng.choice((365, 730))) if occupied else None,
+            'notes': None, 'created_at': datetime.combine(g.today - timedelta(days=history_days), time(9, 0))
+        })
+    loader.load(OfficeDB, offices)
+    loader.load(FloorPlanCoordinateDB, (
+        {'id': g.id(), 'office_id': office['id'], 'office_number': office['office_number'],
+         'x': float(60 * (i % 20)), 'y': float(80 * (i // 20 % 10)), 'width': 55.0, 'height': 75.0, 'created_at': now}
+        for i, office in enumerate(offices)
+    ))
+
+    def parking():
+        for i in range(scale['parking']):
+            kind = 'parking' if i % 2 == 0 else 'storage'
+            tenant = scale['offices'] + i
+            occupied = tenant < len(tenants) and rng.random() < 0.6
+            billed = round(rng.uniform(1, 4), 1) if occupied else 0.0
+            yield {'id': g.id(), 'number': f"{'E' if kind == 'parking' else 'B'}-{i + 1:03d}", 'type': kind,
+                   'location': f"Subterráneo -{1 + i % 3}", 'status': 'occupied' if occupied else 'available',
+                   'client_id': client_ids[tenants[tenant]] if occupied else None, 'sale_value_uf': round(billed * 1.1, 1),
+                   'billed_value_uf': billed, 'cost_uf': round(billed * 0.5, 1), 'notes': None, 'created_at': now}
+    loader.load(ParkingStorageDB, parking())
+
+    catalog = [{'id': g.id(), 'name': name, 'description': '', 'category': category, 'base_price_uf': price,
+                'sale_value_uf': round(price * 1.2, 2), 'is_active': True, 'created_at': now}
+               for name, category, price in MONTHLY_SERVICES]
+    loader.load(MonthlyServiceCatalogDB, catalog)
+    loader.load(MonthlyServiceDB, (
+        {'id': g.id(), 'service_name': service['name'], 'category': service['category'], 'client_id': office['client_id'],
+         'sale_value_uf': service['sale_value_uf'], 'billed_value_uf': service['sale_value_uf'],
+         'cost_uf': service['base_price_uf'], 'status': rng.choice(('active', 'active', 'active', 'suspended')),
+         'start_date': office['contract_start'], 'notes': None, 'created_at': now}
+        for office in offices if office['client_id']
+        for service in rng.sample(catalog, rng.randint(0, 3))
+    ))
+
+    # --- Salas, cabinas y reservas (un bloque de una hora por reserva, sin choques) ---
+    future_days = 60
+    days = history_days + future_days
+    slots_per_resource = days * len(BOOKING_HOURS)
+    resource_count = max(10, math.ceil(scale['bookings'] / (slots_per_resource * MAX_ROOM_OCCUPANCY)))
+    rooms, booths = [], []
+    for i in range(resource_count):
+        if i % 5 < 3:
+            capacity = rng.choice((4, 6, 8, 12, 20))
+            rooms.append({'id': g.id(), 'name': f"Sala {len(rooms) + 1}", 'capacity': capacity,
+                          'hourly_rate': 2500.0 * capacity, 'half_day_rate': 10000.0 * capacity,
+                          'full_day_rate': 18000.0 * capacity, 'amenities': ['Proyector', 'Pizarra', 'WiFi'][:rng.randint(1, 3)],
+                          'color': f"#{rng.randint(0, 0xFFFFFF):06x}", 'status': 'active', 'blocks_rooms': [],
+                          'related_rooms': [], 'image_url': '', 'description': '', 'created_at': now})
+        else:
+            booths.append({'id': g.id(), 'name': f"Cabina {len(booths) + 1}", 'capacity': 1, 'hourly_rate': 5000.0,
+                           'half_day_rate': 18000.0, 'full_day_rate': 30000.0, 'color': f"#{rng.randint(0, 0xFFFFFF):06x}",
+                           'status': 'active', 'image_url': '', 'description': '', 'created_at': now})
+    loader.load(RoomDB, rooms)
+    loader.load(BoothDB, booths)
+    resources = [('room', r['id'], r['name'], r['hourly_rate']) for r in rooms] + \
+                [('booth', b['id'], b['name'], b['hourly_rate']) for b in booths]
+    first_day = g.today - timedelta(days=history_days)
+
+    def bookings():
+        slots = rng.sample(range(slots_per_resource * len(resources)), scale['bookings'])
+        slots.sort()
+        for slot in slots:
+            resource_index, rest = divmod(slot, slots_per_resource)
+            day_offset, hour_index = divmod(rest, len(BOOKING_HOURS))
+            resource_type, resource_id, resource_name, rate = resources[resource_index]
+            day = first_day + timedelta(days=day_offset)
+            hour = BOOKING_HOURS[hour_index]
+            client_index = rng.randrange(len(client_ids))
+            if rng.random() < 0.1:
+                status = 'cancelled'
+            elif day < g.today:
+                status = 'completed' if rng.random() < 0.7 else 'confirmed'
+            else:
+                status = 'confirmed' if rng.random() < 0.8 else 'pending'
+            yield {'id': g.id(), 'resource_type': resource_type, 'resource_id': resource_id,
+                   'resource_name': resource_name, 'client_id': client_ids[client_index],
+                   'client_name': client_names[client_index], 'client_email': f"contacto@empresa{client_index}.cl",
+                   'client_phone': None, 'date': day, 'start_time': time(hour, 0), 'end_time': time(hour + 1, 0),
+                   'duration_hours': 1.0, 'total_price': rate, 'status': status, 'notes': None,
+                   'created_by': rng.choice(staff_ids),
+                   'created_at': datetime.combine(day - timedelta(days=rng.randint(0, 14)), time(rng.randint(8, 19), 0))}
+    loader.load(BookingDB, bookings())
+
+    # --- Tickets con items, comisiones y ledger de stock ---
+    stocked = {p['id']: p for p in products if p['stock_control_enabled']}
+    sold = dict.fromkeys(stocked, 0)
+    items, movements = [], []
+
+    def tickets():
+        ticket_dates = sorted(g.moment(history_days) for _ in range(scale['tickets']))
+        for number, ticket_date in enumerate(ticket_dates, start=1):
+            ticket_id = g.id()
+            comisionista = rng.choice(comisionistas) if comisionistas and rng.random() < 0.3 else None
+            client_index = rng.randrange(len(client_ids)) if rng.random() < 0.6 else None
+            total = commission = 0.0
+            for product in rng.sample(products, rng.choice((1, 1, 2, 2, 3, 4))):
+                quantity = rng.choice((1, 1, 1, 2, 3))
+                subtotal = product['sale_price'] * quantity
+                percentage = (product['commission_percentage'] or comisionista['commission_percentage']) if comisionista else 0.0
+                amount = round(subtotal * percentage / 100, 2)
+                total += subtotal
+                commission += amount
+                items.append({'id': g.id(), 'ticket_id': ticket_id, 'product_id': product['id'],
+                              'product_name': product['name'], 'category': product['category'], 'description': None,
+                              'quantity': quantity, 'unit_price': product['sale_price'], 'subtotal': subtotal,
+                              'commission_percentage': percentage, 'commission_amount': amount, 'created_at': ticket_date})
+                if product['id'] in stocked:
+                    sold[product['id']] += quantity
+                    movements.append({'id': g.id(), 'product_id': product['id'], 'quantity': -quantity,
+                                      'reason': 'ticket', 'reference_id': ticket_id, 'notes': None,
+                                      'created_by': admin_id, 'created_at': ticket_date})
+            age_days = (g.now - ticket_date).days
+            paid = age_days > 7 or rng.random() < 0.5
+            commission_paid = comisionista is not None and age_days > 30
+            yield {
+                'id': ticket_id, 'ticket_number': number,
+                'client_id': client_ids[client_index] if client_index is not None else None,
+                'client_name': client_names[client_index] if client_index is not None else g.person(),
+                'client_email': f"contacto@empresa{client_index}.cl" if client_index is not None else None,
+                'ticket_date': ticket_date, 'subtotal': total, 'tax': 0.0, 'total_amount': total,
+                'total_commission': commission, 'comisionista_id': comisionista['id'] if comisionista else None,
+                'comisionista_name': comisionista['name'] if comisionista else None,
+                'payment_status': 'paid' if paid else 'pending',
+                'payment_method': rng.choice(('efectivo', 'tarjeta', 'transferencia')) if paid else None,
+                'payment_date': ticket_date if paid else None,
+                'commission_status': 'paid' if commission_paid else 'pending',
+                'commission_paid_date': ticket_date + timedelta(days=30) if commission_paid else None,
+                'status': 'completed' if paid else 'pending', 'notes': None, 'created_by': admin_id,
+                'created_at': ticket_date
+            }
+
+    def flush_children():
+        loader.load(TicketItemDB, items)
+        loader.load(StockMovementDB, movements)
+        items.clear()
+        movements.clear()
+
+    # Los items se cargan después de cada bloque de tickets para respetar la foreign key
+    ticket_rows = tickets()
+    while True:
+        block = [row for _, row in zip(range(batch_size * 10), ticket_rows)]
+        if not block:
+            break
+        loader.load(TicketDB, block)
+        flush_children()
+
+    # Stock inicial = vendido + remanente; algunos quedan bajo el mínimo para /products/low-stock
+    start_moment = datetime.combine(first_day, time(8, 0))
+    initial, stock_updates = [], []
+    for product_id, product in stocked.items():
+        remaining = rng.choice((0, 3, 25, 80, 200))
+        initial.append({'id': g.id(), 'product_id': product_id, 'quantity': sold[product_id] + remaining,
+                        'reason': 'initial', 'reference_id': None, 'notes': 'Stock inicial', 'created_by': admin_id,
+                        'created_at': start_moment})
+        product.update(current_stock=remaining)
+        stock_updates.append({'_id': product_id, 'current_stock': remaining,
+                              'low_stock': product_is_low_stock(ProductDB(**product))})
+    loader.load(StockMovementDB, initial)
+    if stock_updates:
+        products_table = ProductDB.__table__
+        conn.execute(
+            update(products_table).where(products_table.c.id == bindparam('_id')).values(
+                current_stock=bindparam('current_stock'), low_stock=bindparam('low_stock')),
+            stock_updates
+        )
+        conn.commit()
+
+    # --- Ventas (módulo antiguo) y facturas ---
+    sales_by_client = {}
+
+    def sales():
+        for _ in range(scale['sales']):
+            client_index = rng.randrange(len(client_ids))
+            product = rng.choice(products)
+            quantity = rng.randint(1, 5)
+            comisionista = rng.choice(comisionistas) if comisionistas and rng.random() < 0.3 else None
+            percentage = comisionista['commission_percentage'] if comisionista else 0.0
+            total = product['sale_price'] * quantity
+            sale = {'id': g.id(), 'ticket_id': None, 'product_id': product['id'], 'product_name': product['name'],
+                    'category': product['category'], 'quantity': quantity, 'unit_price': product['sale_price'],
+                    'total_amount': total, 'sale_date': g.moment(history_days).date(),
+                    'client_id': client_ids[client_index], 'client_name': client_names[client_index],
+                    'client_email': f"contacto@empresa{client_index}.cl",
+                    'comisionista_id': comisionista['id'] if comisionista else None,
+                    'comisionista_name': comisionista['name'] if comisionista else None,
+                    'commission_percentage': percentage, 'commission_amount': round(total * percentage / 100, 2),
+                    'payment_status': rng.choice(('pending', 'paid')), 'commission_status': 'pending', 'notes': None,
+                    'created_by': admin_id, 'created_at': now}
+            sales_by_client.setdefault(client_index, []).append(sale)
+            yield sale
+    loader.load(SaleDB, sales())
+
+    def invoices():
+        for number, (client_index, client_sales) in enumerate(sorted(sales_by_client.items())[:scale['invoices']], start=1):
+            subtotal = sum(s['total_amount'] for s in client_sales)
+            issue = max(s['sale_date'] for s in client_sales)
+            invoiced = rng.random() < 0.6
+            yield {'id': g.id(), 'invoice_number': f"F-{number:06d}", 'ticket_id': None,
+                   'client_id': client_ids[client_index], 'client_name': client_names[client_index],
+                   'items': [{'product_name': s['product_name'], 'quantity': s['quantity'], 'total': s['total_amount']}
+                             for s in client_sales],
+                   'sales_ids': [s['id'] for s in client_sales], 'issue_date': issue, 'due_date': issue + timedelta(days=30),
+                   'subtotal': subtotal, 'tax': round(subtotal * 0.19, 2), 'total_amount': round(subtotal * 1.19, 2),
+                   'status': 'invoiced' if invoiced else rng.choice(('draft', 'pending', 'sent')),
+                   'invoiced_at': datetime.combine(issue, time(17, 0)) if invoiced else None, 'notes': None,
+                   'created_at': datetime.combine(issue, time(16, 0))}
+    loader.load(InvoiceDB, invoices())
+
+    # --- Solicitudes web, plantillas y cotizaciones ---
+    def requests():
+        for number in range(1, scale['requests'] + 1):
+            name = g.person()
+            company = g.company()
+            created = g.moment(history_days)
+            status = 'new' if (g.now - created).days < 14 and rng.random() < 0.5 else \
+                rng.choice(('pending', 'in_progress', 'completed', 'completed', 'cancelled'))
+            email = g.email(name, 'correo.cl')
+            yield {'id': g.id(), 'request_number': number, 'type': rng.choice(('contact', 'contact', 'quote', 'visit')),
+                   'name': name, 'client_name': name, 'client_email': email, 'email': email, 'client_phone': g.phone(),
+                   'phone': None, 'company': company, 'company_name': company,
+                   'message': f"Hola, me interesa arrendar una oficina para {rng.randint(1, 12)} personas.",
+                   'request_type': rng.choice(('oficina', 'sala', 'domicilio')), 'description': None,
+                   'source': rng.choice(('web', 'web', 'telefono', 'referido')), 'status': status,
+                   'priority': rng.choice(('low', 'medium', 'medium', 'high')),
+                   'assigned_to': rng.choice(staff_ids) if status != 'new' else None, 'notes': None, 'details': {},
+                   'created_at': created, 'updated_at': created}
+    loader.load(RequestDB, requests())
+
+    loader.load(QuoteTemplateDB, [
+        {'id': g.id(), 'name': 'Cotización Oficina', 'content': 'Estimado/a {{client_name}}, ...',
+         'variables': ['client_name', 'total'], 'is_default': True, 'created_at': now},
+        {'id': g.id(), 'name': 'Cotización Sala de Reuniones', 'content': 'Estimado/a {{client_name}}, ...',
+         'variables': ['client_name', 'total'], 'is_default': False, 'created_at': now},
+    ])
+
+    def quotes():
+        for number in range(1, scale['quotes'] + 1):
+            client_index = rng.randrange(len(client_ids))
+            lines = [{'description': p['name'], 'quantity': rng.randint(1, 10), 'unit_price': p['sale_price']}
+                     for p in rng.sample(products, rng.randint(1, 4))]
+            subtotal = sum(line['quantity'] * line['unit_price'] for line in lines)
+            created = g.moment(history_days)
+            yield {'id': g.id(), 'quote_number': number, 'client_id': client_ids[client_index],
+                   'client_name': client_names[client_index], 'client_email': f"contacto@empresa{client_index}.cl",
+                   'client_phone': None, 'company_name': client_names[client_index], 'items': lines,
+                   'subtotal': subtotal, 'tax': round(subtotal * 0.19, 2), 'total': round(subtotal * 1.19, 2),
+                   'status': rng.choice(('draft', 'pre-cotizacion', 'sent', 'sent', 'accepted', 'rejected', 'expired')),
+                   'valid_until': created.date() + timedelta(days=30), 'notes': None, 'created_by': admin_id,
+                   'created_at': created}
+    loader.load(QuoteDB, quotes())
+
+    return loader.counts
+
+
+def load(plan: dict, seed: int = DEFAULT_SEED, today: Optional[date] = None, years: int = 3,
+         batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """Genera todo en la base de `engine` (con las tablas ya creadas); retorna filas por tabla"""
+    with engine.connect() as conn:
+        if engine.dialect.name == 'mysql':
+            # Los datos ya son consistentes: se omite la verificación fila a fila durante la carga
+            conn.execute(text("SET FOREIGN_KEY_CHECKS=0, UNIQUE_CHECKS=0"))
+        counts = generate(conn, plan, seed, today or date.today(), years, batch_size)
+        if engine.dialect.name == 'mysql':
+            conn.execute(text("SET FOREIGN_KEY_CHECKS=1, UNIQUE_CHECKS=1"))
+    return counts
+
+
+def scale_plan(scale: int, clients: Optional[int] = None, bookings: Optional[int] = None,
+               tickets: Optional[int] = None) -> dict:
+    """Cantidades por entidad: `scale` fija clientes, reservas y tickets; el resto es proporcional"""
+    clients = clients if clients is not None else scale
+    plan = {
+        'clients': clients,
+        'bookings': bookings if bookings is not None else scale,
+        'tickets': tickets if tickets is not None else scale,
+        'comisionistas': max(5, min(200, scale // 2000)),
+        'offices': max(20, clients // 20),
+        'parking': max(10, clients // 40),
+        'requests': max(50, scale // 10),
+        'quotes': max(20, scale // 20),
+        'sales': max(20, scale // 10),
+        'invoices': max(10, clients // 20),
+    }
+    if plan['clients'] < 1:
+        raise SystemExit("Se necesita al menos un cliente")
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=10000, help="Clientes, reservas y tickets (por defecto 10000)")
+    parser.add_argument('--clients', type=int, help="Sobrescribe la cantidad de clientes")
+    parser.add_argument('--bookings', type=int, help="Sobrescribe la cantidad de reservas")
+    parser.add_argument('--tickets', type=int, help="Sobrescribe la cantidad de tickets")
+    parser.add_argument('--years', type=int, default=3, help="Años de historia (reservas, tickets, contratos)")
+    parser.add_argument('--today', type=date.fromisoformat, default=date.today(),
+                        help="Fecha de referencia YYYY-MM-DD (contratos por vencer, reservas futuras)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="Semilla; misma semilla = mismos datos")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--replace', action='store_true', help="Borrar y recrear las tablas si ya tienen datos")
+    args = parser.parse_args()
+
+    plan = scale_plan(args.scale, args.clients, args.bookings, args.tickets)
+    if args.replace:
+        Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        non_empty = [t.name for t in Base.metadata.sorted_tables if conn.execute(select(func.count()).select_from(t)).scalar()]
+    if non_empty:
+        raise SystemExit(f"Tablas con datos en el destino: {', '.join(non_empty)}. Use --replace")
+
+    print(f"Generando en {engine.url.render_as_string(hide_password=True)} (semilla {args.seed}): "
+          + ', '.join(f"{k}={v}" for k, v in plan.items()), flush=True)
+    started = perf_counter()
+    counts = load(plan, args.seed, args.today, args.years, args.batch_size)
+    total = sum(counts.values())
+    elapsed = perf_counter() - started
+    print(f"Listo: {total} filas en {elapsed:.1f}s ({total / elapsed:,.0f} filas/s)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+Migraciones de esquema de la base de TNA Office.
+
+El servidor aplica las migraciones pendientes al arrancar (SCHEMA_CHECK=version,
+ver server.py). Este script permite hacerlo antes de desplegar (crear un índice
+sobre una tabla grande puede tardar, mejor aquí que en el primer request de un
+proceso Passenger), ver el estado y revisar con EXPLAIN que las consultas
+frecuentes usan los índices declarados en los modelos.
+
+`check` compara el plan con el índice esperado: falla si alguna consulta recorre
+la tabla completa, o si una página con cursor recorre el índice entero en vez
+de buscar su rango. Con tablas casi vacías MySQL puede preferir recorrerlas, así
+que conviene correrlo sobre una base con volumen real o generada con
+generate_data.py. Usa el DATABASE_URL del entorno o del .env.
+
+Uso (desde backend/):
+    python migrate.py status
+    python migrate.py upgrade
+    python migrate.py check
+"""
+
+import argparse
+import logging
+import os
+import re
+import sys
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+logging.disable(logging.INFO)
+# Este script decide cuándo migrar; el servidor no debe hacerlo al importarse
+os.environ.setdefault('SCHEMA_CHECK', 'off')
+os.environ.setdefault('STARTUP_WARMUP', 'false')
+
+from sqlalchemy import select, func, case
+
+from server import (
+    engine, sa_inspect, schema_version_table, SCHEMA_MIGRATIONS, SCHEMA_VERSION,
+    stored_schema_version, schema_fingerprint, missing_indexes, migrate_schema,
+    keyset_statements, encode_cursor, PAGE_DEFAULT_LIMIT,
+    UserDB, ClientDB, ClientDocumentDB, BookingDB, TicketDB, TicketItemDB, RequestDB
+)
+
+SQLITE_PLAN = re.compile(r'^(SCAN|SEARCH) (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX (\w+))?')
+
+
+def keyset_probes(conn, name: str, table_name: str, expected: tuple, statement, sort_column, id_column) -> list:
+    """Primera página, página con cursor y cola de NULL, armadas con keyset_statements como los endpoints.
+
+    El cursor es el de la segunda página real de la tabla; las páginas con
+    cursor son las que pueden terminar recorriendo el índice completo.
+    """
+    first, _ = keyset_statements(statement, sort_column, id_column, PAGE_DEFAULT_LIMIT, None)
+    row = conn.execute(
+        statement.with_only_columns(sort_column, id_column).where(sort_column != None)
+        .order_by(sort_column.desc(), id_column.desc()).offset(PAGE_DEFAULT_LIMIT).limit(1)
+    ).first()
+    cursor = encode_cursor(row[0], row[1]) if row else encode_cursor(datetime.utcnow(), '')
+    page, null_tail = keyset_statements(statement, sort_column, id_column, PAGE_DEFAULT_LIMIT, cursor)
+    # Con cursor no basta con usar el índice: tiene que buscar por la columna de orden
+    return [
+        (f"{name} 1a página", table_name, expected, first),
+        (f"{name} con cursor", table_name, expected, page, sort_column.key),
+        (f"{name} cola NULL", table_name, expected, null_tail.limit(PAGE_DEFAULT_LIMIT), sort_column.key),
+    ]
+
+
+def hot_queries(conn) -> list:
+    """(nombre, tabla, columnas del índice esperado, sentencia[, columna que debe acotar el plan]).
+
+    Las sentencias tienen la misma forma que en server.py.
+    """
+    today = date.today()
+    return [
+        ("Índice de reservas: recurso y día", 'bookings', ('resource_type', 'resource_id', 'date', 'status'),
+         select(BookingDB.id, BookingDB.resource_id, BookingDB.start_time, BookingDB.end_time).where(
+             BookingDB.resource_type == 'room', BookingDB.resource_id.in_(['r1', 'r2']),
+             BookingDB.date == today, BookingDB.status != 'cancelled')),
+        ("Reservas públicas de un recurso", 'bookings', ('resource_type', 'resource_id', 'date', 'status'),
+         select(BookingDB).where(BookingDB.resource_type == 'room', BookingDB.resource_id == 'r1',
+                                 BookingDB.status != 'cancelled')),
+        *keyset_probes(conn, "GET /bookings", 'bookings', ('created_at', 'id'),
+                       select(BookingDB), BookingDB.created_at, BookingDB.id),
+        ("Resumen de comisiones por comisionista", 'tickets', ('comisionista_id', 'commission_status'),
+         select(UserDB.id, func.count(TicketDB.id),
+                func.sum(case((TicketDB.commission_status == 'pending', TicketDB.total_commission), else_=0)))
+         .outerjoin(TicketDB, TicketDB.comisionista_id == UserDB.id)
+         .where(UserDB.role == 'comisionista').group_by(UserDB.id)),
+        *keyset_probes(conn, "GET /tickets", 'tickets', ('ticket_date', 'id'),
+                       select(TicketDB), TicketDB.ticket_date, TicketDB.id),
+        ("Items de una página de tickets", 'ticket_items', ('ticket_id',),
+         select(TicketItemDB).where(TicketItemDB.ticket_id.in_(['t1', 't2']))),
+        ("Reporte de ventas por rango de fechas", 'tickets', ('ticket_date', 'id'),
+         select(TicketDB.ticket_number, TicketItemDB.product_name)
+         .select_from(TicketDB.__table__.join(TicketItemDB.__table__, TicketItemDB.ticket_id == TicketDB.id))
+         .where(TicketDB.ticket_date >= datetime.combine(today - timedelta(days=30), datetime.min.time()))
+         .order_by(TicketDB.ticket_date.desc(), TicketDB.id)),
+        *keyset_probes(conn, "GET /clients", 'clients', ('is_active', 'created_at', 'id'),
+                       select(ClientDB).where(ClientDB.is_active == True), ClientDB.created_at, ClientDB.id),
+        ("Contratos por vencer", 'client_documents', ('notifications_enabled', 'contract_end_date'),
+         select(ClientDocumentDB).where(ClientDocumentDB.notifications_enabled == True,
+                                        (ClientDocumentDB.expiry_date != None) | (ClientDocumentDB.contract_end_date != None))),
+        ("Solicitudes nuevas (conteo)", 'requests', ('status',),
+         select(func.count()).select_from(RequestDB).where(RequestDB.status == 'new')),
+    ]
+
+
+def index_columns(conn, table_name: str) -> dict:
+    """Nombre de índice -> columnas, como los reporta la base"""
+    inspector = sa_inspect(conn)
+    columns = {i['name']: tuple(i['column_names']) for i in inspector.get_indexes(table_name)}
+    columns['PRIMARY'] = tuple(inspector.get_pk_constraint(table_name)['constrained_columns'])
+    return columns
+
+
+def used_index(conn, statement, table_name: str, range_column: str = None):
+    """(índice usado o None, si el plan está acotado, detalle) para table_name según EXPLAIN.
+
+    Acotado: con range_column, la búsqueda en el índice usa esa columna (no
+    solo un prefijo de igualdad); sin ella, basta con no recorrer el índice entero.
+    """
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+    if conn.dialect.name == 'sqlite':
+        for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"):
+            match = SQLITE_PLAN.match(row[-1])
+            if match and match.group(2) == table_name:
+                constraint = row[-1].partition('(')[2]
+                bounded = match.group(1) == 'SEARCH' and (range_column is None or range_column in constraint)
+                return match.group(3), bounded, row[-1]
+        return None, False, "sin la tabla en el plan"
+    for row in conn.exec_driver_sql(f"EXPLAIN {sql}").mappings():
+        if row['table'] == table_name:
+            # type=index es recorrer el índice completo; ALL, la tabla; ref, solo el prefijo de igualdad
+            bounded = row['type'] in ('range', 'ref_or_null') if range_column else row['type'] not in ('index', 'ALL')
+            return (row['key'], bounded,
+                    f"type={row['type']} key={row['key']} rows={row['rows']} {row['Extra'] or ''}".strip())
+    return None, False, "sin la tabla en el plan"
+
+
+def check() -> int:
+    failures = 0
+    with engine.connect() as conn:
+        for name, table_name, expected, statement, *range_column in hot_queries(conn):
+            range_column = range_column[0] if range_column else None
+            index, bounded, detail = used_index(conn, statement, table_name, range_column)
+            columns = index_columns(conn, table_name).get(index) if index else None
+            if not index or (range_column and not bounded):
+                status = 'FALLA'
+                failures += 1
+            elif columns == expected:
+                status = 'OK'
+            else:
+                status = 'OTRO'
+            print(f"{status:<6} {name:<40} esperado ({', '.join(expected)}): {detail}")
+    if failures:
+        print(f"\n{failures} consultas recorren la tabla o el índice completo. ¿Faltan índices? Ver 'python migrate.py status'")
+    return 1 if failures else 0
+
+
+def status():
+    stored = stored_schema_version()
+    current = stored[0] if stored else 0
+    print(f"Base: {engine.url.render_as_string(hide_password=True)}")
+    print(f"Versión aplicada: {current} (código: {SCHEMA_VERSION})")
+    if stored and stored[1] != schema_fingerprint():
+        print("Los modelos cambiaron desde la última migración")
+    for version, description, _ in SCHEMA_MIGRATIONS:
+        if version > current:
+            print(f"  pendiente {version}: {description}")
+    if current:
+        with engine.connect() as conn:
+            for row in conn.execute(select(schema_version_table).order_by(schema_version_table.c.version)):
+                print(f"  aplicada  {row.version}: {row.description} ({row.applied_at:%Y-%m-%d %H:%M})")
+            missing = missing_indexes(conn)
+        for index in missing:
+            print(f"  índice faltante {index.name} en {index.table.name} ({', '.join(c.name for c in index.columns)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['status', 'upgrade', 'check'])
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        status()
+    elif args.command == 'upgrade':
+        applied = migrate_schema()
+        for description in applied:
+            print(f"Aplicado {description}")
+        print(f"Esquema en la versión {SCHEMA_VERSION}" + ("" if applied else " (nada pendiente)"))
+    else:
+        sys.exit(check())
+
+
+if __name__ == '__main__':
+    main()
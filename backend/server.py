@@ -4,11 +4,15 @@ Versión: 2.0.0 - Corregido para Producción
 Compatibilidad: cPanel con Phusion Passenger
 """
 
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Response, Request
+# Antes de los demás imports: sin /proc es la referencia del tiempo de arranque
+from time import time as epoch_seconds
+IMPORT_STARTED_AT = epoch_seconds()
+
+from fastapi import FastAPI, HTTPException, Depends, status, Response, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr, Field, ConfigDict
 from typing import Optional, List, Any
 from datetime import datetime, timezone, timedelta, date, time
@@ -18,12 +22,37 @@ import uuid
 import os
 import enum
 import io
+import csv
+import re
+import unicodedata
+import codecs
+import json
+import base64
+import hashlib
+import bisect
+import heapq
+import threading
 import logging
-from contextlib import asynccontextmanager
-from sqlalchemy import create_engine, Column, String, Integer, Float, Boolean, Text, DateTime, Date, Time, Enum, JSON, ForeignKey, func
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo de archivos no se consolida archive.json
+    fcntl = None
+from contextlib import asynccontextmanager, contextmanager
+from logging.handlers import RotatingFileHandler
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+import asyncio
+from collections import OrderedDict, deque
+from itertools import islice
+from operator import itemgetter
+from sqlalchemy import create_engine, select, insert, update, case, cast, text, inspect as sa_inspect, MetaData, Table, Index, Column, String, Integer, Float, Boolean, Text, DateTime, Date, Time, Enum, JSON, ForeignKey, func, or_, and_
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
-from sqlalchemy.pool import QueuePool
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError, DBAPIError
+from sqlalchemy.orm import sessionmaker, Session, relationship, selectinload, joinedload, configure_mappers
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.engine import make_url
 from dotenv import load_dotenv
 from pathlib import Path
 from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
@@ -60,20 +89,337 @@ if not JWT_SECRET or JWT_SECRET == 'cambia-esto-por-una-clave-muy-segura-y-larga
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = int(os.environ.get('JWT_EXPIRATION_HOURS', 24))
 
+# ============ MÉTRICAS ============
+
+METRICS_DIR = os.environ.get('METRICS_DIR', str(ROOT_DIR / 'metrics_data'))
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+if not METRICS_TOKEN:
+    logger.warning("ADVERTENCIA: METRICS_TOKEN no está configurado; /metrics queda deshabilitado.")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+STARTUP_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_HELP = {
+    'tna_http_requests_total': ('counter', "Requests atendidos por ruta, método y código de estado"),
+    'tna_http_request_duration_seconds': ('histogram', "Latencia de los requests por ruta"),
+    'tna_sql_statements_total': ('counter', "Sentencias SQL ejecutadas por ruta"),
+    'tna_sql_duration_seconds_total': ('counter', "Tiempo en la base de datos por ruta"),
+    'tna_db_pool_checkout_wait_seconds': ('histogram', "Espera para obtener una conexión del pool"),
+    'tna_db_pool_checked_out': ('gauge', "Conexiones del pool en uso"),
+    'tna_password_hash_queue_depth': ('gauge', "Trabajos de bcrypt en espera o en curso"),
+    'tna_password_hash_completed': ('gauge', "Hashes bcrypt completados por los procesos vivos"),
+    'tna_password_hash_rejected': ('gauge', "Hashes bcrypt rechazados por cola llena en los procesos vivos"),
+    'tna_process_startup_seconds': ('histogram', "Desde el spawn del proceso hasta terminar de importar server.py"),
+    'tna_process_first_response_seconds': ('histogram', "Desde el spawn del proceso hasta completar su primer request"),
+}
+
+class MetricsRegistry:
+    """Contadores e histogramas en memoria, agregados entre procesos de Passenger.
+
+    Cada proceso vuelca sus valores cada METRICS_FLUSH_SECONDS a
+    METRICS_DIR/metrics_<pid>_<token>.json. /metrics suma los archivos de
+    todos los procesos; los de procesos terminados se acumulan en
+    archive.json para que sus contadores no se pierdan. Los gauges (valores
+    instantáneos) solo se suman para procesos vivos. Con METRICS_DIR vacío se
+    reporta solo el proceso actual.
+    """
+
+    def __init__(self, directory: str = METRICS_DIR, flush_seconds: float = METRICS_FLUSH_SECONDS):
+        self.directory = Path(directory) if directory else None
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._counters = {}    # (nombre, labels) -> valor
+        self._histograms = {}  # (nombre, labels) -> [conteos por bucket..., suma, total]
+        self._buckets = {}     # nombre -> buckets
+        self._collectors = []  # funciones que retornan [(nombre, labels, valor)] de gauges
+        self._last_flush = 0.0
+        self._file = None
+        if self.directory is not None:
+            self._file = self.directory / f"metrics_{os.getpid()}_{uuid.uuid4().hex[:8]}.json"
+
+    def inc(self, name: str, labels: tuple, value: float = 1.0):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, labels: tuple, value: float, buckets: tuple = LATENCY_BUCKETS):
+        key = (name, labels)
+        with self._lock:
+            data = self._histograms.get(key)
+            if data is None:
+                self._buckets[name] = buckets
+                data = self._histograms[key] = [0] * len(buckets) + [0.0, 0]
+            index = bisect.bisect_left(buckets, value)
+            if index < len(buckets):
+                data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    # --- agregación entre procesos ---
+
+    def snapshot(self) -> dict:
+        gauges = []
+        for collector in self._collectors:
+            try:
+                gauges.extend(collector())
+            except Exception as e:
+                logger.warning(f"Error en colector de métricas: {e}")
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "counters": [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                "histograms": [[name, list(labels), list(self._buckets[name]), data]
+                               for (name, labels), data in self._histograms.items()],
+                "gauges": [[name, list(labels), value] for name, labels, value in gauges],
+            }
+
+    def maybe_flush(self):
+        if self._file is None or perf_counter() - self._last_flush < self.flush_seconds:
+            return
+        self.flush()
+
+    def flush(self):
+        if self._file is None:
+            return
+        self._last_flush = perf_counter()
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = self._file.with_suffix('.tmp')
+            tmp.write_text(json.dumps(self.snapshot()), encoding='utf-8')
+            os.replace(tmp, self._file)
+        except OSError as e:
+            logger.warning(f"No se pudieron guardar las métricas en {self._file}: {e}")
+
+    @staticmethod
+    def _pid_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            return True
+        return True
+
+    @staticmethod
+    def _merge(total: dict, snapshot: dict, include_gauges: bool):
+        for name, labels, value in snapshot.get("counters", []):
+            key = (name, tuple(map(tuple, labels)))
+            total["counters"][key] = total["counters"].get(key, 0.0) + value
+        for name, labels, buckets, data in snapshot.get("histograms", []):
+            key = (name, tuple(map(tuple, labels)))
+            total["buckets"][name] = tuple(buckets)
+            current = total["histograms"].get(key)
+            if current is None:
+                total["histograms"][key] = list(data)
+            else:
+                total["histograms"][key] = [a + b for a, b in zip(current, data)]
+        if include_gauges:
+            for name, labels, value in snapshot.get("gauges", []):
+                key = (name, tuple(map(tuple, labels)))
+                total["gauges"][key] = total["gauges"].get(key, 0.0) + value
+
+    def collect(self) -> dict:
+        """Suma este proceso, los demás procesos vivos y el archivo de procesos terminados"""
+        total = {"counters": {}, "histograms": {}, "buckets": {}, "gauges": {}}
+        self._merge(total, self.snapshot(), include_gauges=True)
+        if self._file is None:
+            return total
+        self.flush()
+        self._archive_dead_processes()
+        archive = self.directory / 'archive.json'
+        for path in list(self.directory.glob('metrics_*.json')) + [archive]:
+            if path == self._file or not path.exists():
+                continue
+            try:
+                snapshot = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                continue
+            self._merge(total, snapshot, include_gauges=path != archive)
+        return total
+
+    def _archive_dead_processes(self):
+        if fcntl is None:
+            return
+        with open(self.directory / 'archive.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead = []
+            for path in self.directory.glob('metrics_*.json'):
+                try:
+                    pid = int(path.name.split('_')[1])
+                except (IndexError, ValueError):
+                    continue
+                if not self._pid_alive(pid):
+                    dead.append(path)
+            if not dead:
+                return
+            archive_path = self.directory / 'archive.json'
+            total = {"counters": {}, "histograms": {}, "buckets": {}, "gauges": {}}
+            for path in ([archive_path] if archive_path.exists() else []) + dead:
+                try:
+                    self._merge(total, json.loads(path.read_text(encoding='utf-8')), include_gauges=False)
+                except (OSError, ValueError):
+                    continue
+            archive = {
+                "counters": [[n, list(l), v] for (n, l), v in total["counters"].items()],
+                "histograms": [[n, list(l), list(total["buckets"][n]), d] for (n, l), d in total["histograms"].items()],
+            }
+            tmp = archive_path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(archive), encoding='utf-8')
+            os.replace(tmp, archive_path)
+            for path in dead:
+                path.unlink(missing_ok=True)
+
+    # --- exposición ---
+
+    def render(self) -> str:
+        """Formato de texto de Prometheus (version 0.0.4)"""
+        total = self.collect()
+        by_name = {}
+        for kind in ("counters", "gauges"):
+            for (name, labels), value in total[kind].items():
+                by_name.setdefault(name, []).append(("value", labels, value))
+        for (name, labels), data in total["histograms"].items():
+            by_name.setdefault(name, []).append(("histogram", labels, data))
+
+        lines = []
+        for name in sorted(by_name):
+            metric_type, help_text = METRIC_HELP.get(name, ('untyped', ''))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for kind, labels, data in sorted(by_name[name], key=lambda item: item[1]):
+                if kind == "value":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_number(data)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(total["buckets"][name], data[:-2]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_number(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {data[-1]}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(data[-2])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {data[-1]}")
+        return '\n'.join(lines) + '\n'
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+def _format_number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+metrics = MetricsRegistry()
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool que mide cuánto espera cada checkout por una conexión libre"""
+
+    def _do_get(self):
+        started = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe('tna_db_pool_checkout_wait_seconds', (), perf_counter() - started, POOL_WAIT_BUCKETS)
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """Igual que InstrumentedQueuePool, para el motor async"""
+
 # ============ DATABASE SETUP ============
 
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 3600))
+
 engine = create_engine(
     DATABASE_URL,
-    poolclass=QueuePool,
-    pool_size=5,
-    max_overflow=10,
-    pool_recycle=3600,
+    poolclass=InstrumentedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=DB_POOL_RECYCLE,
     pool_pre_ping=True,  # Verifica conexiones antes de usarlas
     echo=False  # Cambiar a True para debug SQL
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Conteo de sentencias SQL y tiempo en BD por request: [sentencias, segundos]
+# (lo reportan el middleware de la app y /metrics)
+SQL_QUERY_WARN_THRESHOLD = int(os.environ.get('SQL_QUERY_WARN_THRESHOLD', 20))
+request_query_count: ContextVar[Optional[list]] = ContextVar('request_query_count', default=None)
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_sql_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = request_query_count.get()
+    if counter is not None:
+        counter[0] += 1
+    conn.info.setdefault('query_started', []).append(perf_counter())
+
+@event.listens_for(engine, "after_cursor_execute")
+def _time_sql_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = perf_counter() - started.pop()
+    counter = request_query_count.get()
+    if counter is not None:
+        counter[1] += elapsed
+    slow_query_log.record(statement, parameters, executemany, elapsed)
+
+@event.listens_for(engine, "handle_error")
+def _discard_failed_sql_timing(exception_context):
+    # after_cursor_execute no se llama si la sentencia falla
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_started'):
+        conn.info['query_started'].pop()
+
+# Motor async (opcional) para los endpoints de lectura frecuente: atienden en el
+# event loop sin ocupar un hilo del threadpool mientras esperan a la BD. Sin el
+# driver async (aiomysql/aiosqlite + greenlet) esos endpoints usan el motor
+# síncrono en el threadpool, con el mismo resultado.
+ASYNC_DB_ENABLED = os.environ.get('ASYNC_DB_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ASYNC_DRIVERS = {'mysql': 'mysql+aiomysql', 'mysql+pymysql': 'mysql+aiomysql', 'mariadb+pymysql': 'mariadb+aiomysql',
+                 'sqlite': 'sqlite+aiosqlite', 'sqlite+pysqlite': 'sqlite+aiosqlite'}
+
+def async_database_url(url: str) -> Optional[str]:
+    """Equivalente async de DATABASE_URL (o ASYNC_DATABASE_URL si está definida)"""
+    if os.environ.get('ASYNC_DATABASE_URL'):
+        return os.environ['ASYNC_DATABASE_URL']
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False) if driver else None
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DB_ENABLED and async_database_url(DATABASE_URL):
+    try:
+        import greenlet  # noqa: F401  (requerido por sqlalchemy.ext.asyncio)
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        async_engine = create_async_engine(
+            async_database_url(DATABASE_URL),
+            poolclass=InstrumentedAsyncQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+            echo=False
+        )
+        AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+        for _event_name, _listener in (("before_cursor_execute", _count_sql_statement),
+                                       ("after_cursor_execute", _time_sql_statement),
+                                       ("handle_error", _discard_failed_sql_timing)):
+            event.listen(async_engine.sync_engine, _event_name, _listener)
+    except ImportError as e:
+        logger.warning(f"Motor async no disponible ({e}); los endpoints async usarán el motor síncrono")
+
 def get_db():
     db = SessionLocal()
     try:
@@ -85,6 +431,171 @@ def get_db():
     finally:
         db.close()
 
+@asynccontextmanager
+async def async_session_scope():
+    """AsyncSession del motor async o, si no está disponible, una Session síncrona"""
+    if AsyncSessionLocal is None:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+    else:
+        async with AsyncSessionLocal() as db:
+            yield db
+
+async def get_async_db():
+    """Dependencia de los endpoints async (usar con db_execute/db_run_sync)"""
+    async with async_session_scope() as db:
+        try:
+            yield db
+        except Exception as e:
+            # Cerrar la sesión descarta la transacción pendiente
+            logger.error(f"Error en sesión de base de datos: {e}")
+            raise
+
+async def db_execute(db, statement):
+    """Ejecuta una sentencia en la sesión de get_async_db; el resultado queda en memoria"""
+    if isinstance(db, Session):
+        frozen = await run_in_threadpool(lambda: db.execute(statement).freeze())
+        return frozen()
+    return await db.execute(statement)
+
+async def db_run_sync(db, fn, *args):
+    """Ejecuta fn(session, *args) con código ORM síncrono sobre la sesión de get_async_db"""
+    if isinstance(db, Session):
+        return await run_in_threadpool(fn, db, *args)
+    return await db.run_sync(fn, *args)
+
+# ============ SLOW QUERY LOG ============
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+SLOW_QUERY_BUFFER_SIZE = int(os.environ.get('SLOW_QUERY_BUFFER_SIZE', 500))
+SLOW_QUERY_MAX_GROUPS = int(os.environ.get('SLOW_QUERY_MAX_GROUPS', 1000))
+SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE', '')
+
+# Datos del request en curso para atribuir sentencias: método, scope ASGI (la
+# ruta se resuelve dentro) y user_id (lo completa get_current_user)
+request_info: ContextVar[Optional[dict]] = ContextVar('request_info', default=None)
+
+_SQL_PLACEHOLDER_RE = re.compile(r"%\(\w+\)s|%s|(?<!:):\w+")
+_SQL_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\b\d+(?:\.\d+)?\b")
+_SQL_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SQL_SPACE_RE = re.compile(r"\s+")
+
+def normalize_statement(statement: str) -> str:
+    """Reemplaza valores y listas IN por '?' para agrupar sentencias equivalentes"""
+    text = _SQL_PLACEHOLDER_RE.sub('?', statement)
+    text = _SQL_LITERAL_RE.sub('?', text)
+    text = _SQL_LIST_RE.sub('(?...)', text)
+    return _SQL_SPACE_RE.sub(' ', text).strip()
+
+def _value_shape(params) -> str:
+    if isinstance(params, dict):
+        items = [f"{key}:{type(value).__name__}" for key, value in list(params.items())[:20]]
+        return '{' + ', '.join(items) + (', ...' if len(params) > 20 else '') + '}'
+    if isinstance(params, (list, tuple)):
+        items = [type(value).__name__ for value in params[:20]]
+        return '(' + ', '.join(items) + (', ...' if len(params) > 20 else '') + ')'
+    return type(params).__name__
+
+def parameters_shape(parameters, executemany: bool) -> str:
+    """Tipos de los parámetros (nunca los valores, que pueden traer datos personales)"""
+    if executemany:
+        rows = len(parameters) if parameters else 0
+        return f"executemany[{rows}] " + (_value_shape(parameters[0]) if rows else '()')
+    return _value_shape(parameters) if parameters else '()'
+
+class SlowQueryLog:
+    """Sentencias que superan SLOW_QUERY_MS, en un buffer circular y agrupadas por forma.
+
+    Los grupos (conteo, tiempo total y máximo, rutas de origen) se acotan a
+    SLOW_QUERY_MAX_GROUPS descartando el de menor tiempo total. Es por proceso;
+    el archivo opcional SLOW_QUERY_LOG_FILE (JSON por línea, rotativo) junta
+    las de todos los procesos.
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, size: int = SLOW_QUERY_BUFFER_SIZE,
+                 max_groups: int = SLOW_QUERY_MAX_GROUPS, log_file: str = SLOW_QUERY_LOG_FILE):
+        self.threshold_ms = threshold_ms
+        self.max_groups = max_groups
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=size)
+        self._groups = {}
+        self._file_logger = None
+        if log_file:
+            path = Path(log_file)
+            if not path.is_absolute():
+                path = ROOT_DIR / path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=5 * 1024 * 1024, backupCount=5, encoding='utf-8')
+            self._file_logger = logging.getLogger(f"{__name__}.slow_queries")
+            self._file_logger.propagate = False
+            self._file_logger.addHandler(handler)
+            self._file_logger.setLevel(logging.INFO)
+
+    def record(self, statement: str, parameters, executemany: bool, elapsed: float):
+        duration_ms = elapsed * 1000
+        if duration_ms < self.threshold_ms:
+            return
+        info = request_info.get()
+        route = user_id = None
+        if info is not None:
+            matched = info['scope'].get('route')
+            route = f"{info['method']} {getattr(matched, 'path', None) or info['scope'].get('path')}"
+            user_id = info.get('user_id')
+        normalized = normalize_statement(statement)
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "duration_ms": round(duration_ms, 2),
+            "statement": statement[:2000],
+            "normalized": normalized[:2000],
+            "parameters": parameters_shape(parameters, executemany),
+            "route": route,
+            "user_id": user_id,
+        }
+        with self._lock:
+            self._recent.append(entry)
+            group = self._groups.get(normalized)
+            if group is None:
+                if len(self._groups) >= self.max_groups:
+                    smallest = min(self._groups, key=lambda k: self._groups[k]["total_ms"])
+                    del self._groups[smallest]
+                group = self._groups[normalized] = {
+                    "normalized": entry["normalized"], "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "parameters": entry["parameters"], "routes": {}, "last_at": None
+                }
+            group["count"] += 1
+            group["total_ms"] += duration_ms
+            group["max_ms"] = max(group["max_ms"], duration_ms)
+            group["last_at"] = entry["at"]
+            if route:
+                group["routes"][route] = group["routes"].get(route, 0) + 1
+        if self._file_logger is not None:
+            self._file_logger.warning(json.dumps(entry, ensure_ascii=False))
+
+    def top(self, limit: int = 20, order: str = 'total') -> list:
+        key = {'total': 'total_ms', 'count': 'count', 'max': 'max_ms'}[order]
+        with self._lock:
+            groups = heapq.nlargest(limit, self._groups.values(), key=itemgetter(key))
+            return [
+                dict(g, total_ms=round(g["total_ms"], 2), max_ms=round(g["max_ms"], 2),
+                     avg_ms=round(g["total_ms"] / g["count"], 2),
+                     routes=dict(sorted(g["routes"].items(), key=lambda item: -item[1])[:10]))
+                for g in groups
+            ]
+
+    def recent(self, limit: int = 50) -> list:
+        with self._lock:
+            return list(islice(reversed(self._recent), max(limit, 0)))
+
+    def reset(self):
+        with self._lock:
+            self._recent.clear()
+            self._groups.clear()
+
+slow_query_log = SlowQueryLog()
+
 # ============ ENUMS ============
 
 class UserRole(str, enum.Enum):
@@ -151,7 +662,7 @@ class UserDB(Base):
     email = Column(String(255), unique=True, nullable=False)
     password = Column(String(255), nullable=False)
     name = Column(String(255), nullable=False)
-    role = Column(Enum(UserRole), default=UserRole.cliente)
+    role = Column(Enum(UserRole), default=UserRole.cliente, index=True)
     profile_id = Column(String(36), ForeignKey('profiles.id'))
     commission_percentage = Column(Float, default=0.0)
     is_active = Column(Boolean, default=True)
@@ -173,7 +684,7 @@ class ProductDB(Base):
     name = Column(String(255), nullable=False)
     description = Column(Text)
     category_id = Column(String(36), ForeignKey('categories.id'))
-    category = Column(String(100))
+    category = Column(String(100), index=True)
     base_price = Column(Float, default=0.0)
     sale_price = Column(Float, default=0.0)
     cost = Column(Float, default=0.0)
@@ -189,12 +700,18 @@ class ProductDB(Base):
     stock_control_enabled = Column(Boolean, default=False)
     current_stock = Column(Integer, default=0)
     min_stock_alert = Column(Integer, default=5)
+    # Stock bajo el mínimo en un producto activo con control de stock (indexado para /products/low-stock)
+    low_stock = Column(Boolean, default=False, index=True)
 
 class ClientDB(Base):
     __tablename__ = "clients"
+    __table_args__ = (
+        # GET /clients: activos, paginados por keyset (created_at, id)
+        Index('ix_clients_active_created', 'is_active', 'created_at', 'id'),
+    )
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    company_name = Column(String(255), nullable=False)
-    rut = Column(String(20))
+    company_name = Column(String(255), nullable=False, index=True)
+    rut = Column(String(20), index=True)
     business_type = Column(String(100))
     address = Column(Text)
     phone = Column(String(50))
@@ -210,12 +727,16 @@ class ClientDB(Base):
 
 class ClientDocumentDB(Base):
     __tablename__ = "client_documents"
+    __table_args__ = (
+        # /contracts/expiring-soon: documentos con notificaciones y fecha de término
+        Index('ix_client_documents_notifications', 'notifications_enabled', 'contract_end_date'),
+    )
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    client_id = Column(String(36), ForeignKey('clients.id'), nullable=False)
+    client_id = Column(String(36), ForeignKey('clients.id'), nullable=False, index=True)
     name = Column(String(255), nullable=False)
     file_url = Column(Text)
     document_type = Column(String(100))
-    expiry_date = Column(Date)
+    expiry_date = Column(Date, index=True)
     notifications_enabled = Column(Boolean, default=False)
     notification_days = Column(Integer, default=30)
     contract_start_date = Column(Date)
@@ -227,7 +748,7 @@ class ClientDocumentDB(Base):
 class ClientContactDB(Base):
     __tablename__ = "client_contacts"
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    client_id = Column(String(36), ForeignKey('clients.id'), nullable=False)
+    client_id = Column(String(36), ForeignKey('clients.id'), nullable=False, index=True)
     name = Column(String(255), nullable=False)
     position = Column(String(255))
     phone = Column(String(50))
@@ -244,8 +765,8 @@ class OfficeDB(Base):
     location = Column(String(100))
     square_meters = Column(Float)
     capacity = Column(Integer)
-    status = Column(Enum(OfficeStatus), default=OfficeStatus.available)
-    client_id = Column(String(36), ForeignKey('clients.id'))
+    status = Column(Enum(OfficeStatus), default=OfficeStatus.available, index=True)
+    client_id = Column(String(36), ForeignKey('clients.id'), index=True)
     sale_value_uf = Column(Float, default=0.0)
     billed_value_uf = Column(Float, default=0.0)
     cost_uf = Column(Float, default=0.0)
@@ -258,6 +779,9 @@ class OfficeDB(Base):
 
 class ParkingStorageDB(Base):
     __tablename__ = "parking_storage"
+    __table_args__ = (
+        Index('ix_parking_storage_type_status', 'type', 'status'),
+    )
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     number = Column(String(20), nullable=False)
     type = Column(Enum(ParkingType), default=ParkingType.parking)
@@ -304,6 +828,12 @@ class BoothDB(Base):
 
 class BookingDB(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        # Índice de intervalos y validación de choques: un recurso en un día, sin las canceladas
+        Index('ix_bookings_resource_date', 'resource_type', 'resource_id', 'date', 'status'),
+        # GET /bookings paginado por keyset
+        Index('ix_bookings_created', 'created_at', 'id'),
+    )
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     resource_type = Column(Enum('room', 'booth', name='resource_type_enum'), nullable=False)
     resource_id = Column(String(36), nullable=False)
@@ -312,7 +842,7 @@ class BookingDB(Base):
     client_name = Column(String(255), nullable=False)
     client_email = Column(String(255))
     client_phone = Column(String(50))
-    date = Column(Date)
+    date = Column(Date, index=True)
     start_time = Column(Time)
     end_time = Column(Time)
     duration_hours = Column(Float)
@@ -338,11 +868,11 @@ class MonthlyServiceDB(Base):
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     service_name = Column(String(255), nullable=False)
     category = Column(String(100))
-    client_id = Column(String(36), ForeignKey('clients.id'))
+    client_id = Column(String(36), ForeignKey('clients.id'), index=True)
     sale_value_uf = Column(Float, default=0.0)
     billed_value_uf = Column(Float, default=0.0)
     cost_uf = Column(Float, default=0.0)
-    status = Column(Enum(ServiceStatus), default=ServiceStatus.active)
+    status = Column(Enum(ServiceStatus), default=ServiceStatus.active, index=True)
     start_date = Column(Date)
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -352,9 +882,15 @@ class MonthlyServiceDB(Base):
 
 class TicketDB(Base):
     __tablename__ = "tickets"
+    __table_args__ = (
+        # Resumen de comisiones por comisionista y estado
+        Index('ix_tickets_commission', 'comisionista_id', 'commission_status'),
+        # GET /tickets paginado por keyset y reportes por rango de fechas
+        Index('ix_tickets_date', 'ticket_date', 'id'),
+    )
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     ticket_number = Column(Integer, autoincrement=True, unique=True)
-    client_id = Column(String(36), ForeignKey('clients.id'))
+    client_id = Column(String(36), ForeignKey('clients.id'), index=True)
     client_name = Column(String(255), nullable=False)
     client_email = Column(String(255))
     ticket_date = Column(DateTime, default=datetime.utcnow)
@@ -364,7 +900,7 @@ class TicketDB(Base):
     total_commission = Column(Float, default=0.0)
     comisionista_id = Column(String(36), ForeignKey('users.id'))
     comisionista_name = Column(String(255))
-    payment_status = Column(Enum('pending', 'paid', 'partial', 'refunded', name='payment_status_enum'), default='pending')
+    payment_status = Column(Enum('pending', 'paid', 'partial', 'refunded', name='payment_status_enum'), default='pending', index=True)
     payment_method = Column(String(50))
     payment_date = Column(DateTime)
     commission_status = Column(Enum('pending', 'paid', name='commission_status_enum'), default='pending')
@@ -380,8 +916,8 @@ class TicketDB(Base):
 class TicketItemDB(Base):
     __tablename__ = "ticket_items"
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    ticket_id = Column(String(36), ForeignKey('tickets.id'), nullable=False)
-    product_id = Column(String(36), ForeignKey('products.id'))
+    ticket_id = Column(String(36), ForeignKey('tickets.id'), nullable=False, index=True)
+    product_id = Column(String(36), ForeignKey('products.id'), index=True)
     product_name = Column(String(255), nullable=False)
     category = Column(String(100))
     description = Column(Text)
@@ -394,11 +930,28 @@ class TicketItemDB(Base):
     ticket = relationship("TicketDB", back_populates="items")
     product = relationship("ProductDB")
 
+class StockMovementDB(Base):
+    __tablename__ = "stock_movements"
+    __table_args__ = (
+        Index('ix_stock_movements_created', 'created_at', 'id'),
+    )
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    product_id = Column(String(36), ForeignKey('products.id'), nullable=False, index=True)
+    quantity = Column(Integer, nullable=False)  # positivo = entrada, negativo = salida
+    reason = Column(String(30), nullable=False)  # initial, manual, adjustment, ticket, ticket_edit, ticket_delete, disable
+    reference_id = Column(String(36))  # ticket que originó el movimiento
+    notes = Column(Text)
+    created_by = Column(String(36), ForeignKey('users.id'))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class RequestDB(Base):
     __tablename__ = "requests"
+    __table_args__ = (
+        Index('ix_requests_created', 'created_at', 'id'),
+    )
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     request_number = Column(Integer, autoincrement=True, unique=True)
-    type = Column(String(50), default='contact')
+    type = Column(String(50), default='contact', index=True)
     name = Column(String(255))
     client_name = Column(String(255))
     client_email = Column(String(255))
@@ -411,7 +964,7 @@ class RequestDB(Base):
     request_type = Column(String(100))
     description = Column(Text)
     source = Column(String(50))
-    status = Column(Enum('new', 'pending', 'in_progress', 'completed', 'cancelled', 'confirmed', 'rejected', name='request_status_enum'), default='new')
+    status = Column(Enum('new', 'pending', 'in_progress', 'completed', 'cancelled', 'confirmed', 'rejected', name='request_status_enum'), default='new', index=True)
     priority = Column(Enum('low', 'medium', 'high', name='request_priority_enum'), default='medium')
     assigned_to = Column(String(36))
     notes = Column(Text)
@@ -421,9 +974,12 @@ class RequestDB(Base):
 
 class QuoteDB(Base):
     __tablename__ = "quotes"
+    __table_args__ = (
+        Index('ix_quotes_created', 'created_at', 'id'),
+    )
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     quote_number = Column(Integer, autoincrement=True, unique=True)
-    client_id = Column(String(36), ForeignKey('clients.id'))
+    client_id = Column(String(36), ForeignKey('clients.id'), index=True)
     client_name = Column(String(255))
     client_email = Column(String(255))
     client_phone = Column(String(50))
@@ -432,7 +988,7 @@ class QuoteDB(Base):
     subtotal = Column(Float, default=0.0)
     tax = Column(Float, default=0.0)
     total = Column(Float, default=0.0)
-    status = Column(Enum('draft', 'pre-cotizacion', 'sent', 'accepted', 'rejected', 'expired', name='quote_status_enum'), default='draft')
+    status = Column(Enum('draft', 'pre-cotizacion', 'sent', 'accepted', 'rejected', 'expired', name='quote_status_enum'), default='draft', index=True)
     valid_until = Column(Date)
     notes = Column(Text)
     created_by = Column(String(36))
@@ -449,16 +1005,19 @@ class QuoteTemplateDB(Base):
 
 class SaleDB(Base):
     __tablename__ = "sales"
+    __table_args__ = (
+        Index('ix_sales_created', 'created_at', 'id'),
+    )
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    ticket_id = Column(String(36))
+    ticket_id = Column(String(36), index=True)
     product_id = Column(String(36))
     product_name = Column(String(255))
     category = Column(String(100))
     quantity = Column(Integer, default=1)
     unit_price = Column(Float, default=0.0)
     total_amount = Column(Float, default=0.0)
-    sale_date = Column(Date)
-    client_id = Column(String(36))
+    sale_date = Column(Date, index=True)
+    client_id = Column(String(36), index=True)
     client_name = Column(String(255))
     client_email = Column(String(255))
     comisionista_id = Column(String(36))
@@ -484,10 +1043,13 @@ class FloorPlanCoordinateDB(Base):
 
 class InvoiceDB(Base):
     __tablename__ = "invoices"
+    __table_args__ = (
+        Index('ix_invoices_created', 'created_at', 'id'),
+    )
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     invoice_number = Column(String(50))
     ticket_id = Column(String(36))
-    client_id = Column(String(36), ForeignKey('clients.id'))
+    client_id = Column(String(36), ForeignKey('clients.id'), index=True)
     client_name = Column(String(255))
     items = Column(JSON)
     sales_ids = Column(JSON)
@@ -496,11 +1058,29 @@ class InvoiceDB(Base):
     subtotal = Column(Float, default=0.0)
     tax = Column(Float, default=0.0)
     total_amount = Column(Float, default=0.0)
-    status = Column(String(50), default='pending')
+    status = Column(String(50), default='pending', index=True)
     invoiced_at = Column(DateTime)
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class DashboardRollupDB(Base):
+    """Totales precalculados del dashboard (una fila 'global')"""
+    __tablename__ = "dashboard_rollup"
+    id = Column(String(36), primary_key=True)
+    total_clients = Column(Integer, default=0)
+    total_offices = Column(Integer, default=0)
+    occupied_offices = Column(Integer, default=0)
+    available_offices = Column(Integer, default=0)
+    total_billed_uf = Column(Float, default=0.0)
+    total_cost_uf = Column(Float, default=0.0)
+    total_parking = Column(Integer, default=0)
+    occupied_parking = Column(Integer, default=0)
+    total_storage = Column(Integer, default=0)
+    occupied_storage = Column(Integer, default=0)
+    new_requests = Column(Integer, default=0)
+    pending_quotes = Column(Integer, default=0)
+    refreshed_at = Column(DateTime, default=datetime.utcnow)
+
 # ============ PYDANTIC MODELS ============
 
 class UserLogin(BaseModel):
@@ -586,6 +1166,10 @@ class BookingUpdate(BaseModel):
 
 security = HTTPBearer()
 
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 64))
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica una contraseña contra su hash bcrypt"""
     try:
@@ -596,7 +1180,119 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     """Genera un hash bcrypt para una contraseña"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+def bcrypt_cost(hashed_password: str) -> Optional[int]:
+    """Extrae el factor de costo de un hash bcrypt ($2b$12$...)"""
+    try:
+        return int(hashed_password.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    """Pool dedicado y acotado para bcrypt.
+
+    bcrypt es CPU intensivo; ejecutarlo en el threadpool de anyio hace que una
+    ráfaga de logins deje sin hilos al resto de endpoints síncronos. Este pool
+    limita los hashes simultáneos a PASSWORD_HASH_WORKERS y rechaza con 503
+    cuando hay más de PASSWORD_HASH_MAX_QUEUE trabajos en espera.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._max_pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self._rejected += 1
+                raise HTTPException(status_code=503, detail="Servidor ocupado, intenta nuevamente en unos segundos")
+            self._pending += 1
+            self._max_pending = max(self._max_pending, self._pending)
+        submitted_at = perf_counter()
+
+        def run():
+            started_at = perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished_at = perf_counter()
+                with self._lock:
+                    self._pending -= 1
+                    self._completed += 1
+                    self._wait_seconds += started_at - submitted_at
+                    self._run_seconds += finished_at - started_at
+
+        return self._executor.submit(run)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await asyncio.wrap_future(self._submit(verify_password, plain_password, hashed_password))
+
+    async def hash(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(get_password_hash, password))
+
+    @staticmethod
+    def needs_rehash(hashed_password: str) -> bool:
+        # Solo se sube el costo: bajar BCRYPT_ROUNDS no debilita los hashes existentes
+        cost = bcrypt_cost(hashed_password)
+        return cost is not None and cost < BCRYPT_ROUNDS
+
+    def rehash_in_background(self, user_id: str, plain_password: str, old_hash: str):
+        """Recalcula el hash con el costo actual sin demorar la respuesta del login"""
+        def rehash():
+            new_hash = get_password_hash(plain_password)
+            db = SessionLocal()
+            try:
+                # Solo si nadie cambió la contraseña mientras tanto
+                updated = db.query(UserDB).filter(UserDB.id == user_id, UserDB.password == old_hash).update(
+                    {UserDB.password: new_hash}, synchronize_session=False
+                )
+                db.commit()
+                if updated:
+                    logger.info(f"Hash de contraseña actualizado a costo {BCRYPT_ROUNDS} para usuario {user_id}")
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"No se pudo actualizar el hash del usuario {user_id}: {e}")
+            finally:
+                db.close()
+        try:
+            self._submit(rehash)
+        except HTTPException:
+            pass  # Pool saturado: se reintenta en el próximo login
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self._pending,
+                "max_queue_depth": self._max_pending,
+                "queue_limit": self.max_queue,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._wait_seconds / self._completed * 1000, 2) if self._completed else 0.0,
+                "avg_run_ms": round(self._run_seconds / self._completed * 1000, 2) if self._completed else 0.0
+            }
+
+password_hasher = PasswordHasher()
+
+def _password_hasher_gauges():
+    stats = password_hasher.stats()
+    return [
+        ('tna_password_hash_queue_depth', (), stats['queue_depth']),
+        ('tna_password_hash_completed', (), stats['completed']),
+        ('tna_password_hash_rejected', (), stats['rejected']),
+    ]
+
+metrics.add_collector(_password_hasher_gauges)
+metrics.add_collector(lambda: [('tna_db_pool_checked_out', (), engine.pool.checkedout())])
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
@@ -604,7 +1300,114 @@ def create_access_token(data: dict) -> str:
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> UserDB:
+USER_CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL_SECONDS', 30))
+USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 1024))
+USER_CACHE_STAMP_FILE = os.environ.get('USER_CACHE_STAMP_FILE', str(ROOT_DIR / 'user_cache.stamp'))
+
+class UserCache:
+    """Caché LRU con TTL de usuarios autenticados (y su perfil) por id.
+
+    Guarda copias de las columnas y entrega en cada lectura un UserDB nuevo, no
+    asociado a ninguna sesión, para que un endpoint no pueda alterar la copia
+    compartida. Los endpoints que modifican usuarios o perfiles invalidan la
+    entrada.
+
+    Para que desactivar o eliminar un usuario rija de inmediato en todos los
+    procesos de Passenger, cada invalidación reemplaza stamp_file y cada
+    lectura compara su (inodo, mtime) con el último visto: si cambió, el
+    proceso vacía su caché. Cuesta un stat() por request autenticado.
+    """
+
+    def __init__(self, max_entries: int = USER_CACHE_MAX_ENTRIES, ttl_seconds: int = USER_CACHE_TTL_SECONDS,
+                 stamp_file: Optional[str] = USER_CACHE_STAMP_FILE):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stamp_file = Path(stamp_file) if stamp_file else None
+        self._entries = OrderedDict()  # user_id -> (expira, columnas usuario, columnas perfil)
+        self._lock = threading.Lock()
+        self._stamp = self._read_stamp()
+        # Se incrementa al vaciar o invalidar: put() descarta lo leído de la BD antes de eso
+        self.generation = 0
+
+    def get(self, user_id: str) -> Optional[UserDB]:
+        if self.ttl_seconds <= 0:
+            return None
+        now = datetime.utcnow()
+        stamp = self._read_stamp()
+        with self._lock:
+            if stamp != self._stamp:
+                # Otro proceso modificó usuarios o perfiles
+                self._stamp = stamp
+                self._entries.clear()
+                self.generation += 1
+                return None
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user_columns, profile_columns = entry
+            if expires_at <= now:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+        user = UserDB(**user_columns)
+        if profile_columns is not None:
+            user.profile = ProfileDB(**profile_columns)
+        return user
+
+    def put(self, user: UserDB, generation: int):
+        """Guarda el usuario leído de la BD; generation es self.generation antes de leerlo"""
+        if self.ttl_seconds <= 0:
+            return
+        user_columns = {c.name: getattr(user, c.name) for c in UserDB.__table__.columns}
+        profile = user.profile
+        profile_columns = {c.name: getattr(profile, c.name) for c in ProfileDB.__table__.columns} if profile else None
+        expires_at = datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+        with self._lock:
+            if generation != self.generation:
+                # Hubo una invalidación mientras se leía: la fila puede ser anterior a ella
+                return
+            self._entries[user.id] = (expires_at, user_columns, profile_columns)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        """Llamar después del commit que modificó al usuario"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self.generation += 1
+        self._notify_processes()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+        self._notify_processes()
+
+    def _read_stamp(self):
+        if self.stamp_file is None:
+            return None
+        try:
+            stat = os.stat(self.stamp_file)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _notify_processes(self):
+        """Reemplaza stamp_file: archivo nuevo (inodo distinto) aunque el mtime no avance"""
+        if self.stamp_file is None:
+            return
+        tmp_path = self.stamp_file.with_suffix(f".{os.getpid()}_{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            tmp_path.write_text(f"{os.getpid()} {datetime.utcnow().isoformat()}", encoding='utf-8')
+            os.replace(tmp_path, self.stamp_file)
+        except OSError as e:
+            logger.warning(f"No se pudo avisar la invalidación de usuarios en {self.stamp_file}: {e}")
+
+user_cache = UserCache()
+
+def token_user_id(credentials: HTTPAuthorizationCredentials) -> str:
+    """Valida el JWT y retorna el id de usuario que contiene"""
     token = credentials.credentials
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
@@ -615,14 +1418,43 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         raise HTTPException(status_code=401, detail="Token expirado. Por favor, inicia sesión nuevamente")
     except jwt.InvalidTokenError as e:
         raise HTTPException(status_code=401, detail=f"Token inválido: {str(e)}")
+    return user_id
 
-    user = db.query(UserDB).filter(UserDB.id == user_id).first()
+def authenticated_user(user: Optional[UserDB]) -> UserDB:
     if user is None:
         raise HTTPException(status_code=401, detail="Usuario no encontrado")
     if not user.is_active:
         raise HTTPException(status_code=403, detail="Usuario desactivado")
+    info = request_info.get()
+    if info is not None:
+        info['user_id'] = user.id
     return user
 
+def load_user(db: Session, user_id: str) -> Optional[UserDB]:
+    return db.query(UserDB).options(joinedload(UserDB.profile)).filter(UserDB.id == user_id).first()
+
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> UserDB:
+    user_id = token_user_id(credentials)
+    user = user_cache.get(user_id)
+    if user is None:
+        generation = user_cache.generation
+        user = load_user(db, user_id)
+        if user is not None:
+            user_cache.put(user, generation)
+    return authenticated_user(user)
+
+async def get_current_user_async(credentials: HTTPAuthorizationCredentials = Depends(security), db=Depends(get_async_db)) -> UserDB:
+    """get_current_user para endpoints async: con el usuario en caché no pasa por el threadpool"""
+    user_id = token_user_id(credentials)
+    user = user_cache.get(user_id)
+    if user is None:
+        generation = user_cache.generation
+        result = await db_execute(db, select(UserDB).options(joinedload(UserDB.profile)).where(UserDB.id == user_id))
+        user = result.scalars().first()
+        if user is not None:
+            user_cache.put(user, generation)
+    return authenticated_user(user)
+
 def get_optional_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> Optional[UserDB]:
     """Obtiene el usuario actual si está autenticado, sino retorna None"""
     try:
@@ -632,30 +1464,200 @@ def get_optional_user(credentials: HTTPAuthorizationCredentials = Depends(securi
 
 # ============ HELPER FUNCTIONS ============
 
+def _serialize_datetime(value):
+    # date cubre también datetime (subclase)
+    return value.isoformat() if isinstance(value, date) else value
+
+def _serialize_time(value):
+    if isinstance(value, time):
+        return value.strftime("%H:%M")
+    if isinstance(value, timedelta):
+        total_seconds = int(value.total_seconds())
+        hours, remainder = divmod(total_seconds, 3600)
+        minutes = remainder // 60
+        return f"{hours:02d}:{minutes:02d}"
+    return value
+
+def _serialize_enum(value):
+    return value.value if isinstance(value, enum.Enum) else value
+
+def _column_converter(column):
+    """Elige el conversor según el tipo de la columna (una vez por modelo)"""
+    column_type = column.type
+    if isinstance(column_type, (DateTime, Date)):
+        return _serialize_datetime
+    if isinstance(column_type, Time):
+        return _serialize_time
+    if isinstance(column_type, Enum) and column_type.enum_class is not None:
+        return _serialize_enum
+    return None
+
+class ModelSerializer:
+    """Serializador precompilado de un modelo SQLAlchemy a dict JSON-compatible.
+
+    Resuelve columnas y conversores al crearse, y en cada fila lee primero el
+    __dict__ de la instancia (atributos ya cargados) antes de pasar por el
+    descriptor de SQLAlchemy.
+    """
+
+    def __init__(self, model, exclude: tuple = ()):
+        self.model = model
+        self.fields = tuple(
+            (column.key, _column_converter(column))
+            for column in model.__table__.columns
+            if column.key not in exclude
+        )
+        self._variants = {}
+
+    def without(self, exclude) -> 'ModelSerializer':
+        key = tuple(sorted(exclude))
+        variant = self._variants.get(key)
+        if variant is None:
+            variant = self._variants[key] = ModelSerializer(self.model, key)
+        return variant
+
+    def __call__(self, obj) -> dict:
+        state = obj.__dict__
+        result = {}
+        for name, convert in self.fields:
+            value = state[name] if name in state else getattr(obj, name)
+            if convert is not None and value is not None:
+                value = convert(value)
+            result[name] = value
+        return result
+
+MODEL_SERIALIZERS = {}
+
+def get_serializer(model) -> ModelSerializer:
+    serializer = MODEL_SERIALIZERS.get(model)
+    if serializer is None:
+        serializer = MODEL_SERIALIZERS[model] = ModelSerializer(model)
+    return serializer
+
 def db_to_dict(obj, exclude: Optional[List[str]] = None) -> dict:
     """Convert SQLAlchemy object to dictionary"""
     if obj is None:
         return None
-    exclude = exclude or []
-    result = {}
-    for column in obj.__table__.columns:
-        if column.name not in exclude:
-            value = getattr(obj, column.name)
-            if isinstance(value, datetime):
-                value = value.isoformat()
-            elif isinstance(value, date):
-                value = value.isoformat()
-            elif isinstance(value, time):
-                value = value.strftime("%H:%M")
-            elif isinstance(value, timedelta):
-                total_seconds = int(value.total_seconds())
-                hours, remainder = divmod(total_seconds, 3600)
-                minutes = remainder // 60
-                value = f"{hours:02d}:{minutes:02d}"
-            elif isinstance(value, enum.Enum):
-                value = value.value
-            result[column.name] = value
-    return result
+    serializer = get_serializer(type(obj))
+    if exclude:
+        serializer = serializer.without(exclude)
+    return serializer(obj)
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa json de la librería estándar
+    orjson = None
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse para contenido ya serializado con db_to_dict.
+
+    Retornarla desde un endpoint evita la pasada de jsonable_encoder de FastAPI
+    sobre cada fila; usa orjson si está instalado.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+PAGE_DEFAULT_LIMIT = 100
+PAGE_MAX_LIMIT = 500
+
+def encode_cursor(sort_value: Optional[datetime], row_id: str) -> str:
+    """Codifica la posición (valor de orden, id) como cursor opaco"""
+    raw = json.dumps([sort_value.isoformat() if sort_value else None, row_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decodifica un cursor generado por encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return (datetime.fromisoformat(sort_value) if sort_value else None, str(row_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+def keyset_condition(sort_column, id_column, cursor: str):
+    """Condición 'después del cursor' para el orden descendente de keyset_page.
+
+    Con un cursor no nulo solo cubre los valores no nulos: agregar
+    'OR sort_column IS NULL' hace que el plan recorra el índice completo en vez
+    de buscar el rango, y cada página cuesta según su posición. La cola de NULL
+    se pide aparte (keyset_statements) cuando el rango no nulo se agota.
+    """
+    sort_value, row_id = decode_cursor(cursor)
+    if sort_value is None:
+        return and_(sort_column == None, id_column < row_id)
+    return or_(
+        sort_column < sort_value,
+        and_(sort_column == sort_value, id_column < row_id)
+    )
+
+def keyset_statements(statement, sort_column, id_column, limit: int, cursor: Optional[str]) -> tuple:
+    """(consulta de la página, consulta de la cola de NULL o None) para un Query o un select().
+
+    La segunda solo se ejecuta si la primera trae limit filas o menos, con
+    .limit() de lo que falta para completar la página.
+    """
+    order = (sort_column.desc(), id_column.desc())
+    if not cursor:
+        # Sin cursor el orden DESC ya deja los NULL al final
+        return statement.order_by(*order).limit(limit + 1), None
+    page = statement.where(keyset_condition(sort_column, id_column, cursor)).order_by(*order).limit(limit + 1)
+    if decode_cursor(cursor)[0] is None:
+        return page, None
+    return page, statement.where(sort_column == None).order_by(id_column.desc())
+
+def _split_page(rows: list, limit: int, sort_column, id_column):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
+
+def keyset_page(query, sort_column, id_column, limit: int, cursor: Optional[str] = None):
+    """Pagina por keyset en orden descendente sobre (sort_column, id_column).
+
+    Retorna (filas, next_cursor). A diferencia de OFFSET, el costo de cada página
+    no crece con la posición, siempre que exista índice sobre las columnas de orden.
+    Los NULL se tratan como los valores más bajos, igual que MySQL en orden DESC.
+    """
+    limit = max(1, min(limit, PAGE_MAX_LIMIT))
+    page, null_tail = keyset_statements(query, sort_column, id_column, limit, cursor)
+    rows = page.all()
+    if null_tail is not None and len(rows) <= limit:
+        rows += null_tail.limit(limit + 1 - len(rows)).all()
+    return _split_page(rows, limit, sort_column, id_column)
+
+def paginated_rows(query, sort_column, id_column, limit: Optional[int], cursor: Optional[str]):
+    """Aplica keyset solo si se pidió explícitamente (limit o cursor).
+
+    Sin parámetros se mantiene la lista completa que espera el frontend actual.
+    Retorna (filas, paginado, next_cursor).
+    """
+    if limit is None and cursor is None:
+        return query.all(), False, None
+    rows, next_cursor = keyset_page(query, sort_column, id_column, limit or PAGE_DEFAULT_LIMIT, cursor)
+    return rows, True, next_cursor
+
+async def paginated_rows_async(db, statement, sort_column, id_column, limit: Optional[int], cursor: Optional[str]):
+    """paginated_rows para un select() sobre la sesión de get_async_db"""
+    if limit is None and cursor is None:
+        return (await db_execute(db, statement)).scalars().all(), False, None
+    limit = max(1, min(limit or PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT))
+    page, null_tail = keyset_statements(statement, sort_column, id_column, limit, cursor)
+    rows = list((await db_execute(db, page)).scalars().all())
+    if null_tail is not None and len(rows) <= limit:
+        rows += (await db_execute(db, null_tail.limit(limit + 1 - len(rows)))).scalars().all()
+    rows, next_cursor = _split_page(rows, limit, sort_column, id_column)
+    return rows, True, next_cursor
+
+def page_response(items: list, paginated: bool, next_cursor: Optional[str]) -> Response:
+    """Envuelve una página como {items, next_cursor}; en modo legado retorna la lista tal cual"""
+    if not paginated:
+        return FastJSONResponse(items)
+    return FastJSONResponse({"items": items, "next_cursor": next_cursor})
 
 def parse_date(date_str: Optional[str]) -> Optional[date]:
     """Parsea una fecha string a objeto date"""
@@ -686,13 +1688,293 @@ def parse_time(time_str: Optional[str]) -> Optional[time]:
         logger.warning(f"Error parseando hora '{time_str}': {e}")
         return None
 
-# ============ CREAR TABLAS AL IMPORTAR EL MÓDULO ============
-# Esto es necesario porque Passenger (WSGI) no ejecuta lifespan de ASGI
+# ============ CACHÉ DE CATÁLOGO PÚBLICO ============
+
+CATALOG_CACHE_TTL_SECONDS = int(os.environ.get('CATALOG_CACHE_TTL_SECONDS', 60))
+
+class CatalogCache:
+    """Respuestas pre-codificadas de los endpoints públicos con ETag y 304.
+
+    Cada tabla tiene un contador de versión que suben los endpoints que la
+    modifican. Mientras las versiones de las tablas de un endpoint no cambien y
+    la entrada tenga menos de CATALOG_CACHE_TTL_SECONDS, se responde desde
+    memoria sin tocar la BD. El TTL acota cuánto tarda en verse un cambio hecho
+    por otro proceso de Passenger. El ETag es el hash del cuerpo, así todos los
+    procesos entregan el mismo ETag para los mismos datos.
+    """
+
+    def __init__(self, ttl_seconds: int = CATALOG_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._versions = {}  # tabla -> versión
+        self._entries = {}   # clave -> (versiones, creado, etag, cuerpo)
+
+    def bump(self, *tables: str):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def _current(self, key: str, tables: tuple):
+        """(versiones actuales, entrada vigente o None)"""
+        now = perf_counter()
+        with self._lock:
+            versions = tuple(self._versions.get(t, 0) for t in tables)
+            entry = self._entries.get(key)
+        if entry is None or entry[0] != versions or now - entry[1] > self.ttl_seconds:
+            return versions, None
+        return versions, entry
+
+    def _store(self, key: str, versions: tuple, content) -> tuple:
+        body = FastJSONResponse(content).body
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        entry = (versions, perf_counter(), etag, body)
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    @staticmethod
+    def _response(request: Request, entry: tuple) -> Response:
+        etag, body = entry[2], entry[3]
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def respond(self, request: Request, key: str, tables: tuple, build) -> Response:
+        """Entrega la respuesta cacheada de `key` o la reconstruye con build(db)"""
+        versions, entry = self._current(key, tables)
+        if entry is None:
+            db = SessionLocal()
+            try:
+                content = build(db)
+            finally:
+                db.close()
+            entry = self._store(key, versions, content)
+        return self._response(request, entry)
+
+    async def respond_async(self, request: Request, key: str, tables: tuple, build) -> Response:
+        """respond() para endpoints async: build es una corrutina build(db) sobre async_session_scope"""
+        versions, entry = self._current(key, tables)
+        if entry is None:
+            async with async_session_scope() as db:
+                content = await build(db)
+            entry = self._store(key, versions, content)
+        return self._response(request, entry)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate == etag:
+            return True
+    return False
+
+catalog_cache = CatalogCache()
+
+# Serializadores precompilados para todos los modelos mapeados
+for _mapper in Base.registry.mappers:
+    get_serializer(_mapper.class_)
+
+# ============ MIGRACIONES DE ESQUEMA ============
+# Passenger (WSGI) no ejecuta lifespan de ASGI, así que el esquema se pone al día
+# al importar el módulo. schema_version guarda una fila por migración aplicada y
+# la huella de los modelos: si la última fila coincide con el código basta una
+# consulta. Si no, bajo un bloqueo para que un solo proceso lo haga: create_all
+# (tablas nuevas), las migraciones pendientes en orden y los índices declarados
+# en los modelos que falten. `python migrate.py upgrade` hace lo mismo a mano.
+#   SCHEMA_CHECK=version     (por defecto) lo anterior
+#   SCHEMA_CHECK=create_all  create_all e índices faltantes en cada arranque
+#   SCHEMA_CHECK=off         no tocar el esquema (migrate.py a mano)
+SCHEMA_CHECK = os.environ.get('SCHEMA_CHECK', 'version').lower()
+SCHEMA_LOCK_TIMEOUT = int(os.environ.get('SCHEMA_LOCK_TIMEOUT', 300))
+
+# Fuera de Base.metadata: no es una tabla de datos (respaldos, generate_data)
+schema_metadata = MetaData()
+schema_version_table = Table(
+    'schema_version', schema_metadata,
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('description', String(255), nullable=False),
+    Column('fingerprint', String(40), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+def schema_fingerprint() -> str:
+    """sha1 de las tablas, columnas, foreign keys e índices declarados en los modelos"""
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(f"T {table.name}")
+        for column in table.columns:
+            foreign_keys = sorted(fk.target_fullname for fk in column.foreign_keys)
+            parts.append(f"C {column.name} {column.type!r} {column.nullable} {column.primary_key} {column.unique} {foreign_keys}")
+        for index in sorted(table.indexes, key=lambda i: i.name or ''):
+            parts.append(f"I {index.name} {index.unique} {[c.name for c in index.columns]}")
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+def add_missing_columns(conn, table_name: str, columns: dict) -> list:
+    """ALTER TABLE ADD COLUMN de las columnas (nombre -> DDL) que la tabla aún no tiene"""
+    existing = {c['name'] for c in sa_inspect(conn).get_columns(table_name)}
+    added = [name for name in columns if name not in existing]
+    for name in added:
+        conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {name} {columns[name]}")
+    return added
+
+def missing_indexes(conn) -> list:
+    """Índices declarados en los modelos que no existen en la base. Un índice con las
+    mismas columnas y otro nombre (los idx_* de schema_fixed.sql) cuenta como existente."""
+    inspector = sa_inspect(conn)
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {tuple(i['column_names']) for i in inspector.get_indexes(table.name)}
+        existing.update(tuple(u['column_names']) for u in inspector.get_unique_constraints(table.name))
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            if tuple(c.name for c in index.columns) not in existing:
+                missing.append(index)
+    return missing
+
+def create_missing_indexes(conn) -> list:
+    created = []
+    for index in missing_indexes(conn):
+        logger.info(f"Creando índice {index.name} en {index.table.name}")
+        index.create(conn)
+        created.append(index.name)
+    return created
+
+def migrate_legacy_columns(conn):
+    """Lo que hacían a mano migration_add_product_columns.sql, migration_new_columns.sql,
+    migration_add_resource_columns.sql y migration_stock_movements.sql (las tablas
+    client_contacts y stock_movements ya las creó create_all)"""
+    added = add_missing_columns(conn, 'products', {
+        'commission_percentage': "FLOAT DEFAULT 0.0",
+        'min_order': "INT DEFAULT 1",
+        'provider': "VARCHAR(255) DEFAULT ''",
+        'image_url': "LONGTEXT",
+        'featured': "TINYINT(1) DEFAULT 0",
+        'featured_text': "VARCHAR(255) DEFAULT ''",
+        'stock_control_enabled': "TINYINT(1) DEFAULT 0",
+        'current_stock': "INT DEFAULT 0",
+        'min_stock_alert': "INT DEFAULT 5",
+        'low_stock': "TINYINT(1) DEFAULT 0",
+    })
+    if 'low_stock' in added:
+        conn.exec_driver_sql(
+            "UPDATE products SET low_stock = (stock_control_enabled = 1 AND is_active = 1 "
+            "AND COALESCE(current_stock, 0) <= min_stock_alert)"
+        )
+    add_missing_columns(conn, 'client_documents', {
+        'contract_start_date': "DATE",
+        'contract_end_date': "DATE",
+        'notes': "TEXT",
+    })
+    add_missing_columns(conn, 'requests', {'details': "JSON"})
+    add_missing_columns(conn, 'rooms', {'image_url': "LONGTEXT", 'description': "TEXT"})
+    add_missing_columns(conn, 'booths', {'image_url': "LONGTEXT", 'description': "TEXT", 'capacity': "INT"})
+    if conn.dialect.name in ('mysql', 'mariadb'):
+        # Text de SQLAlchemy es TEXT (64 KB) en MySQL: las imágenes y archivos en base64 no caben
+        for table_name, column_name in (('products', 'image_url'), ('client_documents', 'file_url'),
+                                        ('rooms', 'image_url'), ('booths', 'image_url')):
+            conn.exec_driver_sql(f"ALTER TABLE {table_name} MODIFY COLUMN {column_name} LONGTEXT")
+        conn.exec_driver_sql(
+            "ALTER TABLE requests MODIFY COLUMN status ENUM('new', 'pending', 'in_progress', 'completed', "
+            "'cancelled', 'confirmed', 'rejected') DEFAULT 'new'"
+        )
+
+# (versión, descripción, función(conn)). Solo se agregan al final; nunca se
+# modifica una migración ya publicada. Los índices nuevos basta con declararlos
+# en el modelo: se crean solos al cambiar la huella.
+SCHEMA_MIGRATIONS = (
+    (1, "Columnas de los migration_*.sql que se aplicaban a mano", migrate_legacy_columns),
+    (2, "Índices de consultas frecuentes declarados en los modelos", create_missing_indexes),
+)
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+def stored_schema_version() -> Optional[tuple]:
+    """(versión, huella) de la última migración registrada, o None si no hay"""
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(
+                select(schema_version_table.c.version, schema_version_table.c.fingerprint)
+                .order_by(schema_version_table.c.version.desc()).limit(1)
+            ).first()
+    except DBAPIError:
+        # Base anterior a las migraciones: aún no existe la tabla
+        return None
+    return tuple(row) if row else None
+
+@contextmanager
+def schema_lock(conn):
+    """Un solo proceso migra a la vez; los demás esperan y luego no encuentran nada pendiente"""
+    if conn.dialect.name not in ('mysql', 'mariadb'):
+        # SQLite serializa las escrituras por su cuenta
+        yield
+        return
+    acquired = conn.execute(text("SELECT GET_LOCK('tna_office_schema', :timeout)"), {'timeout': SCHEMA_LOCK_TIMEOUT}).scalar()
+    if acquired != 1:
+        raise RuntimeError(f"No se obtuvo el bloqueo de migraciones en {SCHEMA_LOCK_TIMEOUT}s")
+    try:
+        yield
+    finally:
+        conn.execute(text("SELECT RELEASE_LOCK('tna_office_schema')"))
+
+def migrate_schema() -> list:
+    """Crea tablas nuevas, aplica las migraciones pendientes y los índices faltantes.
+    Retorna la descripción de lo aplicado."""
+    fingerprint = schema_fingerprint()
+    applied = []
+    with engine.connect() as conn:
+        with schema_lock(conn):
+            inspector = sa_inspect(conn)
+            if inspector.has_table('schema_version') and \
+                    'version' not in {c['name'] for c in inspector.get_columns('schema_version')}:
+                # Formato anterior: una sola fila con la huella, sin versiones
+                conn.exec_driver_sql("DROP TABLE schema_version")
+            Base.metadata.create_all(bind=conn)
+            schema_metadata.create_all(bind=conn)
+            conn.commit()
+
+            current = conn.execute(select(func.max(schema_version_table.c.version))).scalar() or 0
+            for version, description, upgrade in SCHEMA_MIGRATIONS:
+                if version <= current:
+                    continue
+                logger.info(f"Aplicando migración {version}: {description}")
+                upgrade(conn)
+                conn.execute(insert(schema_version_table).values(
+                    version=version, description=description, fingerprint=fingerprint, applied_at=datetime.utcnow()
+                ))
+                conn.commit()
+                applied.append(f"{version}: {description}")
+                current = version
+
+            # Modelos cambiados sin migración nueva (p. ej. un índice declarado)
+            applied.extend(f"índice {name}" for name in create_missing_indexes(conn))
+            conn.execute(
+                update(schema_version_table).where(schema_version_table.c.version == current).values(fingerprint=fingerprint)
+            )
+            conn.commit()
+    return applied
+
+def ensure_schema() -> str:
+    """Deja el esquema al día según SCHEMA_CHECK y retorna qué hizo"""
+    if SCHEMA_CHECK == 'off':
+        return 'sin verificar'
+    stored = stored_schema_version()
+    if SCHEMA_CHECK != 'create_all' and stored and stored[0] >= SCHEMA_VERSION and stored[1] == schema_fingerprint():
+        return 'verificado'
+    applied = migrate_schema()
+    if applied:
+        logger.info(f"Esquema actualizado a la versión {SCHEMA_VERSION}: {'; '.join(applied)}")
+    return 'actualizado'
+
+schema_status = 'error'
 try:
-    Base.metadata.create_all(bind=engine)
-    logger.info("Tablas de base de datos verificadas/creadas")
+    schema_status = ensure_schema()
+    logger.info(f"Esquema de base de datos: {schema_status}")
 except Exception as e:
-    logger.error(f"Error creando tablas: {e}")
+    logger.error(f"Error verificando el esquema: {e}")
 
 # ============ APP SETUP ============
 
@@ -701,20 +1983,26 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Iniciando TNA Office API...")
     try:
-        # Crear tablas si no existen
-        Base.metadata.create_all(bind=engine)
-        logger.info("Tablas de base de datos verificadas/creadas")
+        # El esquema ya se verificó al importar el módulo (ensure_schema)
         # Test database connection
         from sqlalchemy import text
         with engine.connect() as conn:
             conn.execute(text("SELECT 1"))
         logger.info("Conexión a base de datos verificada")
+        # Construir índice de reservas (en Passenger se construye en la primera reserva)
+        db = SessionLocal()
+        try:
+            booking_index.rebuild(db)
+        finally:
+            db.close()
     except Exception as e:
         logger.error(f"Error conectando a la base de datos: {e}")
     yield
     # Shutdown
     logger.info("Cerrando TNA Office API...")
     engine.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 # --- MODIFICACIÓN EN SERVER.PY ---
 
@@ -734,29 +2022,95 @@ app = FastAPI(
 cors_origins_str = os.environ.get('CORS_ORIGINS', 'http://localhost:3000,http://localhost:5173')
 cors_origins = [origin.strip() for origin in cors_origins_str.split(',') if origin.strip()]
 
-# Middleware personalizado para manejar CORS en respuestas de error
-class CORSErrorMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+
+def cors_error_headers(scope) -> dict:
+    """Headers CORS para las respuestas 500 que se generan fuera de CORSMiddleware"""
+    origin = ''
+    for name, value in scope['headers']:
+        if name == b'origin':
+            origin = value.decode('latin-1')
+            break
+    if origin not in cors_origins:
+        return {}
+    return {
+        "Access-Control-Allow-Origin": origin,
+        "Access-Control-Allow-Credentials": "true",
+        "Access-Control-Allow-Methods": "*",
+        "Access-Control-Allow-Headers": "*",
+    }
+
+
+class RequestContextMiddleware:
+    """
+    Middleware ASGI puro (sin BaseHTTPMiddleware: ni tarea extra ni cuerpo en
+    memoria, las StreamingResponse salen tal cual). Por cada request:
+    - cuenta las sentencias SQL (para detectar N+1) y registra métricas y log
+    - expone método/ruta/usuario en request_info para el registro de consultas lentas
+    - convierte las excepciones no manejadas en un 500 JSON con headers CORS
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        counter = [0, 0.0]
+        token = request_query_count.set(counter)
+        info_token = request_info.set({'method': scope['method'], 'scope': scope, 'user_id': None})
+        started = perf_counter()
+        response = {'status': 500, 'started': False}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['started'] = True
+            await send(message)
+
         try:
-            response = await call_next(request)
-            return response
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
             logger.error(f"Error no manejado: {e}")
-            origin = request.headers.get("origin", "")
-            response = JSONResponse(
+            if response['started']:
+                # Ya se enviaron headers: no se puede reemplazar la respuesta
+                raise
+            response['status'] = 500
+            error = JSONResponse(
                 status_code=500,
-                content={"detail": "Error interno del servidor"}
+                content={"detail": "Error interno del servidor"},
+                headers=cors_error_headers(scope)
             )
-            if origin in cors_origins:
-                response.headers["Access-Control-Allow-Origin"] = origin
-                response.headers["Access-Control-Allow-Credentials"] = "true"
-                response.headers["Access-Control-Allow-Methods"] = "*"
-                response.headers["Access-Control-Allow-Headers"] = "*"
-            return response
-
-
-
-# Añadir middleware CORS (el orden es importante - este va primero)
+            await error(scope, receive, send)
+        finally:
+            request_query_count.reset(token)
+            request_info.reset(info_token)
+            record_request_metrics(scope, response['status'], perf_counter() - started, counter)
+            if startup_timer.first_response_pending:
+                startup_timer.first_response(scope['path'])
+        level = logging.WARNING if counter[0] > SQL_QUERY_WARN_THRESHOLD else logging.INFO
+        if logger.isEnabledFor(level):
+            logger.log(level, f"{scope['method']} {scope['path']} -> {response['status']} ({counter[0]} consultas SQL)")
+
+
+def record_request_metrics(scope, status_code: int, elapsed: float, counter: list):
+    # Se etiqueta con la plantilla de la ruta ('/api/clients/{client_id}') para acotar la cardinalidad
+    route = scope.get('route')
+    path = getattr(route, 'path', None) or 'unmatched'
+    if path == '/metrics':
+        return
+    method = scope['method']
+    metrics.inc('tna_http_requests_total', (('method', method), ('route', path), ('status', str(status_code))))
+    metrics.observe('tna_http_request_duration_seconds', (('method', method), ('route', path)), elapsed)
+    if counter[0]:
+        metrics.inc('tna_sql_statements_total', (('route', path),), counter[0])
+        metrics.inc('tna_sql_duration_seconds_total', (('route', path),), counter[1])
+    metrics.maybe_flush()
+
+
+# Añadir middleware CORS. Las HTTPException pasan por él (el handler de FastAPI
+# corre dentro), así que ya llevan sus headers CORS
 app.add_middleware(
     CORSMiddleware,
     allow_origins=cors_origins,
@@ -766,64 +2120,141 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
-# Añadir middleware de errores CORS (se ejecuta después del CORS middleware)
-app.add_middleware(CORSErrorMiddleware)
-
-# Exception handler global para asegurar headers CORS en errores HTTP
-@app.exception_handler(Exception)
-async def global_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Excepción global capturada: {exc}")
-    origin = request.headers.get("origin", "")
-    response = JSONResponse(
-        status_code=500,
-        content={"detail": "Error interno del servidor"}
-    )
-    if origin in cors_origins:
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-    return response
-
-@app.exception_handler(HTTPException)
-async def http_exception_handler(request: Request, exc: HTTPException):
-    origin = request.headers.get("origin", "")
-    response = JSONResponse(
-        status_code=exc.status_code,
-        content={"detail": exc.detail}
-    )
-    if origin in cors_origins:
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-    return response
+# El más externo: envuelve a CORSMiddleware y responde los errores no manejados
+app.add_middleware(RequestContextMiddleware)
 
-api_router = APIRouter()
+# Las rutas se registran directo en el router de la app: con include_router
+# FastAPI vuelve a construir cada ruta (dependencias, validadores) en el primer
+# request de cada proceso
+api_router = app.router
 
 # ============ UF PROXY ENDPOINT ============
 
+UF_API_URL = os.environ.get('UF_API_URL', 'https://mindicador.cl/api/uf')
+UF_FETCH_TIMEOUT = float(os.environ.get('UF_FETCH_TIMEOUT', 10))
+UF_CACHE_TTL_SECONDS = int(os.environ.get('UF_CACHE_TTL_SECONDS', 3600))
+UF_CACHE_FILE = Path(os.environ.get('UF_CACHE_FILE', str(ROOT_DIR / 'uf_cache.json')))
+
+def fetch_uf_from_mindicador() -> dict:
+    """Consulta el valor de la UF en mindicador.cl (o en UF_API_URL)"""
+    import urllib.request
+    req = urllib.request.Request(UF_API_URL, headers={'User-Agent': 'TNA-Office/2.0'})
+    with urllib.request.urlopen(req, timeout=UF_FETCH_TIMEOUT) as resp:
+        return json.loads(resp.read().decode())
+
+class UFProvider:
+    """Valor de la UF en memoria con TTL y refresco en segundo plano.
+
+    Mientras el valor está vigente se responde desde memoria. Cuando vence se
+    sigue sirviendo el valor anterior y un hilo lo refresca (uno a la vez). El
+    último valor conocido se guarda en disco para que un proceso recién creado
+    por Passenger no tenga que esperar a mindicador.cl. El fetcher es
+    intercambiable para usar un stub local en pruebas.
+    """
+
+    def __init__(self, fetcher=fetch_uf_from_mindicador, ttl_seconds: int = UF_CACHE_TTL_SECONDS,
+                 cache_file: Optional[Path] = UF_CACHE_FILE):
+        self.fetcher = fetcher
+        self.ttl_seconds = ttl_seconds
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._cold_lock = threading.Lock()
+        self._refreshing = False
+        self._value = None
+        self._fetched_at = None
+        self._load_from_disk()
+
+    def get(self) -> dict:
+        with self._lock:
+            value, fetched_at = self._value, self._fetched_at
+        if value is None:
+            # Arranque en frío sin copia en disco: no hay nada que servir, se espera al
+            # fetch. Un solo request lo hace; los demás esperan y toman su resultado
+            with self._cold_lock:
+                with self._lock:
+                    value = self._value
+                if value is not None:
+                    return value
+                return self.refresh()
+        if (datetime.utcnow() - fetched_at).total_seconds() > self.ttl_seconds:
+            self._refresh_in_background()
+        return value
+
+    def refresh(self) -> dict:
+        value = self.fetcher()
+        with self._lock:
+            self._value = value
+            self._fetched_at = datetime.utcnow()
+        self._save_to_disk()
+        return value
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, name='uf-refresh', daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning(f"No se pudo refrescar la UF, se mantiene el valor anterior: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _load_from_disk(self):
+        if not self.cache_file or not self.cache_file.exists():
+            return
+        try:
+            cached = json.loads(self.cache_file.read_text(encoding='utf-8'))
+            self._value = cached['value']
+            self._fetched_at = datetime.fromisoformat(cached['fetched_at'])
+        except Exception as e:
+            logger.warning(f"Caché de UF ilegible en {self.cache_file}: {e}")
+
+    def _save_to_disk(self):
+        if not self.cache_file:
+            return
+        with self._lock:
+            payload = {"value": self._value, "fetched_at": self._fetched_at.isoformat()}
+        try:
+            # Un temporal por proceso: varios procesos de Passenger pueden refrescar a la vez
+            tmp_path = self.cache_file.with_suffix(f".{os.getpid()}_{uuid.uuid4().hex[:8]}.tmp")
+            tmp_path.write_text(json.dumps(payload), encoding='utf-8')
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la caché de UF en {self.cache_file}: {e}")
+
+uf_provider = UFProvider()
+
 @api_router.get("/uf")
 def get_uf_value():
-    """Proxy para obtener el valor de la UF desde mindicador.cl"""
-    import urllib.request
-    import json as json_module
+    """Valor de la UF desde mindicador.cl, servido desde caché"""
     try:
-        req = urllib.request.Request('https://mindicador.cl/api/uf', headers={'User-Agent': 'TNA-Office/2.0'})
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            data = json_module.loads(resp.read().decode())
-            return data
+        return uf_provider.get()
     except Exception as e:
         logger.error(f"Error obteniendo valor UF: {e}")
         raise HTTPException(status_code=502, detail="No se pudo obtener el valor de la UF")
 
 # ============ AUTH ENDPOINTS ============
 
+def find_user_by_email(db: Session, email: str) -> Optional[UserDB]:
+    return db.query(UserDB).options(joinedload(UserDB.profile)).filter(UserDB.email == email).first()
+
 @api_router.post("/auth/login")
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(UserDB).filter(UserDB.email == user_data.email).first()
+async def login(user_data: UserLogin, db: Session = Depends(get_db)):
+    # async: bcrypt corre en password_hasher y la BD en el threadpool, sin bloquear el loop
+    user = await run_in_threadpool(find_user_by_email, db, user_data.email)
     if not user:
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
-    if not verify_password(user_data.password, user.password):
+    if not await password_hasher.verify(user_data.password, user.password):
         raise HTTPException(status_code=401, detail="Credenciales inválidas")
     if not user.is_active:
         raise HTTPException(status_code=403, detail="Usuario desactivado")
+    if password_hasher.needs_rehash(user.password):
+        password_hasher.rehash_in_background(user.id, user_data.password, user.password)
 
     token = create_access_token({"sub": user.id})
     user_dict = db_to_dict(user, exclude=['password'])
@@ -836,16 +2267,11 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
     logger.info(f"Usuario {user.email} inició sesión exitosamente")
     return {"token": token, "user": user_dict}
 
-@api_router.post("/auth/register")
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(UserDB).filter(UserDB.email == user_data.email).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Email ya registrado")
-
+def _create_user(db: Session, user_data: UserCreate, password_hash: str) -> dict:
     new_user = UserDB(
         id=str(uuid.uuid4()),
         email=user_data.email,
-        password=get_password_hash(user_data.password),
+        password=password_hash,
         name=user_data.name,
         role=user_data.role,
         profile_id=user_data.profile_id,
@@ -857,6 +2283,15 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
     logger.info(f"Nuevo usuario registrado: {new_user.email}")
     return db_to_dict(new_user, exclude=['password'])
 
+@api_router.post("/auth/register")
+async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+    existing = await run_in_threadpool(find_user_by_email, db, user_data.email)
+    if existing:
+        raise HTTPException(status_code=400, detail="Email ya registrado")
+
+    password_hash = await password_hasher.hash(user_data.password)
+    return await run_in_threadpool(_create_user, db, user_data, password_hash)
+
 @api_router.get("/auth/me")
 def get_me(current_user: UserDB = Depends(get_current_user)):
     user_dict = db_to_dict(current_user, exclude=['password'])
@@ -909,6 +2344,8 @@ def update_profile(profile_id: str, data: ProfileUpdate, db: Session = Depends(g
         profile.allowed_modules = data.allowed_modules
 
     db.commit()
+    # Los usuarios cacheados llevan una copia del perfil
+    user_cache.clear()
     return db_to_dict(profile)
 
 @api_router.delete("/profiles/{profile_id}")
@@ -924,6 +2361,7 @@ def delete_profile(profile_id: str, db: Session = Depends(get_db), current_user:
 
     db.delete(profile)
     db.commit()
+    user_cache.clear()
     return {"message": "Perfil eliminado"}
 
 @api_router.get("/modules")
@@ -951,7 +2389,7 @@ def get_users(db: Session = Depends(get_db), current_user: UserDB = Depends(get_
     if current_user.role != 'admin':
         raise HTTPException(status_code=403, detail="Solo administradores pueden ver usuarios")
 
-    users = db.query(UserDB).all()
+    users = db.query(UserDB).options(joinedload(UserDB.profile)).all()
     result = []
     for user in users:
         user_dict = db_to_dict(user, exclude=['password'])
@@ -975,11 +2413,7 @@ def get_user(user_id: str, db: Session = Depends(get_db), current_user: UserDB =
         user_dict['allowed_modules'] = AVAILABLE_MODULES if user.role == 'admin' else []
     return user_dict
 
-@api_router.put("/users/{user_id}")
-def update_user(user_id: str, data: UserUpdate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    if current_user.role != 'admin' and current_user.id != user_id:
-        raise HTTPException(status_code=403, detail="No tienes permisos para editar este usuario")
-
+def _update_user(db: Session, user_id: str, data: UserUpdate, password_hash: Optional[str], current_user: UserDB) -> dict:
     user = db.query(UserDB).filter(UserDB.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -994,12 +2428,21 @@ def update_user(user_id: str, data: UserUpdate, db: Session = Depends(get_db), c
         user.profile_id = data.profile_id if data.profile_id else None
     if data.commission_percentage is not None:
         user.commission_percentage = data.commission_percentage
-    if data.password:
-        user.password = get_password_hash(data.password)
+    if password_hash:
+        user.password = password_hash
 
     db.commit()
+    user_cache.invalidate(user_id)
     return db_to_dict(user, exclude=['password'])
 
+@api_router.put("/users/{user_id}")
+async def update_user(user_id: str, data: UserUpdate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    if current_user.role != 'admin' and current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="No tienes permisos para editar este usuario")
+
+    password_hash = await password_hasher.hash(data.password) if data.password else None
+    return await run_in_threadpool(_update_user, db, user_id, data, password_hash, current_user)
+
 @api_router.delete("/users/{user_id}")
 def delete_user(user_id: str, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
     if current_user.role != 'admin':
@@ -1013,20 +2456,24 @@ def delete_user(user_id: str, db: Session = Depends(get_db), current_user: UserD
 
     db.delete(user)
     db.commit()
+    user_cache.invalidate(user_id)
     return {"message": "Usuario eliminado"}
 
 # ============ CLIENTS ENDPOINTS ============
 
 @api_router.get("/clients")
-def get_clients(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    clients = db.query(ClientDB).filter(ClientDB.is_active == True).all()
+def get_clients(limit: Optional[int] = None, cursor: Optional[str] = None, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    query = db.query(ClientDB).filter(ClientDB.is_active == True).options(
+        selectinload(ClientDB.documents), selectinload(ClientDB.contacts)
+    )
+    clients, paginated, next_cursor = paginated_rows(query, ClientDB.created_at, ClientDB.id, limit, cursor)
     result = []
     for client in clients:
         client_dict = db_to_dict(client)
         client_dict['documents'] = [db_to_dict(d) for d in client.documents]
         client_dict['contacts'] = [db_to_dict(c) for c in client.contacts]
         result.append(client_dict)
-    return result
+    return page_response(result, paginated, next_cursor)
 
 @api_router.post("/clients")
 def create_client(data: dict, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
@@ -1044,6 +2491,8 @@ def create_client(data: dict, db: Session = Depends(get_db), current_user: UserD
         notes=data.get('notes')
     )
     db.add(client)
+    db.flush()
+    apply_rollup_delta(db, {}, rollup_snapshot(client))
     db.commit()
     return db_to_dict(client)
 
@@ -1064,10 +2513,12 @@ def update_client(client_id: str, data: dict, db: Session = Depends(get_db), cur
     if not client:
         raise HTTPException(status_code=404, detail="Cliente no encontrado")
 
+    before = rollup_snapshot(client)
     for key, value in data.items():
         if hasattr(client, key) and key != 'id':
             setattr(client, key, value)
 
+    apply_rollup_delta(db, before, rollup_snapshot(client))
     db.commit()
     return db_to_dict(client)
 
@@ -1077,7 +2528,9 @@ def delete_client(client_id: str, db: Session = Depends(get_db), current_user: U
     if not client:
         raise HTTPException(status_code=404, detail="Cliente no encontrado")
 
+    before = rollup_snapshot(client)
     client.is_active = False
+    apply_rollup_delta(db, before, rollup_snapshot(client))
     db.commit()
     return {"message": "Cliente eliminado"}
 
@@ -1179,7 +2632,7 @@ def delete_client_contact(client_id: str, contact_id: str, db: Session = Depends
 
 @api_router.get("/offices")
 def get_offices(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    offices = db.query(OfficeDB).all()
+    offices = db.query(OfficeDB).options(joinedload(OfficeDB.client)).all()
     result = []
     for office in offices:
         office_dict = db_to_dict(office)
@@ -1197,7 +2650,7 @@ def get_offices(db: Session = Depends(get_db), current_user: UserDB = Depends(ge
         else:
             office_dict['margin_percentage'] = 0
         result.append(office_dict)
-    return result
+    return FastJSONResponse(result)
 
 @api_router.post("/offices")
 def create_office(data: dict, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
@@ -1220,7 +2673,10 @@ def create_office(data: dict, db: Session = Depends(get_db), current_user: UserD
         notes=data.get('notes')
     )
     db.add(office)
+    db.flush()
+    apply_rollup_delta(db, {}, rollup_snapshot(office))
     db.commit()
+    catalog_cache.bump('offices')
     return db_to_dict(office)
 
 @api_router.put("/offices/{office_id}")
@@ -1229,6 +2685,7 @@ def update_office(office_id: str, data: dict, db: Session = Depends(get_db), cur
     if not office:
         raise HTTPException(status_code=404, detail="Oficina no encontrada")
 
+    before = rollup_snapshot(office)
     for key, value in data.items():
         if hasattr(office, key) and key != 'id':
             if key in ['contract_start', 'contract_end']:
@@ -1241,7 +2698,9 @@ def update_office(office_id: str, data: dict, db: Session = Depends(get_db), cur
     else:
         office.status = 'available'
 
+    apply_rollup_delta(db, before, rollup_snapshot(office))
     db.commit()
+    catalog_cache.bump('offices')
     return db_to_dict(office)
 
 @api_router.delete("/offices/{office_id}")
@@ -1250,20 +2709,22 @@ def delete_office(office_id: str, db: Session = Depends(get_db), current_user: U
     if not office:
         raise HTTPException(status_code=404, detail="Oficina no encontrada")
 
+    apply_rollup_delta(db, rollup_snapshot(office), {})
     db.delete(office)
     db.commit()
+    catalog_cache.bump('offices')
     return {"message": "Oficina eliminada"}
 
 @api_router.get("/offices/public/all")
-def get_public_offices_all(db: Session = Depends(get_db)):
-    offices = db.query(OfficeDB).all()
-    return [db_to_dict(o) for o in offices]
+def get_public_offices_all(request: Request):
+    return catalog_cache.respond(request, 'offices_public', ('offices',),
+                                 lambda db: [db_to_dict(o) for o in db.query(OfficeDB).all()])
 
 # ============ PARKING STORAGE ENDPOINTS ============
 
 @api_router.get("/parking-storage")
 def get_parking_storage(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    items = db.query(ParkingStorageDB).all()
+    items = db.query(ParkingStorageDB).options(joinedload(ParkingStorageDB.client)).all()
     result = []
     for item in items:
         item_dict = db_to_dict(item)
@@ -1286,6 +2747,8 @@ def create_parking_storage(data: dict, db: Session = Depends(get_db), current_us
         cost_uf=data.get('cost_uf', 0)
     )
     db.add(item)
+    db.flush()
+    apply_rollup_delta(db, {}, rollup_snapshot(item))
     db.commit()
     return db_to_dict(item)
 
@@ -1295,10 +2758,12 @@ def update_parking_storage(item_id: str, data: dict, db: Session = Depends(get_d
     if not item:
         raise HTTPException(status_code=404, detail="Item no encontrado")
 
+    before = rollup_snapshot(item)
     for key, value in data.items():
         if hasattr(item, key) and key != 'id':
             setattr(item, key, value)
 
+    apply_rollup_delta(db, before, rollup_snapshot(item))
     db.commit()
     return db_to_dict(item)
 
@@ -1308,6 +2773,7 @@ def delete_parking_storage(item_id: str, db: Session = Depends(get_db), current_
     if not item:
         raise HTTPException(status_code=404, detail="Item no encontrado")
 
+    apply_rollup_delta(db, rollup_snapshot(item), {})
     db.delete(item)
     db.commit()
     return {"message": "Item eliminado"}
@@ -1315,10 +2781,12 @@ def delete_parking_storage(item_id: str, db: Session = Depends(get_db), current_
 # ============ ROOMS ENDPOINTS ============
 
 @api_router.get("/rooms/public")
-def get_rooms_public(db: Session = Depends(get_db)):
+async def get_rooms_public(request: Request):
     """Endpoint público para obtener salas (sin autenticación)"""
-    rooms = db.query(RoomDB).filter(RoomDB.status == 'active').all()
-    return [db_to_dict(r) for r in rooms]
+    async def build(db):
+        rooms = (await db_execute(db, select(RoomDB).where(RoomDB.status == 'active'))).scalars().all()
+        return [db_to_dict(r) for r in rooms]
+    return await catalog_cache.respond_async(request, 'rooms_public', ('rooms',), build)
 
 @api_router.get("/rooms")
 def get_rooms(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
@@ -1343,6 +2811,8 @@ def create_room(data: dict, db: Session = Depends(get_db), current_user: UserDB
     )
     db.add(room)
     db.commit()
+    catalog_cache.bump('rooms')
+    booking_index.refresh_rooms(db)
     return db_to_dict(room)
 
 @api_router.put("/rooms/{room_id}")
@@ -1356,6 +2826,8 @@ def update_room(room_id: str, data: dict, db: Session = Depends(get_db), current
             setattr(room, key, value)
 
     db.commit()
+    catalog_cache.bump('rooms')
+    booking_index.refresh_rooms(db)
     return db_to_dict(room)
 
 @api_router.delete("/rooms/{room_id}")
@@ -1366,15 +2838,16 @@ def delete_room(room_id: str, db: Session = Depends(get_db), current_user: UserD
 
     room.status = 'inactive'
     db.commit()
+    catalog_cache.bump('rooms')
     return {"message": "Sala eliminada"}
 
 # ============ BOOTHS ENDPOINTS ============
 
 @api_router.get("/booths/public")
-def get_booths_public(db: Session = Depends(get_db)):
+def get_booths_public(request: Request):
     """Endpoint público para obtener casetas (sin autenticación)"""
-    booths = db.query(BoothDB).filter(BoothDB.status == 'active').all()
-    return [db_to_dict(b) for b in booths]
+    return catalog_cache.respond(request, 'booths_public', ('booths',),
+                                 lambda db: [db_to_dict(b) for b in db.query(BoothDB).filter(BoothDB.status == 'active').all()])
 
 @api_router.get("/booths")
 def get_booths(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
@@ -1396,6 +2869,7 @@ def create_booth(data: dict, db: Session = Depends(get_db), current_user: UserDB
     )
     db.add(booth)
     db.commit()
+    catalog_cache.bump('booths')
     return db_to_dict(booth)
 
 @api_router.put("/booths/{booth_id}")
@@ -1409,13 +2883,318 @@ def update_booth(booth_id: str, data: dict, db: Session = Depends(get_db), curre
             setattr(booth, key, value)
 
     db.commit()
+    catalog_cache.bump('booths')
     return db_to_dict(booth)
 
+# ============ ÍNDICE DE INTERVALOS DE RESERVAS ============
+
+BOOKING_INDEX_TTL_SECONDS = int(os.environ.get('BOOKING_INDEX_TTL_SECONDS', 300))
+
+def _time_to_minutes(value) -> Optional[int]:
+    """Convierte un time (o timedelta, como lo entrega PyMySQL) a minutos desde medianoche"""
+    if value is None:
+        return None
+    if isinstance(value, timedelta):
+        return int(value.total_seconds()) // 60
+    return value.hour * 60 + value.minute
+
+def _json_list(value) -> list:
+    """Normaliza columnas JSON de salas (lista, string JSON o valor suelto) a lista"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return [value]
+    if isinstance(value, dict):
+        value = [value]
+    if not isinstance(value, list):
+        return [value]
+    return [v.get('id') if isinstance(v, dict) else v for v in value]
+
+class BookingIntervalIndex:
+    """Índice en memoria de reservas por (resource_type, resource_id, date).
+
+    Cada clave guarda una lista ordenada de (inicio, fin, booking_id) en minutos,
+    de modo que la búsqueda de solapes es un bisect más los candidatos del día.
+    Además mantiene el cierre transitivo de bloqueos entre salas calculado desde
+    RoomDB.blocks_rooms y RoomDB.related_rooms.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._intervals = {}   # (resource_type, resource_id, date) -> [(inicio, fin, id)]
+        self._by_booking = {}  # booking_id -> (clave, entrada)
+        self._conflicting_rooms = {}  # room_id -> set de room_ids que no pueden coincidir
+        self._built_at = None
+
+    # --- construcción ---
+
+    def rebuild(self, db: Session):
+        """Reconstruye el índice completo desde BookingDB y RoomDB"""
+        rows = db.query(
+            BookingDB.id, BookingDB.resource_type, BookingDB.resource_id,
+            BookingDB.date, BookingDB.start_time, BookingDB.end_time
+        ).filter(BookingDB.status != 'cancelled', BookingDB.date != None).all()
+        rooms = db.query(RoomDB.id, RoomDB.name, RoomDB.blocks_rooms, RoomDB.related_rooms).all()
+
+        intervals = {}
+        by_booking = {}
+        for row in rows:
+            entry = self._entry(row.start_time, row.end_time, row.id)
+            if entry is None:
+                continue
+            key = (row.resource_type, row.resource_id, row.date)
+            intervals.setdefault(key, []).append(entry)
+            by_booking[row.id] = (key, entry)
+        for entries in intervals.values():
+            entries.sort()
+
+        conflicting_rooms = self._compute_room_closure(rooms)
+        with self._lock:
+            self._intervals = intervals
+            self._by_booking = by_booking
+            self._conflicting_rooms = conflicting_rooms
+            self._built_at = datetime.utcnow()
+        logger.info(f"Índice de reservas construido: {len(by_booking)} reservas, {len(intervals)} días-recurso")
+
+    def ensure_built(self, db: Session):
+        """Construye el índice la primera vez y lo renueva cuando supera el TTL"""
+        built_at = self._built_at
+        if built_at is None or (datetime.utcnow() - built_at).total_seconds() > BOOKING_INDEX_TTL_SECONDS:
+            self.rebuild(db)
+
+    def refresh_rooms(self, db: Session):
+        """Recalcula el cierre de bloqueos tras crear/editar/eliminar salas"""
+        rooms = db.query(RoomDB.id, RoomDB.name, RoomDB.blocks_rooms, RoomDB.related_rooms).all()
+        conflicting_rooms = self._compute_room_closure(rooms)
+        with self._lock:
+            self._conflicting_rooms = conflicting_rooms
+
+    def lock_resources(self, db: Session, resource_type: str, resource_id: str, booking_date: date):
+        """Bloquea (SELECT ... FOR UPDATE) el recurso y sus salas bloqueadas hasta el commit.
+
+        Serializa validar y guardar: otra escritura sobre los mismos recursos,
+        en este u otro proceso, espera a que esta confirme y luego ve su reserva.
+        Las filas se piden en orden de id para que dos salas que se bloquean
+        entre sí no queden esperándose mutuamente.
+        """
+        resource_ids_by_type = {}
+        for rtype, rid, _ in self._keys_for(resource_type, resource_id, booking_date):
+            resource_ids_by_type.setdefault(rtype, set()).add(rid)
+        for rtype, rids in sorted(resource_ids_by_type.items()):
+            model = RoomDB if rtype == 'room' else BoothDB
+            db.execute(select(model.id).where(model.id.in_(rids)).order_by(model.id).with_for_update())
+
+    def refresh_day(self, db: Session, resource_type: str, resource_id: str, booking_date: date):
+        """Relee desde la BD las reservas del día para el recurso y sus salas bloqueadas.
+
+        Así un proceso Passenger ve las reservas escritas por otros procesos antes
+        de validar una escritura. La lectura es con bloqueo compartido: en
+        REPEATABLE READ una lectura normal usaría el snapshot del inicio de la
+        transacción y no vería lo confirmado mientras se esperaba lock_resources.
+        """
+        keys = self._keys_for(resource_type, resource_id, booking_date)
+        resource_ids_by_type = {}
+        for rtype, rid, _ in keys:
+            resource_ids_by_type.setdefault(rtype, set()).add(rid)
+
+        fresh = {key: [] for key in keys}
+        fresh_ids = {}
+        for rtype, rids in resource_ids_by_type.items():
+            rows = db.query(
+                BookingDB.id, BookingDB.resource_id, BookingDB.start_time, BookingDB.end_time
+            ).filter(
+                BookingDB.resource_type == rtype,
+                BookingDB.resource_id.in_(rids),
+                BookingDB.date == booking_date,
+                BookingDB.status != 'cancelled'
+            ).with_for_update(read=True).all()
+            for row in rows:
+                entry = self._entry(row.start_time, row.end_time, row.id)
+                if entry is None:
+                    continue
+                key = (rtype, row.resource_id, booking_date)
+                fresh[key].append(entry)
+                fresh_ids[row.id] = (key, entry)
+
+        with self._lock:
+            for key, entries in fresh.items():
+                for _, _, booking_id in self._intervals.get(key, []):
+                    self._by_booking.pop(booking_id, None)
+                if entries:
+                    entries.sort()
+                    self._intervals[key] = entries
+                else:
+                    self._intervals.pop(key, None)
+            for booking_id, value in fresh_ids.items():
+                self._discard_locked(booking_id)
+                self._by_booking[booking_id] = value
+
+    # --- escrituras incrementales ---
+
+    def upsert(self, booking: BookingDB):
+        """Refleja en el índice el estado actual de una reserva"""
+        with self._lock:
+            self._discard_locked(booking.id)
+            if booking.status == 'cancelled' or booking.date is None:
+                return
+            entry = self._entry(booking.start_time, booking.end_time, booking.id)
+            if entry is None:
+                return
+            key = (booking.resource_type, booking.resource_id, booking.date)
+            bisect.insort(self._intervals.setdefault(key, []), entry)
+            self._by_booking[booking.id] = (key, entry)
+
+    def remove(self, booking_id: str):
+        with self._lock:
+            self._discard_locked(booking_id)
+
+    # --- consultas ---
+
+    def find_conflicts(self, resource_type: str, resource_id: str, booking_date: date,
+                       start_time, end_time, exclude_id: Optional[str] = None) -> List[tuple]:
+        """Retorna [(resource_type, resource_id, inicio, fin, booking_id)] que se solapan"""
+        start = _time_to_minutes(start_time)
+        end = _time_to_minutes(end_time)
+        if booking_date is None or start is None or end is None or end <= start:
+            return []
+
+        conflicts = []
+        with self._lock:
+            for key in self._keys_for(resource_type, resource_id, booking_date):
+                entries = self._intervals.get(key)
+                if not entries:
+                    continue
+                # Solo las reservas que empiezan antes de `end` pueden solaparse
+                hi = bisect.bisect_left(entries, (end,))
+                for i in range(hi - 1, -1, -1):
+                    s, e, booking_id = entries[i]
+                    if e > start and booking_id != exclude_id:
+                        conflicts.append((key[0], key[1], s, e, booking_id))
+        return conflicts
+
+    def conflicting_rooms(self, room_id: str) -> set:
+        """Salas que no pueden reservarse a la vez que room_id (cierre de bloqueos)"""
+        with self._lock:
+            return set(self._conflicting_rooms.get(room_id, ()))
+
+    def busy_intervals(self, resource_type: str, resource_id: str, booking_date: date) -> List[tuple]:
+        """Intervalos ocupados (inicio, fin) del recurso en el día, incluyendo salas bloqueadas"""
+        with self._lock:
+            busy = []
+            for key in self._keys_for(resource_type, resource_id, booking_date):
+                busy.extend((s, e) for s, e, _ in self._intervals.get(key, ()))
+        busy.sort()
+        return busy
+
+    # --- internos ---
+
+    @staticmethod
+    def _entry(start_time, end_time, booking_id: str) -> Optional[tuple]:
+        start = _time_to_minutes(start_time)
+        end = _time_to_minutes(end_time)
+        if start is None or end is None or end <= start:
+            return None
+        return (start, end, booking_id)
+
+    def _keys_for(self, resource_type: str, resource_id: str, booking_date: date) -> List[tuple]:
+        keys = [(resource_type, resource_id, booking_date)]
+        if resource_type == 'room':
+            keys.extend(('room', rid, booking_date) for rid in self._conflicting_rooms.get(resource_id, ()))
+        return keys
+
+    def _discard_locked(self, booking_id: str):
+        previous = self._by_booking.pop(booking_id, None)
+        if previous is None:
+            return
+        key, entry = previous
+        entries = self._intervals.get(key)
+        if entries:
+            i = bisect.bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                entries.pop(i)
+            if not entries:
+                del self._intervals[key]
+
+    @staticmethod
+    def _compute_room_closure(rooms) -> dict:
+        """Cierre transitivo de bloqueos entre salas.
+
+        blocks_rooms es dirigido (A bloquea B y, por transitividad, lo que B bloquea);
+        related_rooms se considera mutuo. El conflicto resultante es simétrico: si A
+        bloquea B, una reserva en B también impide reservar A.
+        """
+        room_ids = {r.id for r in rooms}
+        ids_by_name = {r.name: r.id for r in rooms if r.name}
+
+        def resolve(ref):
+            if ref in room_ids:
+                return ref
+            return ids_by_name.get(ref)
+
+        edges = {r.id: set() for r in rooms}
+        for room in rooms:
+            for ref in _json_list(room.blocks_rooms):
+                target = resolve(ref)
+                if target and target != room.id:
+                    edges[room.id].add(target)
+            for ref in _json_list(room.related_rooms):
+                target = resolve(ref)
+                if target and target != room.id:
+                    edges[room.id].add(target)
+                    edges[target].add(room.id)
+
+        conflicting = {room_id: set() for room_id in edges}
+        for room_id, targets in edges.items():
+            seen = set()
+            stack = list(targets)
+            while stack:
+                current = stack.pop()
+                if current in seen or current == room_id:
+                    continue
+                seen.add(current)
+                stack.extend(edges.get(current, ()))
+            for target in seen:
+                conflicting[room_id].add(target)
+                conflicting[target].add(room_id)
+        return {room_id: rids for room_id, rids in conflicting.items() if rids}
+
+booking_index = BookingIntervalIndex()
+
+def _minutes_label(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def check_booking_conflicts(db: Session, resource_type: str, resource_id: str, booking_date: Optional[date],
+                            start_time, end_time, status: Optional[str], exclude_id: Optional[str] = None):
+    """Lanza 409 si la reserva se solapa con otra del mismo recurso o de una sala bloqueada.
+
+    Deja bloqueados los recursos hasta que el llamador haga commit (o rollback).
+    """
+    if status == 'cancelled' or booking_date is None:
+        return
+    booking_index.ensure_built(db)
+    booking_index.lock_resources(db, resource_type, resource_id, booking_date)
+    booking_index.refresh_day(db, resource_type, resource_id, booking_date)
+    conflicts = booking_index.find_conflicts(resource_type, resource_id, booking_date, start_time, end_time, exclude_id)
+    if not conflicts:
+        return
+
+    rtype, rid, start, end, _ = conflicts[0]
+    if rid == resource_id:
+        detail = f"El recurso ya tiene una reserva entre {_minutes_label(start)} y {_minutes_label(end)}"
+    else:
+        room = db.query(RoomDB.name).filter(RoomDB.id == rid).first()
+        room_name = room.name if room else rid
+        detail = f"Horario bloqueado por una reserva en {room_name} entre {_minutes_label(start)} y {_minutes_label(end)}"
+    raise HTTPException(status_code=409, detail=detail)
+
 # ============ BOOKINGS ENDPOINTS ============
 
 @api_router.get("/bookings")
-def get_bookings(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    bookings = db.query(BookingDB).all()
+async def get_bookings(limit: Optional[int] = None, cursor: Optional[str] = None, db=Depends(get_async_db), current_user: UserDB = Depends(get_current_user_async)):
+    bookings, paginated, next_cursor = await paginated_rows_async(db, select(BookingDB), BookingDB.created_at, BookingDB.id, limit, cursor)
     result = []
     for b in bookings:
         booking_dict = db_to_dict(b)
@@ -1425,7 +3204,7 @@ def get_bookings(db: Session = Depends(get_db), current_user: UserDB = Depends(g
         if b.date and b.end_time:
             booking_dict['end_datetime'] = f"{b.date.isoformat()}T{b.end_time.strftime('%H:%M:%S')}"
         result.append(booking_dict)
-    return result
+    return page_response(result, paginated, next_cursor)
 
 @api_router.post("/bookings")
 def create_booking(data: BookingCreate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
@@ -1435,6 +3214,10 @@ def create_booking(data: BookingCreate, db: Session = Depends(get_db), current_u
         if not booking_date and data.start_time and 'T' in data.start_time:
             booking_date = parse_date(data.start_time)
 
+        start_time = parse_time(data.start_time)
+        end_time = parse_time(data.end_time)
+        check_booking_conflicts(db, data.resource_type, data.resource_id, booking_date, start_time, end_time, data.status)
+
         booking = BookingDB(
             id=str(uuid.uuid4()),
             resource_type=data.resource_type,
@@ -1445,8 +3228,8 @@ def create_booking(data: BookingCreate, db: Session = Depends(get_db), current_u
             client_email=data.client_email,
             client_phone=data.client_phone,
             date=booking_date,
-            start_time=parse_time(data.start_time),
-            end_time=parse_time(data.end_time),
+            start_time=start_time,
+            end_time=end_time,
             status=data.status,
             total_price=data.total_price,
             notes=data.notes,
@@ -1455,7 +3238,10 @@ def create_booking(data: BookingCreate, db: Session = Depends(get_db), current_u
         db.add(booking)
         db.commit()
         db.refresh(booking)
+        booking_index.upsert(booking)
         return db_to_dict(booking)
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"Error creando booking: {e}")
@@ -1499,8 +3285,12 @@ def update_booking(booking_id: str, data: BookingUpdate, db: Session = Depends(g
         if data.notes is not None:
             booking.notes = data.notes
 
+        check_booking_conflicts(db, booking.resource_type, booking.resource_id, booking.date,
+                                booking.start_time, booking.end_time, booking.status, exclude_id=booking.id)
+
         db.commit()
         db.refresh(booking)
+        booking_index.upsert(booking)
 
         # Agregar campos combinados para el frontend
         result = db_to_dict(booking)
@@ -1524,6 +3314,7 @@ def delete_booking(booking_id: str, db: Session = Depends(get_db), current_user:
 
     db.delete(booking)
     db.commit()
+    booking_index.remove(booking_id)
     return {"message": "Reserva eliminada"}
 
 @api_router.get("/bookings/public/{resource_type}/{resource_id}")
@@ -1535,8 +3326,186 @@ def get_public_bookings(resource_type: str, resource_id: str, db: Session = Depe
     ).all()
     return [db_to_dict(b) for b in bookings]
 
+# ============ AVAILABILITY SEARCH ============
+
+# Horario de atención del calendario de recursos (igual al del frontend)
+BOOKING_OPEN_TIME = os.environ.get('BOOKING_OPEN_TIME', '08:00')
+BOOKING_CLOSE_TIME = os.environ.get('BOOKING_CLOSE_TIME', '19:00')
+AVAILABILITY_MAX_DAYS = 31
+
+def _free_gaps(busy: List[tuple], open_min: int, close_min: int):
+    """Recorre intervalos ocupados ordenados por inicio y genera los huecos libres del día"""
+    cursor = open_min
+    for start, end in busy:
+        if start >= close_min:
+            break
+        if start > cursor:
+            yield (cursor, start)
+        if end > cursor:
+            cursor = end
+    if cursor < close_min:
+        yield (cursor, close_min)
+
+@api_router.get("/availability/search")
+def search_availability(date_from: str, date_to: Optional[str] = None, duration: float = 1.0,
+                        min_capacity: int = 0, resource_type: Optional[str] = None, limit: int = 50,
+                        db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    """Busca horarios libres en todas las salas y casetas activas"""
+    start_date = parse_date(date_from)
+    end_date = parse_date(date_to) if date_to else start_date
+    if not start_date or not end_date or end_date < start_date:
+        raise HTTPException(status_code=400, detail="Rango de fechas inválido")
+    if (end_date - start_date).days >= AVAILABILITY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"El rango máximo de búsqueda es de {AVAILABILITY_MAX_DAYS} días")
+    if duration <= 0:
+        raise HTTPException(status_code=400, detail="La duración debe ser mayor a 0")
+    if resource_type not in (None, 'room', 'booth'):
+        raise HTTPException(status_code=400, detail=f"Tipo de recurso no válido: {resource_type}")
+
+    open_min = _time_to_minutes(parse_time(BOOKING_OPEN_TIME))
+    close_min = _time_to_minutes(parse_time(BOOKING_CLOSE_TIME))
+    duration_min = int(round(duration * 60))
+
+    resources = []
+    if resource_type in (None, 'room'):
+        query = db.query(RoomDB.id, RoomDB.name, RoomDB.capacity, RoomDB.hourly_rate).filter(RoomDB.status == 'active')
+        if min_capacity:
+            query = query.filter(RoomDB.capacity >= min_capacity)
+        resources.extend(('room', r) for r in query.all())
+    if resource_type in (None, 'booth'):
+        query = db.query(BoothDB.id, BoothDB.name, BoothDB.capacity, BoothDB.hourly_rate).filter(BoothDB.status == 'active')
+        if min_capacity:
+            query = query.filter(BoothDB.capacity >= min_capacity)
+        resources.extend(('booth', b) for b in query.all())
+    if not resources:
+        return []
+
+    # Una sola consulta con todas las reservas del rango, ya ordenadas por inicio
+    busy_by_key = {}
+    rows = db.query(
+        BookingDB.resource_type, BookingDB.resource_id, BookingDB.date,
+        BookingDB.start_time, BookingDB.end_time
+    ).filter(
+        BookingDB.date >= start_date,
+        BookingDB.date <= end_date,
+        BookingDB.status != 'cancelled'
+    ).order_by(BookingDB.start_time).all()
+    for row in rows:
+        start = _time_to_minutes(row.start_time)
+        end = _time_to_minutes(row.end_time)
+        if start is None or end is None or end <= start:
+            continue
+        busy_by_key.setdefault((row.resource_type, row.resource_id, row.date), []).append((start, end))
+
+    booking_index.ensure_built(db)
+    candidates = []
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    for rtype, resource in resources:
+        related = booking_index.conflicting_rooms(resource.id) if rtype == 'room' else set()
+        for day in days:
+            own = busy_by_key.get((rtype, resource.id, day), [])
+            if related:
+                busy = list(heapq.merge(own, *(busy_by_key.get(('room', rid, day), []) for rid in related)))
+            else:
+                busy = own
+            for gap_start, gap_end in _free_gaps(busy, open_min, close_min):
+                if gap_end - gap_start < duration_min:
+                    continue
+                candidates.append({
+                    "resource_type": rtype,
+                    "resource_id": resource.id,
+                    "resource_name": resource.name,
+                    "capacity": resource.capacity,
+                    "date": day.isoformat(),
+                    "start_time": _minutes_label(gap_start),
+                    "end_time": _minutes_label(gap_start + duration_min),
+                    "free_until": _minutes_label(gap_end),
+                    "estimated_price": round((resource.hourly_rate or 0) * duration, 2),
+                    # Para ranking: menor holgura de capacidad y de hueco primero
+                    "_rank": (day, gap_start, (resource.capacity or 0) - min_capacity, gap_end - gap_start - duration_min)
+                })
+
+    candidates.sort(key=lambda c: c["_rank"])
+    result = candidates[:max(limit, 0)]
+    for candidate in result:
+        del candidate["_rank"]
+    return result
+
 # ============ PRODUCTS ENDPOINTS ============
 
+def product_is_low_stock(product: ProductDB) -> bool:
+    return bool(
+        product.stock_control_enabled
+        and product.is_active is not False
+        and (product.current_stock or 0) <= (product.min_stock_alert or 0)
+    )
+
+@event.listens_for(ProductDB, 'before_insert')
+@event.listens_for(ProductDB, 'before_update')
+def sync_low_stock_flag(mapper, connection, target):
+    """Mantiene low_stock al día cuando el producto se guarda por el ORM"""
+    target.low_stock = product_is_low_stock(target)
+
+def apply_stock_deltas(db: Session, deltas: dict, reason: str, reference_id: Optional[str] = None,
+                       notes: Optional[str] = None, user_id: Optional[str] = None) -> list:
+    """Aplica {product_id: delta} con un UPDATE atómico por producto y registra el movimiento.
+
+    Solo afecta productos con control de stock habilitado. low_stock se asigna
+    antes que current_stock para que MySQL (que evalúa el SET de izquierda a
+    derecha) y SQLite calculen el flag con el mismo valor anterior.
+    Retorna las filas insertadas en stock_movements.
+    """
+    movements = []
+    now = datetime.utcnow()
+    for product_id, delta in deltas.items():
+        if not product_id or not delta:
+            continue
+        new_stock = func.coalesce(ProductDB.current_stock, 0) + delta
+        result = db.execute(
+            update(ProductDB)
+            .where(ProductDB.id == product_id, ProductDB.stock_control_enabled == True)
+            .ordered_values(
+                (ProductDB.low_stock, and_(ProductDB.is_active == True, new_stock <= ProductDB.min_stock_alert)),
+                (ProductDB.current_stock, new_stock),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            movements.append({
+                'id': str(uuid.uuid4()),
+                'product_id': product_id,
+                'quantity': delta,
+                'reason': reason,
+                'reference_id': reference_id,
+                'notes': notes,
+                'created_by': user_id,
+                'created_at': now,
+            })
+    if movements:
+        db.execute(insert(StockMovementDB), movements)
+        # Se invalida al confirmar: antes, una reconstrucción concurrente guardaría el stock anterior
+        db.info.setdefault('catalog_bumps', set()).add('products')
+    return movements
+
+@event.listens_for(SessionLocal, 'after_commit')
+def bump_catalog_on_commit(session):
+    tables = session.info.pop('catalog_bumps', None)
+    if tables:
+        catalog_cache.bump(*tables)
+
+@event.listens_for(SessionLocal, 'after_rollback')
+def discard_catalog_bumps(session):
+    session.info.pop('catalog_bumps', None)
+
+def ticket_item_quantities(items) -> dict:
+    """Suma las cantidades por producto de filas/dicts de ticket_items"""
+    quantities = {}
+    for item in items:
+        product_id = item['product_id']
+        if product_id:
+            quantities[product_id] = quantities.get(product_id, 0) + int(item['quantity'] or 0)
+    return quantities
+
 @api_router.get("/products")
 def get_products(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
     products = db.query(ProductDB).filter(ProductDB.is_active == True).all()
@@ -1545,7 +3514,7 @@ def get_products(db: Session = Depends(get_db), current_user: UserDB = Depends(g
         d = db_to_dict(p)
         d['cost_price'] = d.get('cost', 0) or 0
         result.append(d)
-    return result
+    return FastJSONResponse(result)
 
 @api_router.post("/products")
 def create_product(data: dict, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
@@ -1570,7 +3539,12 @@ def create_product(data: dict, db: Session = Depends(get_db), current_user: User
         min_stock_alert=data.get('min_stock_alert', 5)
     )
     db.add(product)
+    if product.stock_control_enabled and product.current_stock:
+        db.flush()
+        db.add(StockMovementDB(product_id=product.id, quantity=product.current_stock, reason='initial',
+                               created_by=current_user.id))
     db.commit()
+    catalog_cache.bump('products')
     result = db_to_dict(product)
     result['cost_price'] = result.get('cost', 0)
     return result
@@ -1585,11 +3559,18 @@ def update_product(product_id: str, data: dict, db: Session = Depends(get_db), c
     if 'cost_price' in data:
         data['cost'] = data.pop('cost_price')
 
+    # Un stock absoluto se registra como ajuste en el historial de movimientos
+    if 'current_stock' in data and product.stock_control_enabled:
+        delta = int(data.pop('current_stock') or 0) - (product.current_stock or 0)
+        apply_stock_deltas(db, {product.id: delta}, 'adjustment', user_id=current_user.id)
+        db.expire(product, ['current_stock', 'low_stock'])
+
     for key, value in data.items():
-        if hasattr(product, key) and key != 'id':
+        if hasattr(product, key) and key not in ('id', 'low_stock'):
             setattr(product, key, value)
 
     db.commit()
+    catalog_cache.bump('products')
     result = db_to_dict(product)
     result['cost_price'] = result.get('cost', 0)
     return result
@@ -1602,6 +3583,7 @@ def delete_product(product_id: str, db: Session = Depends(get_db), current_user:
 
     product.is_active = False
     db.commit()
+    catalog_cache.bump('products')
     return {"message": "Producto eliminado"}
 
 @api_router.post("/products/{product_id}/toggle-stock-control")
@@ -1609,10 +3591,13 @@ def toggle_stock_control(product_id: str, enabled: bool = True, db: Session = De
     product = db.query(ProductDB).filter(ProductDB.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
+    if not enabled and product.stock_control_enabled and product.current_stock:
+        apply_stock_deltas(db, {product.id: -product.current_stock}, 'disable', user_id=current_user.id)
     product.stock_control_enabled = enabled
     if not enabled:
         product.current_stock = 0
     db.commit()
+    catalog_cache.bump('products')
     result = db_to_dict(product)
     result['cost_price'] = result.get('cost', 0) or 0
     return result
@@ -1624,21 +3609,44 @@ def add_stock(product_id: str, quantity: int = 1, notes: str = '', db: Session =
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     if not product.stock_control_enabled:
         raise HTTPException(status_code=400, detail="El control de stock no está habilitado para este producto")
-    product.current_stock = (product.current_stock or 0) + quantity
+    apply_stock_deltas(db, {product.id: quantity}, 'manual', notes=notes or None, user_id=current_user.id)
     db.commit()
     result = db_to_dict(product)
     result['cost_price'] = result.get('cost', 0) or 0
     return result
 
-@api_router.get("/products/public")
-def get_public_products(db: Session = Depends(get_db)):
-    products = db.query(ProductDB).filter(ProductDB.is_active == True).all()
+@api_router.get("/products/low-stock")
+def get_low_stock_products(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    """Productos con control de stock en o bajo su min_stock_alert (usa el índice de low_stock)"""
+    products = db.query(ProductDB).filter(ProductDB.low_stock == True).order_by(ProductDB.current_stock).all()
     result = []
     for p in products:
         d = db_to_dict(p)
         d['cost_price'] = d.get('cost', 0) or 0
         result.append(d)
-    return result
+    return FastJSONResponse(result)
+
+@api_router.get("/stock-movements")
+def get_stock_movements(product_id: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None,
+                        db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    """Historial de movimientos de stock, opcionalmente de un solo producto"""
+    query = db.query(StockMovementDB)
+    if product_id:
+        query = query.filter(StockMovementDB.product_id == product_id)
+    rows, next_cursor = keyset_page(query, StockMovementDB.created_at, StockMovementDB.id, limit or PAGE_DEFAULT_LIMIT, cursor)
+    return page_response([db_to_dict(m) for m in rows], True, next_cursor)
+
+@api_router.get("/products/public")
+def get_public_products(request: Request):
+    def build(db: Session):
+        products = db.query(ProductDB).filter(ProductDB.is_active == True).all()
+        result = []
+        for p in products:
+            d = db_to_dict(p)
+            d['cost_price'] = d.get('cost', 0) or 0
+            result.append(d)
+        return result
+    return catalog_cache.respond(request, 'products_public', ('products',), build)
 
 # ============ CATEGORIES ENDPOINTS ============
 
@@ -1657,18 +3665,19 @@ def create_category(data: dict, db: Session = Depends(get_db), current_user: Use
     )
     db.add(category)
     db.commit()
+    catalog_cache.bump('categories')
     return db_to_dict(category)
 
 @api_router.get("/categories/public")
-def get_public_categories(db: Session = Depends(get_db)):
-    categories = db.query(CategoryDB).all()
-    return [db_to_dict(c) for c in categories]
+def get_public_categories(request: Request):
+    return catalog_cache.respond(request, 'categories_public', ('categories',),
+                                 lambda db: [db_to_dict(c) for c in db.query(CategoryDB).all()])
 
 # ============ MONTHLY SERVICES ENDPOINTS ============
 
 @api_router.get("/monthly-services")
 def get_monthly_services(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    services = db.query(MonthlyServiceDB).all()
+    services = db.query(MonthlyServiceDB).options(joinedload(MonthlyServiceDB.client)).all()
     result = []
     for service in services:
         service_dict = db_to_dict(service)
@@ -1727,17 +3736,72 @@ def get_monthly_services_catalog(db: Session = Depends(get_db), current_user: Us
 
 # ============ TICKETS ENDPOINTS (COMPLETOS) ============
 
+def build_ticket_item_rows(db: Session, ticket_id: str, items: list, commission_percentage: float):
+    """Arma las filas de ticket_items resolviendo todos los productos en una sola consulta.
+
+    Retorna (filas, total_amount, total_commission). Los items cuyo producto no
+    existe usan el precio, nombre y categoría enviados por el cliente.
+    """
+    product_ids = {item.get('product_id') for item in items if item.get('product_id')}
+    products = {}
+    if product_ids:
+        products = {p.id: p for p in db.query(ProductDB).filter(ProductDB.id.in_(product_ids))}
+
+    now = datetime.utcnow()
+    rows = []
+    total_amount = 0.0
+    total_commission = 0.0
+    for item_data in items:
+        product_id = item_data.get('product_id')
+        quantity = int(item_data.get('quantity', 1))
+
+        product = products.get(product_id)
+        if product:
+            unit_price = product.sale_price or product.base_price or 0
+            product_name = product.name
+            category = product.category or ''
+        else:
+            unit_price = float(item_data.get('unit_price', 0))
+            product_name = item_data.get('product_name', 'Producto')
+            category = item_data.get('category', '')
+
+        subtotal = quantity * unit_price
+        commission_amount = subtotal * (commission_percentage / 100)
+        rows.append({
+            'id': str(uuid.uuid4()),
+            'ticket_id': ticket_id,
+            'product_id': product_id,
+            'product_name': product_name,
+            'category': category,
+            'description': None,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'subtotal': subtotal,
+            'commission_percentage': commission_percentage,
+            'commission_amount': commission_amount,
+            'created_at': now,
+        })
+        total_amount += subtotal
+        total_commission += commission_amount
+    return rows, total_amount, total_commission
+
 @api_router.get("/tickets")
-def get_tickets(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    """Obtiene todos los tickets con sus items"""
+def get_tickets(limit: Optional[int] = None, cursor: Optional[str] = None, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    """Obtiene los tickets con sus items (paginados por keyset si se indica limit/cursor)"""
     try:
-        tickets = db.query(TicketDB).order_by(TicketDB.ticket_date.desc()).all()
+        query = db.query(TicketDB).options(selectinload(TicketDB.items))
+        if limit is None and cursor is None:
+            tickets, paginated, next_cursor = query.order_by(TicketDB.ticket_date.desc()).all(), False, None
+        else:
+            tickets, paginated, next_cursor = paginated_rows(query, TicketDB.ticket_date, TicketDB.id, limit, cursor)
         result = []
         for ticket in tickets:
             ticket_dict = db_to_dict(ticket)
             ticket_dict['items'] = [db_to_dict(item) for item in ticket.items]
             result.append(ticket_dict)
-        return result
+        return page_response(result, paginated, next_cursor)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error obteniendo tickets: {e}")
         raise HTTPException(status_code=500, detail=f"Error al obtener tickets: {str(e)}")
@@ -1788,54 +3852,25 @@ def create_ticket(data: dict, db: Session = Depends(get_db), current_user: UserD
         db.add(ticket)
         db.flush()  # Get ticket ID
 
-        # Process items
-        total_amount = 0.0
-        total_commission = 0.0
-
-        for item_data in data.get('items', []):
-            product_id = item_data.get('product_id')
-            quantity = int(item_data.get('quantity', 1))
-
-            # Get product info
-            product = db.query(ProductDB).filter(ProductDB.id == product_id).first()
-            if product:
-                unit_price = product.sale_price or product.base_price or 0
-                product_name = product.name
-                category = product.category or ''
-            else:
-                unit_price = float(item_data.get('unit_price', 0))
-                product_name = item_data.get('product_name', 'Producto')
-                category = item_data.get('category', '')
-
-            subtotal = quantity * unit_price
-            commission_amount = subtotal * (commission_percentage / 100)
-
-            ticket_item = TicketItemDB(
-                id=str(uuid.uuid4()),
-                ticket_id=ticket.id,
-                product_id=product_id,
-                product_name=product_name,
-                category=category,
-                quantity=quantity,
-                unit_price=unit_price,
-                subtotal=subtotal,
-                commission_percentage=commission_percentage,
-                commission_amount=commission_amount
-            )
-            db.add(ticket_item)
-
-            total_amount += subtotal
-            total_commission += commission_amount
+        # Process items: un solo SELECT ... IN para los productos y un INSERT masivo
+        item_rows, total_amount, total_commission = build_ticket_item_rows(
+            db, ticket.id, data.get('items', []), commission_percentage
+        )
+        db.execute(insert(TicketItemDB.__table__), item_rows)
+        apply_stock_deltas(
+            db, {pid: -qty for pid, qty in ticket_item_quantities(item_rows).items()},
+            'ticket', reference_id=ticket.id, user_id=current_user.id
+        )
 
         # Update ticket totals
         ticket.total_amount = total_amount
         ticket.total_commission = total_commission
 
         db.commit()
-        db.refresh(ticket)
 
+        # El ticket se recarga una vez (ticket_number); los items salen de las filas insertadas
         ticket_dict = db_to_dict(ticket)
-        ticket_dict['items'] = [db_to_dict(item) for item in ticket.items]
+        ticket_dict['items'] = [db_to_dict(TicketItemDB(**row)) for row in item_rows]
 
         logger.info(f"Ticket #{ticket.ticket_number} creado exitosamente por {current_user.email}")
         return ticket_dict
@@ -1878,7 +3913,10 @@ def update_ticket(ticket_id: str, data: dict, db: Session = Depends(get_db), cur
 
         # If items are provided, recreate them
         if 'items' in data and data['items']:
-            # Delete existing items
+            # Delete existing items (recordando sus cantidades para devolver el stock)
+            previous = ticket_item_quantities(db.execute(
+                select(TicketItemDB.product_id, TicketItemDB.quantity).where(TicketItemDB.ticket_id == ticket_id)
+            ).mappings())
             db.query(TicketItemDB).filter(TicketItemDB.ticket_id == ticket_id).delete()
 
             # Get commission percentage
@@ -1888,42 +3926,17 @@ def update_ticket(ticket_id: str, data: dict, db: Session = Depends(get_db), cur
                 if comisionista:
                     commission_percentage = comisionista.commission_percentage or 0.0
 
-            total_amount = 0.0
-            total_commission = 0.0
-
-            for item_data in data['items']:
-                product_id = item_data.get('product_id')
-                quantity = int(item_data.get('quantity', 1))
-
-                product = db.query(ProductDB).filter(ProductDB.id == product_id).first()
-                if product:
-                    unit_price = product.sale_price or product.base_price or 0
-                    product_name = product.name
-                    category = product.category or ''
-                else:
-                    unit_price = float(item_data.get('unit_price', 0))
-                    product_name = item_data.get('product_name', 'Producto')
-                    category = item_data.get('category', '')
-
-                subtotal = quantity * unit_price
-                commission_amount = subtotal * (commission_percentage / 100)
-
-                ticket_item = TicketItemDB(
-                    id=str(uuid.uuid4()),
-                    ticket_id=ticket.id,
-                    product_id=product_id,
-                    product_name=product_name,
-                    category=category,
-                    quantity=quantity,
-                    unit_price=unit_price,
-                    subtotal=subtotal,
-                    commission_percentage=commission_percentage,
-                    commission_amount=commission_amount
-                )
-                db.add(ticket_item)
+            item_rows, total_amount, total_commission = build_ticket_item_rows(
+                db, ticket.id, data['items'], commission_percentage
+            )
+            db.execute(insert(TicketItemDB.__table__), item_rows)
 
-                total_amount += subtotal
-                total_commission += commission_amount
+            # Solo se mueve la diferencia entre los items anteriores y los nuevos
+            current = ticket_item_quantities(item_rows)
+            apply_stock_deltas(
+                db, {pid: previous.get(pid, 0) - current.get(pid, 0) for pid in set(previous) | set(current)},
+                'ticket_edit', reference_id=ticket.id, user_id=current_user.id
+            )
 
             ticket.total_amount = total_amount
             ticket.total_commission = total_commission
@@ -1949,6 +3962,11 @@ def delete_ticket(ticket_id: str, db: Session = Depends(get_db), current_user: U
     if not ticket:
         raise HTTPException(status_code=404, detail="Ticket no encontrado")
 
+    # Devolver al stock lo que el ticket había descontado
+    apply_stock_deltas(
+        db, ticket_item_quantities({'product_id': i.product_id, 'quantity': i.quantity} for i in ticket.items),
+        'ticket_delete', reference_id=ticket.id, user_id=current_user.id
+    )
     db.delete(ticket)
     db.commit()
     logger.info(f"Ticket #{ticket.ticket_number} eliminado por {current_user.email}")
@@ -1994,9 +4012,12 @@ def update_ticket_commission(ticket_id: str, commission_status: str, db: Session
 # ============ REQUESTS ENDPOINTS ============
 
 @api_router.get("/requests")
-def get_requests(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    requests = db.query(RequestDB).order_by(RequestDB.created_at.desc()).all()
-    return [db_to_dict(r) for r in requests]
+def get_requests(limit: Optional[int] = None, cursor: Optional[str] = None, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    if limit is None and cursor is None:
+        requests = db.query(RequestDB).order_by(RequestDB.created_at.desc()).all()
+        return page_response([db_to_dict(r) for r in requests], False, None)
+    requests, _, next_cursor = paginated_rows(db.query(RequestDB), RequestDB.created_at, RequestDB.id, limit, cursor)
+    return page_response([db_to_dict(r) for r in requests], True, next_cursor)
 
 @api_router.post("/requests")
 def create_request(data: dict, db: Session = Depends(get_db)):
@@ -2020,6 +4041,8 @@ def create_request(data: dict, db: Session = Depends(get_db)):
         status='new'
     )
     db.add(request)
+    db.flush()
+    apply_rollup_delta(db, {}, rollup_snapshot(request))
     db.commit()
     return db_to_dict(request)
 
@@ -2029,24 +4052,29 @@ def update_request(request_id: str, data: dict, db: Session = Depends(get_db), c
     if not request:
         raise HTTPException(status_code=404, detail="Solicitud no encontrada")
 
+    before = rollup_snapshot(request)
     for key, value in data.items():
         if hasattr(request, key) and key != 'id':
             setattr(request, key, value)
 
+    apply_rollup_delta(db, before, rollup_snapshot(request))
     db.commit()
     return db_to_dict(request)
 
 @api_router.get("/requests/count")
-def get_requests_count(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    count = db.query(RequestDB).filter(RequestDB.status == 'new').count()
-    return {"count": count}
+async def get_requests_count(db=Depends(get_async_db), current_user: UserDB = Depends(get_current_user_async)):
+    result = await db_execute(db, select(func.count()).select_from(RequestDB).where(RequestDB.status == 'new'))
+    return {"count": result.scalar()}
 
 # ============ QUOTES ENDPOINTS ============
 
 @api_router.get("/quotes")
-def get_quotes(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    quotes = db.query(QuoteDB).order_by(QuoteDB.created_at.desc()).all()
-    return [db_to_dict(q) for q in quotes]
+def get_quotes(limit: Optional[int] = None, cursor: Optional[str] = None, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    if limit is None and cursor is None:
+        quotes = db.query(QuoteDB).order_by(QuoteDB.created_at.desc()).all()
+        return page_response([db_to_dict(q) for q in quotes], False, None)
+    quotes, _, next_cursor = paginated_rows(db.query(QuoteDB), QuoteDB.created_at, QuoteDB.id, limit, cursor)
+    return page_response([db_to_dict(q) for q in quotes], True, next_cursor)
 
 @api_router.get("/quotes/pending/count")
 def get_pending_quotes_count(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
@@ -2086,6 +4114,8 @@ def create_quote(data: dict, db: Session = Depends(get_db), current_user: UserDB
         created_by=current_user.id
     )
     db.add(quote)
+    db.flush()
+    apply_rollup_delta(db, {}, rollup_snapshot(quote))
     db.commit()
     return db_to_dict(quote)
 
@@ -2095,12 +4125,14 @@ def update_quote(quote_id: str, data: dict, db: Session = Depends(get_db), curre
     if not quote:
         raise HTTPException(status_code=404, detail="Cotización no encontrada")
 
+    before = rollup_snapshot(quote)
     for key, value in data.items():
         if hasattr(quote, key) and key not in ['id']:
             if key == 'valid_until':
                 value = parse_date(value)
             setattr(quote, key, value)
 
+    apply_rollup_delta(db, before, rollup_snapshot(quote))
     db.commit()
     return db_to_dict(quote)
 
@@ -2110,6 +4142,7 @@ def delete_quote(quote_id: str, db: Session = Depends(get_db), current_user: Use
     if not quote:
         raise HTTPException(status_code=404, detail="Cotización no encontrada")
 
+    apply_rollup_delta(db, rollup_snapshot(quote), {})
     db.delete(quote)
     db.commit()
     return {"message": "Cotización eliminada"}
@@ -2139,6 +4172,9 @@ def create_public_quote(data: dict, db: Session = Depends(get_db)):
         status='new'
     )
     db.add(request)
+    db.flush()
+    apply_rollup_delta(db, {}, rollup_snapshot(quote))
+    apply_rollup_delta(db, {}, rollup_snapshot(request))
 
     db.commit()
     return db_to_dict(quote)
@@ -2146,9 +4182,12 @@ def create_public_quote(data: dict, db: Session = Depends(get_db)):
 # ============ INVOICES ENDPOINTS ============
 
 @api_router.get("/invoices")
-def get_invoices(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    invoices = db.query(InvoiceDB).order_by(InvoiceDB.created_at.desc()).all()
-    return [db_to_dict(i) for i in invoices]
+def get_invoices(limit: Optional[int] = None, cursor: Optional[str] = None, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    if limit is None and cursor is None:
+        invoices = db.query(InvoiceDB).order_by(InvoiceDB.created_at.desc()).all()
+        return page_response([db_to_dict(i) for i in invoices], False, None)
+    invoices, _, next_cursor = paginated_rows(db.query(InvoiceDB), InvoiceDB.created_at, InvoiceDB.id, limit, cursor)
+    return page_response([db_to_dict(i) for i in invoices], True, next_cursor)
 
 @api_router.get("/invoices/pending")
 def get_pending_invoices(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
@@ -2198,9 +4237,13 @@ def update_invoice_status(invoice_id: str, status: str, db: Session = Depends(ge
 # ============ SALES ENDPOINTS ============
 
 @api_router.get("/sales")
-def get_sales(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    sales = db.query(SaleDB).order_by(SaleDB.sale_date.desc()).all()
-    return [db_to_dict(s) for s in sales]
+def get_sales(limit: Optional[int] = None, cursor: Optional[str] = None, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    if limit is None and cursor is None:
+        sales = db.query(SaleDB).order_by(SaleDB.sale_date.desc()).all()
+        return page_response([db_to_dict(s) for s in sales], False, None)
+    # sale_date es DATE (sin hora), por eso el keyset usa created_at con id como desempate
+    sales, _, next_cursor = paginated_rows(db.query(SaleDB), SaleDB.created_at, SaleDB.id, limit, cursor)
+    return page_response([db_to_dict(s) for s in sales], True, next_cursor)
 
 @api_router.post("/sales")
 def create_sale(data: dict, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
@@ -2276,51 +4319,169 @@ def update_sale_commission(sale_id: str, commission_status: str, db: Session = D
 
 # ============ REPORTS ENDPOINTS ============
 
+REPORT_STREAM_BATCH_ROWS = 500
+
+SALES_REPORT_HEADER = [
+    'Numero Ticket', 'Fecha', 'Cliente', 'Email', 'Producto', 'Categoria',
+    'Cantidad', 'Precio Unitario', 'Subtotal', 'Comisionista', 'Comision',
+    'Estado Pago', 'Metodo Pago', 'Estado Comision'
+]
+
+def report_date_range(date_from: Optional[str], date_to: Optional[str]) -> tuple:
+    """Convierte los filtros de fecha de reportes a [desde, hasta) en datetime"""
+    start = parse_date(date_from) if date_from else None
+    end = parse_date(date_to) if date_to else None
+    if (date_from and not start) or (date_to and not end):
+        raise HTTPException(status_code=400, detail="Fecha de filtro inválida (formato YYYY-MM-DD)")
+    start_dt = datetime.combine(start, time.min) if start else None
+    end_dt = datetime.combine(end + timedelta(days=1), time.min) if end else None
+    return start_dt, end_dt
+
+def iter_sales_report_csv(start_dt: Optional[datetime], end_dt: Optional[datetime], comisionista_id: Optional[str]):
+    """Genera el CSV de ventas por bloques leyendo tickets + items con un cursor del servidor.
+
+    Usa su propia conexión con stream_results, así la memoria no depende de la
+    cantidad de tickets y la conexión se libera si el cliente corta la descarga.
+    """
+    tickets = TicketDB.__table__
+    items = TicketItemDB.__table__
+    query = select(
+        tickets.c.ticket_number, tickets.c.ticket_date, tickets.c.client_name, tickets.c.client_email,
+        items.c.product_name, items.c.category, items.c.quantity, items.c.unit_price, items.c.subtotal,
+        tickets.c.comisionista_name, items.c.commission_amount,
+        tickets.c.payment_status, tickets.c.payment_method, tickets.c.commission_status
+    ).select_from(tickets.join(items, items.c.ticket_id == tickets.c.id))
+    if start_dt:
+        query = query.where(tickets.c.ticket_date >= start_dt)
+    if end_dt:
+        query = query.where(tickets.c.ticket_date < end_dt)
+    if comisionista_id:
+        query = query.where(tickets.c.comisionista_id == comisionista_id)
+    query = query.order_by(tickets.c.ticket_date.desc(), tickets.c.id, items.c.created_at)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain() -> bytes:
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data.encode('utf-8')
+
+    writer.writerow(SALES_REPORT_HEADER)
+    yield '\ufeff'.encode('utf-8') + drain()  # BOM para que Excel detecte UTF-8
+
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=REPORT_STREAM_BATCH_ROWS).execute(query)
+        for partition in result.partitions():
+            for row in partition:
+                writer.writerow([
+                    row.ticket_number,
+                    row.ticket_date.strftime('%Y-%m-%d') if row.ticket_date else '',
+                    row.client_name,
+                    row.client_email or '',
+                    row.product_name,
+                    row.category or '',
+                    row.quantity,
+                    row.unit_price,
+                    row.subtotal,
+                    row.comisionista_name or '',
+                    row.commission_amount,
+                    row.payment_status,
+                    row.payment_method or '',
+                    row.commission_status
+                ])
+            yield drain()
+
+REPORT_PERIODS = ('month', 'week')
+
+def validate_report_period(period: Optional[str]):
+    if period is not None and period not in REPORT_PERIODS:
+        raise HTTPException(status_code=400, detail=f"Periodo no válido: {period} (usar 'month' o 'week')")
+
+def report_period_expression(column, period: str):
+    """Expresión SQL que agrupa una fecha por mes (YYYY-MM) o semana ISO (YYYY-Www)"""
+    if engine.dialect.name != 'sqlite':
+        return func.date_format(column, '%Y-%m' if period == 'month' else '%x-W%v')
+    if period == 'month':
+        return func.strftime('%Y-%m', column)
+    # SQLite no tiene semana ISO (%W cuenta desde 00 con el año calendario): la
+    # semana ISO es la de su jueves, y el año ISO es el año de ese jueves
+    thursday = func.date(column, '-3 days', 'weekday 4')
+    week = (cast(func.strftime('%j', thursday), Integer) - 1) // 7 + 1
+    # printf no propaga NULL (comisionistas sin tickets en el LEFT JOIN)
+    return case((column.is_(None), None), else_=func.printf('%s-W%02d', func.strftime('%Y', thursday), week))
+
+def commissions_summary(db: Session, start_dt: Optional[datetime], end_dt: Optional[datetime],
+                        comisionista_id: Optional[str] = None, period: Optional[str] = None) -> List[dict]:
+    """Totales de ventas y comisiones por comisionista en una sola consulta agregada.
+
+    Los filtros de fecha van en la condición del LEFT JOIN para que los
+    comisionistas sin ventas en el rango sigan apareciendo con totales en 0.
+    """
+    join_condition = [TicketDB.comisionista_id == UserDB.id]
+    if start_dt:
+        join_condition.append(TicketDB.ticket_date >= start_dt)
+    if end_dt:
+        join_condition.append(TicketDB.ticket_date < end_dt)
+
+    def commission_sum(status_value):
+        return func.coalesce(func.sum(case((TicketDB.commission_status == status_value, TicketDB.total_commission), else_=0)), 0)
+
+    group_columns = [UserDB.id, UserDB.name, UserDB.email, UserDB.commission_percentage]
+    columns = list(group_columns) + [
+        func.count(TicketDB.id).label('ticket_count'),
+        func.coalesce(func.sum(TicketDB.total_amount), 0).label('total_sales'),
+        func.coalesce(func.sum(TicketDB.total_commission), 0).label('total_commission'),
+        commission_sum('pending').label('pending_commission'),
+        commission_sum('paid').label('paid_commission')
+    ]
+    order_columns = [UserDB.name]
+    if period:
+        period_column = report_period_expression(TicketDB.ticket_date, period).label('period')
+        columns.append(period_column)
+        group_columns.append(period_column)
+        order_columns.append(period_column)
+
+    query = db.query(*columns).outerjoin(TicketDB, and_(*join_condition)).filter(UserDB.role == 'comisionista')
+    if comisionista_id:
+        query = query.filter(UserDB.id == comisionista_id)
+    rows = query.group_by(*group_columns).order_by(*order_columns).all()
+
+    return [{
+        "comisionista_id": row.id,
+        "name": row.name,
+        "email": row.email,
+        "commission_percentage": row.commission_percentage,
+        "period": row.period if period else None,
+        "ticket_count": row.ticket_count,
+        "total_sales": float(row.total_sales),
+        "total_commission": float(row.total_commission),
+        "pending_commission": float(row.pending_commission),
+        "paid_commission": float(row.paid_commission)
+    } for row in rows]
+
+@api_router.get("/reports/commissions/summary")
+def get_commissions_summary(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                            comisionista_id: Optional[str] = None, period: Optional[str] = None,
+                            db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    """Resumen de comisiones en JSON (mismos datos que el reporte CSV)"""
+    start_dt, end_dt = report_date_range(date_from, date_to)
+    validate_report_period(period)
+    return commissions_summary(db, start_dt, end_dt, comisionista_id, period)
+
 @api_router.get("/reports/{report_type}/excel")
-def generate_report_excel(report_type: str, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+def generate_report_excel(report_type: str, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                          comisionista_id: Optional[str] = None, period: Optional[str] = None,
+                          db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
     """Genera reportes en formato Excel"""
     try:
-        import csv
+        start_dt, end_dt = report_date_range(date_from, date_to)
+        validate_report_period(period)
 
         if report_type == 'sales':
-            # Generate sales report
-            tickets = db.query(TicketDB).order_by(TicketDB.ticket_date.desc()).all()
-
-            output = io.StringIO()
-            writer = csv.writer(output)
-
-            # Header
-            writer.writerow([
-                'Numero Ticket', 'Fecha', 'Cliente', 'Email', 'Producto', 'Categoria',
-                'Cantidad', 'Precio Unitario', 'Subtotal', 'Comisionista', 'Comision',
-                'Estado Pago', 'Metodo Pago', 'Estado Comision'
-            ])
-
-            # Data
-            for ticket in tickets:
-                for item in ticket.items:
-                    writer.writerow([
-                        ticket.ticket_number,
-                        ticket.ticket_date.strftime('%Y-%m-%d') if ticket.ticket_date else '',
-                        ticket.client_name,
-                        ticket.client_email or '',
-                        item.product_name,
-                        item.category or '',
-                        item.quantity,
-                        item.unit_price,
-                        item.subtotal,
-                        ticket.comisionista_name or '',
-                        item.commission_amount,
-                        ticket.payment_status,
-                        ticket.payment_method or '',
-                        ticket.commission_status
-                    ])
-
-            content = output.getvalue()
-            output.close()
-
-            return Response(
-                content=content.encode('utf-8-sig'),
+            return StreamingResponse(
+                iter_sales_report_csv(start_dt, end_dt, comisionista_id),
                 media_type='text/csv',
                 headers={
                     'Content-Disposition': f'attachment; filename=ventas_tna_office_{datetime.now().strftime("%Y%m%d")}.csv'
@@ -2328,35 +4489,32 @@ def generate_report_excel(report_type: str, db: Session = Depends(get_db), curre
             )
 
         elif report_type == 'commissions':
-            # Generate commissions report
-            comisionistas = db.query(UserDB).filter(UserDB.role == 'comisionista').all()
+            rows = commissions_summary(db, start_dt, end_dt, comisionista_id, period)
 
             output = io.StringIO()
             writer = csv.writer(output)
 
-            # Header
-            writer.writerow([
+            header = [
                 'Comisionista', 'Email', 'Porcentaje Comision', 'Total Ventas',
                 'Total Comisiones', 'Comisiones Pendientes', 'Comisiones Pagadas'
-            ])
-
-            # Data
-            for comisionista in comisionistas:
-                tickets = db.query(TicketDB).filter(TicketDB.comisionista_id == comisionista.id).all()
-                total_ventas = sum(t.total_amount for t in tickets)
-                total_comisiones = sum(t.total_commission for t in tickets)
-                comisiones_pendientes = sum(t.total_commission for t in tickets if t.commission_status == 'pending')
-                comisiones_pagadas = sum(t.total_commission for t in tickets if t.commission_status == 'paid')
-
-                writer.writerow([
-                    comisionista.name,
-                    comisionista.email,
-                    comisionista.commission_percentage,
-                    total_ventas,
-                    total_comisiones,
-                    comisiones_pendientes,
-                    comisiones_pagadas
-                ])
+            ]
+            if period:
+                header.insert(2, 'Periodo')
+            writer.writerow(header)
+
+            for row in rows:
+                values = [
+                    row['name'],
+                    row['email'],
+                    row['commission_percentage'],
+                    row['total_sales'],
+                    row['total_commission'],
+                    row['pending_commission'],
+                    row['paid_commission']
+                ]
+                if period:
+                    values.insert(2, row['period'] or '')
+                writer.writerow(values)
 
             content = output.getvalue()
             output.close()
@@ -2371,6 +4529,8 @@ def generate_report_excel(report_type: str, db: Session = Depends(get_db), curre
         else:
             raise HTTPException(status_code=400, detail=f"Tipo de reporte no válido: {report_type}")
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generando reporte {report_type}: {e}")
         raise HTTPException(status_code=500, detail=f"Error generando reporte: {str(e)}")
@@ -2382,50 +4542,182 @@ def get_comisionistas(db: Session = Depends(get_db), current_user: UserDB = Depe
     comisionistas = db.query(UserDB).filter(UserDB.role == 'comisionista', UserDB.is_active == True).all()
     return [db_to_dict(c, exclude=['password']) for c in comisionistas]
 
-# ============ DASHBOARD STATS ============
+# ============ DASHBOARD ROLLUP ============
 
-@api_router.get("/dashboard/stats")
-def get_dashboard_stats_full(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    try:
-        total_clients = db.query(ClientDB).filter(ClientDB.is_active == True).count()
-        total_offices = db.query(OfficeDB).count()
-        occupied_offices = db.query(OfficeDB).filter(OfficeDB.status == 'occupied').count()
-        available_offices = db.query(OfficeDB).filter(OfficeDB.status == 'available').count()
+DASHBOARD_ROLLUP_ID = 'global'
+DASHBOARD_RECONCILE_SECONDS = int(os.environ.get('DASHBOARD_RECONCILE_SECONDS', 900))
+PENDING_QUOTE_STATUSES = ('draft', 'pre-cotizacion')
 
-        total_billed = db.query(func.sum(OfficeDB.billed_value_uf)).scalar() or 0
-        total_cost = db.query(func.sum(OfficeDB.cost_uf)).scalar() or 0
+def _enum_value(value):
+    return value.value if isinstance(value, enum.Enum) else value
 
-        total_parking = db.query(ParkingStorageDB).filter(ParkingStorageDB.type == 'parking').count()
-        occupied_parking = db.query(ParkingStorageDB).filter(ParkingStorageDB.type == 'parking', ParkingStorageDB.status == 'occupied').count()
-        total_storage = db.query(ParkingStorageDB).filter(ParkingStorageDB.type == 'storage').count()
-        occupied_storage = db.query(ParkingStorageDB).filter(ParkingStorageDB.type == 'storage', ParkingStorageDB.status == 'occupied').count()
+def _as_float(value) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
 
-        new_requests = db.query(RequestDB).filter(RequestDB.status == 'new').count()
-        pending_quotes = db.query(QuoteDB).filter(QuoteDB.status.in_(['draft', 'pre-cotizacion'])).count()
+def rollup_snapshot(obj) -> dict:
+    """Aporte de una fila a los totales del dashboard.
 
+    Las escrituras toman un snapshot antes y después del cambio y aplican la
+    diferencia con apply_rollup_delta, en la misma transacción.
+    """
+    if obj is None:
+        return {}
+    if isinstance(obj, ClientDB):
+        return {'total_clients': 1 if obj.is_active else 0}
+    if isinstance(obj, OfficeDB):
+        status = _enum_value(obj.status)
         return {
-            "total_clients": total_clients,
-            "total_offices": total_offices,
-            "occupied_offices": occupied_offices,
-            "available_offices": available_offices,
-            "occupancy_rate": round((occupied_offices / total_offices * 100) if total_offices > 0 else 0, 1),
-            "total_billed_uf": float(total_billed),
-            "total_cost_uf": float(total_cost),
-            "margin_uf": float(total_billed - total_cost),
-            "total_parking": total_parking,
-            "occupied_parking": occupied_parking,
-            "total_storage": total_storage,
-            "occupied_storage": occupied_storage,
-            "new_requests": new_requests,
-            "pending_quotes": pending_quotes
+            'total_offices': 1,
+            'occupied_offices': 1 if status == 'occupied' else 0,
+            'available_offices': 1 if status == 'available' else 0,
+            'total_billed_uf': _as_float(obj.billed_value_uf),
+            'total_cost_uf': _as_float(obj.cost_uf)
         }
+    if isinstance(obj, ParkingStorageDB):
+        kind = _enum_value(obj.type)
+        occupied = 1 if _enum_value(obj.status) == 'occupied' else 0
+        if kind == 'parking':
+            return {'total_parking': 1, 'occupied_parking': occupied}
+        if kind == 'storage':
+            return {'total_storage': 1, 'occupied_storage': occupied}
+        return {}
+    if isinstance(obj, RequestDB):
+        return {'new_requests': 1 if obj.status == 'new' else 0}
+    if isinstance(obj, QuoteDB):
+        return {'pending_quotes': 1 if obj.status in PENDING_QUOTE_STATUSES else 0}
+    return {}
+
+def apply_rollup_delta(db: Session, before: dict, after: dict):
+    """Suma la diferencia entre snapshots a la fila del rollup con un UPDATE atómico"""
+    delta = {}
+    for key in set(before) | set(after):
+        diff = after.get(key, 0) - before.get(key, 0)
+        if diff:
+            delta[key] = diff
+    if not delta:
+        return
+    values = {getattr(DashboardRollupDB, key): getattr(DashboardRollupDB, key) + diff for key, diff in delta.items()}
+    db.query(DashboardRollupDB).filter(DashboardRollupDB.id == DASHBOARD_ROLLUP_ID).update(values, synchronize_session=False)
+
+def compute_dashboard_totals(db: Session) -> dict:
+    """Recalcula todos los totales con agregación condicional (una consulta por tabla)"""
+    def count_if(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    clients = db.query(count_if(ClientDB.is_active == True)).one()
+    offices = db.query(
+        func.count(OfficeDB.id),
+        count_if(OfficeDB.status == 'occupied'),
+        count_if(OfficeDB.status == 'available'),
+        func.coalesce(func.sum(OfficeDB.billed_value_uf), 0),
+        func.coalesce(func.sum(OfficeDB.cost_uf), 0)
+    ).one()
+    parking = db.query(
+        count_if(ParkingStorageDB.type == 'parking'),
+        count_if(and_(ParkingStorageDB.type == 'parking', ParkingStorageDB.status == 'occupied')),
+        count_if(ParkingStorageDB.type == 'storage'),
+        count_if(and_(ParkingStorageDB.type == 'storage', ParkingStorageDB.status == 'occupied'))
+    ).one()
+    requests = db.query(count_if(RequestDB.status == 'new')).one()
+    quotes = db.query(count_if(QuoteDB.status.in_(PENDING_QUOTE_STATUSES))).one()
+
+    return {
+        'total_clients': int(clients[0]),
+        'total_offices': int(offices[0]),
+        'occupied_offices': int(offices[1]),
+        'available_offices': int(offices[2]),
+        'total_billed_uf': float(offices[3]),
+        'total_cost_uf': float(offices[4]),
+        'total_parking': int(parking[0]),
+        'occupied_parking': int(parking[1]),
+        'total_storage': int(parking[2]),
+        'occupied_storage': int(parking[3]),
+        'new_requests': int(requests[0]),
+        'pending_quotes': int(quotes[0])
+    }
+
+def rebuild_dashboard_rollup(db: Session) -> DashboardRollupDB:
+    """Guarda los totales recalculados en la fila del rollup (crea la fila si no existe).
+
+    La fila se bloquea (SELECT ... FOR UPDATE) antes de contar: una escritura
+    que ya aplicó su apply_rollup_delta termina de confirmar primero y sus
+    datos entran en el conteo; las que llegan después esperan y suman su
+    delta sobre los totales nuevos. Sin el bloqueo, un delta confirmado
+    entre el conteo y la escritura quedaba sobrescrito hasta la siguiente
+    conciliación.
+    """
+    # Termina la transacción de lectura previa para que el conteo no use su snapshot
+    db.rollback()
+    rollup = db.query(DashboardRollupDB).filter(DashboardRollupDB.id == DASHBOARD_ROLLUP_ID).with_for_update().first()
+    totals = compute_dashboard_totals(db)
+    if rollup is None:
+        rollup = DashboardRollupDB(id=DASHBOARD_ROLLUP_ID)
+        db.add(rollup)
+    for key, value in totals.items():
+        setattr(rollup, key, value)
+    rollup.refreshed_at = datetime.utcnow()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Otro proceso creó la fila al mismo tiempo; sus totales son igual de válidos
+        db.rollback()
+        rollup = db.query(DashboardRollupDB).filter(DashboardRollupDB.id == DASHBOARD_ROLLUP_ID).first()
+    logger.info("Rollup del dashboard recalculado")
+    return rollup
+
+def get_dashboard_rollup(db: Session) -> DashboardRollupDB:
+    """Lee la fila del rollup; la reconstruye si falta o pasó el intervalo de conciliación"""
+    rollup = db.query(DashboardRollupDB).filter(DashboardRollupDB.id == DASHBOARD_ROLLUP_ID).first()
+    if rollup is None or rollup.refreshed_at is None or \
+            (datetime.utcnow() - rollup.refreshed_at).total_seconds() > DASHBOARD_RECONCILE_SECONDS:
+        rollup = rebuild_dashboard_rollup(db)
+    return rollup
+
+# ============ DASHBOARD STATS ============
+
+def dashboard_stats(db: Session) -> dict:
+    rollup = get_dashboard_rollup(db)
+    total_offices = rollup.total_offices or 0
+    occupied_offices = rollup.occupied_offices or 0
+    total_billed = rollup.total_billed_uf or 0
+    total_cost = rollup.total_cost_uf or 0
+
+    return {
+        "total_clients": rollup.total_clients,
+        "total_offices": total_offices,
+        "occupied_offices": occupied_offices,
+        "available_offices": rollup.available_offices,
+        "occupancy_rate": round((occupied_offices / total_offices * 100) if total_offices > 0 else 0, 1),
+        "total_billed_uf": float(total_billed),
+        "total_cost_uf": float(total_cost),
+        "margin_uf": float(total_billed - total_cost),
+        "total_parking": rollup.total_parking,
+        "occupied_parking": rollup.occupied_parking,
+        "total_storage": rollup.total_storage,
+        "occupied_storage": rollup.occupied_storage,
+        "new_requests": rollup.new_requests,
+        "pending_quotes": rollup.pending_quotes
+    }
+
+@api_router.get("/dashboard/stats")
+async def get_dashboard_stats_full(db=Depends(get_async_db), current_user: UserDB = Depends(get_current_user_async)):
+    try:
+        # El rollup puede recalcularse (y guardarse) con el código ORM síncrono
+        return await db_run_sync(db, dashboard_stats)
     except Exception as e:
         logger.error(f"Error obteniendo estadísticas: {e}")
         raise HTTPException(status_code=500, detail=f"Error obteniendo estadísticas: {str(e)}")
 
 @api_router.get("/stats/dashboard")
 def get_dashboard_stats(db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
-    return get_dashboard_stats_full(db, current_user)
+    try:
+        return dashboard_stats(db)
+    except Exception as e:
+        logger.error(f"Error obteniendo estadísticas: {e}")
+        raise HTTPException(status_code=500, detail=f"Error obteniendo estadísticas: {str(e)}")
 
 # ============ CONTRACTS EXPIRING SOON ============
 
@@ -2438,7 +4730,7 @@ def get_expiring_contracts(db: Session = Depends(get_db), current_user: UserDB =
     expiring = []
 
     # Check offices - expiring soon
-    offices = db.query(OfficeDB).filter(
+    offices = db.query(OfficeDB).options(joinedload(OfficeDB.client)).filter(
         OfficeDB.contract_end != None,
         OfficeDB.contract_end <= threshold,
         OfficeDB.contract_end >= expired_threshold
@@ -2462,7 +4754,7 @@ def get_expiring_contracts(db: Session = Depends(get_db), current_user: UserDB =
     # Use each document's notification_days setting for threshold
     from sqlalchemy import or_
 
-    documents = db.query(ClientDocumentDB).filter(
+    documents = db.query(ClientDocumentDB).options(joinedload(ClientDocumentDB.client)).filter(
         ClientDocumentDB.notifications_enabled == True,
         or_(
             ClientDocumentDB.expiry_date != None,
@@ -2495,9 +4787,9 @@ def get_expiring_contracts(db: Session = Depends(get_db), current_user: UserDB =
 # ============ FLOOR PLAN ENDPOINTS ============
 
 @api_router.get("/floor-plan-coordinates")
-def get_floor_plan_coordinates(db: Session = Depends(get_db)):
-    coords = db.query(FloorPlanCoordinateDB).all()
-    return {"coordinates": {c.office_number: db_to_dict(c) for c in coords}}
+def get_floor_plan_coordinates(request: Request):
+    return catalog_cache.respond(request, 'floor_plan_coordinates', ('floor_plan_coordinates',),
+                                 lambda db: {"coordinates": {c.office_number: db_to_dict(c) for c in db.query(FloorPlanCoordinateDB).all()}})
 
 @api_router.post("/floor-plan-coordinates")
 def save_floor_plan_coordinates(data: dict, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
@@ -2518,11 +4810,12 @@ def save_floor_plan_coordinates(data: dict, db: Session = Depends(get_db), curre
         db.add(new_coord)
 
     db.commit()
+    catalog_cache.bump('floor_plan_coordinates')
     return {"message": "Coordenadas guardadas"}
 
 @api_router.get("/floor-plan/coordinates")
-def get_floor_plan_coords_legacy(db: Session = Depends(get_db)):
-    return get_floor_plan_coordinates(db)
+def get_floor_plan_coords_legacy(request: Request):
+    return get_floor_plan_coordinates(request)
 
 @api_router.post("/floor-plan/coordinates")
 def save_floor_plan_coords_legacy(data: dict, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
@@ -2578,6 +4871,752 @@ def delete_template(template_id: str, db: Session = Depends(get_db), current_use
     db.commit()
     return {"message": "Plantilla eliminada"}
 
+# ============ BÚSQUEDA GLOBAL ============
+
+SEARCH_INDEX_TTL_SECONDS = int(os.environ.get('SEARCH_INDEX_TTL_SECONDS', 300))
+SEARCH_MAX_LIMIT = 100
+
+def normalize_search_text(value) -> str:
+    """Minúsculas y sin tildes, para que 'Peña' y 'pena' coincidan"""
+    text = str(value)
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return text.lower()
+
+SEARCH_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+def search_tokens(value) -> list:
+    return SEARCH_TOKEN_RE.findall(normalize_search_text(value))
+
+class SearchSource:
+    """Qué columnas de un modelo se indexan y con qué peso.
+
+    compact: columnas (RUT, teléfono) que además se indexan sin separadores,
+    para que un fragmento como '12345678' encuentre '12.345.678-9'.
+    parent: (tipo, columna) del documento del que depende; si el padre no está
+    en el índice (p. ej. un cliente desactivado) la fila no aparece en /search.
+    """
+
+    def __init__(self, kind: str, model, title: tuple, subtitle: tuple, weights: dict,
+                 compact: tuple = (), extra: tuple = (), active=None, parent=None):
+        self.kind = kind
+        self.model = model
+        self.title = title
+        self.subtitle = subtitle
+        self.weights = weights
+        self.compact = compact
+        self.active = active  # columna booleana: las filas en False no se indexan
+        self.parent = parent
+        if parent is not None and parent[1] not in extra:
+            extra = extra + (parent[1],)
+        self.extra = extra
+        # Campos agrupados por peso ascendente: se tokeniza un texto por grupo y
+        # el peso mayor sobrescribe al menor
+        groups = {}
+        for name, weight in weights.items():
+            groups.setdefault(weight, []).append(name)
+        self.weight_groups = sorted(groups.items())
+        names = set(title) | set(subtitle) | set(weights) | set(compact) | set(extra) | {'id'}
+        if active is not None:
+            names.add(active)
+        self.column_names = sorted(names)
+        self.columns = [getattr(model, name) for name in self.column_names]
+
+    def document(self, values: dict):
+        """Arma (clave, documento) desde una fila o el __dict__ de un objeto ORM; None si no se indexa"""
+        get = values.get
+        key = (self.kind, get('id'))
+        if self.active is not None and get(self.active) is False:
+            return key, None
+        tokens = {}
+        for weight, names in self.weight_groups:
+            text = ' '.join(str(v) for v in map(get, names) if v is not None and v != '')
+            if text:
+                for token in search_tokens(text):
+                    tokens[token] = weight
+        for name in self.compact:
+            value = get(name)
+            if value:
+                token = ''.join(search_tokens(value))
+                if token and tokens.get(token, 0) < self.weights[name]:
+                    tokens[token] = self.weights[name]
+        document = {
+            'type': self.kind,
+            'id': key[1],
+            'title': next((get(n) for n in self.title if get(n)), None),
+            'subtitle': next((get(n) for n in self.subtitle if get(n)), None),
+        }
+        for name in self.extra:
+            value = get(name)
+            document[name] = value.value if isinstance(value, enum.Enum) else value
+        return key, (document, tokens)
+
+SEARCH_SOURCES = {
+    source.model: source for source in (
+        SearchSource('client', ClientDB, ('company_name',), ('rut', 'contact_name', 'email'), {
+            'company_name': 3, 'rut': 3, 'email': 2, 'contact_name': 2, 'contact_email': 2,
+            'phone': 1, 'contact_phone': 1, 'business_type': 1
+        }, compact=('rut', 'phone', 'contact_phone'), active='is_active'),
+        SearchSource('contact', ClientContactDB, ('name',), ('email', 'position'), {
+            'name': 3, 'email': 2, 'phone': 1, 'position': 1
+        }, compact=('phone',), parent=('client', 'client_id')),
+        SearchSource('product', ProductDB, ('name',), ('category',), {
+            'name': 3, 'category': 1, 'provider': 1, 'description': 1
+        }, extra=('sale_price',), active='is_active'),
+        SearchSource('request', RequestDB, ('name', 'client_name', 'email'), ('company_name', 'company', 'request_type'), {
+            'request_number': 3, 'name': 3, 'client_name': 3, 'email': 2, 'client_email': 2,
+            'company': 2, 'company_name': 2, 'phone': 1, 'client_phone': 1, 'request_type': 1, 'message': 1
+        }, compact=('phone', 'client_phone'), extra=('request_number', 'status')),
+        SearchSource('quote', QuoteDB, ('client_name', 'company_name'), ('company_name', 'client_email'), {
+            'quote_number': 3, 'client_name': 3, 'company_name': 2, 'client_email': 2, 'client_phone': 1, 'notes': 1
+        }, compact=('client_phone',), extra=('quote_number', 'status', 'total')),
+    )
+}
+
+SEARCH_PARENTS = {source.kind: source.parent for source in SEARCH_SOURCES.values() if source.parent}
+
+class SearchIndex:
+    """Índice invertido en memoria para /search.
+
+    Cada token apunta a los documentos que lo contienen con el peso del campo.
+    Para fragmentos ('45678' de un RUT, 'gonz' de un apellido) el vocabulario
+    se mantiene además concatenado en un solo string, donde la búsqueda de
+    subcadenas corre en C y cada coincidencia se traduce a su token con bisect.
+    Las escrituras por el ORM lo actualizan al hacer commit (ver
+    sync_search_index); el TTL cubre lo escrito por otros procesos de Passenger
+    o por SQL directo.
+    """
+
+    VOCAB_RECENT_LIMIT = 2000  # tokens nuevos que se recorren aparte antes de regenerar el vocabulario
+
+    def __init__(self, ttl_seconds: int = SEARCH_INDEX_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._docs = {}       # (tipo, id) -> (documento, {token: peso})
+        self._postings = {}   # token -> {(tipo, id): peso}
+        self._vocab = []      # tokens ordenados al generar el vocabulario
+        self._vocab_text = ''  # '\n'.join(_vocab) para buscar subcadenas
+        self._vocab_offsets = []
+        self._recent = set()  # tokens agregados después de generar el vocabulario
+        self._built_at = None
+        self._rebuilding = False
+        self._replay = []
+
+    # --- construcción ---
+
+    def rebuild(self, db: Session):
+        """Relee las tablas indexadas (solo las columnas necesarias) y reemplaza el índice"""
+        with self._lock:
+            self._rebuilding = True
+            self._replay = []
+        try:
+            docs = {}
+            for source in SEARCH_SOURCES.values():
+                names = source.column_names
+                for row in db.execute(select(*source.columns)):
+                    key, doc = source.document(dict(zip(names, row)))
+                    if doc is not None:
+                        docs[key] = doc
+            postings = {}
+            for key, (_, tokens) in docs.items():
+                for token, weight in tokens.items():
+                    bucket = postings.get(token)
+                    if bucket is None:
+                        bucket = postings[token] = {}
+                    bucket[key] = weight
+            with self._lock:
+                self._docs, self._postings = docs, postings
+                self._build_vocabulary()
+                self._built_at = datetime.utcnow()
+                # Cambios confirmados mientras se leía la BD
+                for key, doc in self._replay:
+                    self._apply(key, doc)
+        finally:
+            with self._lock:
+                self._rebuilding = False
+                self._replay = []
+        logger.info(f"Índice de búsqueda construido: {len(docs)} documentos, {len(postings)} tokens")
+
+    def _build_vocabulary(self):
+        self._vocab = sorted(self._postings)
+        self._vocab_text = '\n'.join(self._vocab)
+        offsets, position = [], 0
+        for token in self._vocab:
+            offsets.append(position)
+            position += len(token) + 1
+        self._vocab_offsets = offsets
+        self._recent = set()
+
+    def ensure_fresh(self):
+        """Primera vez: construye en el request. Vencido: sigue sirviendo y reconstruye en un hilo"""
+        if self._built_at is None:
+            with self._build_lock:
+                if self._built_at is None:
+                    self._rebuild_with_session()
+            return
+        if (datetime.utcnow() - self._built_at).total_seconds() > self.ttl_seconds:
+            if self._build_lock.acquire(blocking=False):
+                threading.Thread(target=self._background_rebuild, name='search-rebuild', daemon=True).start()
+
+    def invalidate(self):
+        """Fuerza reconstrucción en la próxima búsqueda (p. ej. tras una importación masiva)"""
+        if self._built_at is not None:
+            self._built_at = datetime.min
+
+    def _rebuild_with_session(self):
+        db = SessionLocal()
+        try:
+            self.rebuild(db)
+        finally:
+            db.close()
+
+    def _background_rebuild(self):
+        try:
+            self._rebuild_with_session()
+        except Exception as e:
+            logger.warning(f"No se pudo reconstruir el índice de búsqueda: {e}")
+        finally:
+            self._build_lock.release()
+
+    # --- mantenimiento ---
+
+    def apply_changes(self, changes: list):
+        """Aplica [(clave, documento o None)] confirmados en la BD"""
+        with self._lock:
+            if self._rebuilding:
+                self._replay.extend(changes)
+            if self._built_at is None:
+                return
+            for key, doc in changes:
+                self._apply(key, doc)
+            if len(self._recent) > self.VOCAB_RECENT_LIMIT:
+                self._build_vocabulary()
+
+    def _apply(self, key, doc):
+        # Los tokens que quedan sin documentos siguen en el vocabulario hasta
+        # regenerarlo; _matching_tokens los descarta al no estar en _postings.
+        old = self._docs.pop(key, None)
+        if old is not None:
+            for token in old[1]:
+                bucket = self._postings.get(token)
+                if bucket is not None:
+                    bucket.pop(key, None)
+                    if not bucket:
+                        del self._postings[token]
+        if doc is not None:
+            self._docs[key] = doc
+            for token, weight in doc[1].items():
+                bucket = self._postings.get(token)
+                if bucket is None:
+                    bucket = self._postings[token] = {}
+                    self._recent.add(token)
+                bucket[key] = weight
+
+    # --- consultas ---
+
+    def _matching_tokens(self, term: str) -> set:
+        if len(term) >= 3:
+            tokens = set()
+            text, offsets, vocab = self._vocab_text, self._vocab_offsets, self._vocab
+            position = text.find(term)
+            while position != -1:
+                index = bisect.bisect_right(offsets, position) - 1
+                tokens.add(vocab[index])
+                # saltar al token siguiente: cada token cuenta una sola vez
+                next_start = offsets[index + 1] if index + 1 < len(offsets) else len(text)
+                position = text.find(term, next_start)
+            tokens.update(token for token in self._recent if term in token)
+        else:
+            # 1-2 caracteres: solo prefijos, con bisect sobre el vocabulario ordenado
+            start = bisect.bisect_left(self._vocab, term)
+            end = bisect.bisect_left(self._vocab, term + '\uffff')
+            tokens = set(self._vocab[start:end])
+            tokens.update(token for token in self._recent if token.startswith(term))
+        return {token for token in tokens if token in self._postings}
+
+    @staticmethod
+    def _quality(token: str, term: str) -> int:
+        return 3 if token == term else 2 if token.startswith(term) else 1
+
+    def search(self, query: str, kinds: Optional[set] = None, limit: int = 20) -> list:
+        """Documentos que contienen todos los términos, ordenados por relevancia.
+
+        Cada término puntúa peso_del_campo x calidad (3 exacto, 2 prefijo,
+        1 fragmento) con su mejor coincidencia en el documento. Se parte por el
+        término más selectivo; los siguientes solo se evalúan sobre los
+        documentos que ya coinciden.
+        """
+        terms = list(dict.fromkeys(search_tokens(query)))
+        if not terms:
+            return []
+        with self._lock:
+            matches = []
+            for term in terms:
+                tokens = self._matching_tokens(term)
+                if not tokens:
+                    return []
+                matches.append((sum(len(self._postings[t]) for t in tokens), term, tokens))
+            matches.sort(key=lambda m: m[0])
+
+            scores = None
+            for cost, term, tokens in matches:
+                if scores is not None and len(scores) * 4 < cost:
+                    # Pocos candidatos: revisar los tokens de cada documento es más barato
+                    new_scores = {}
+                    for key, score in scores.items():
+                        best = 0
+                        for token, weight in self._docs[key][1].items():
+                            if token in tokens:
+                                best = max(best, weight * self._quality(token, term))
+                        if best:
+                            new_scores[key] = score + best
+                    scores = new_scores
+                else:
+                    term_scores = {}
+                    for token in tokens:
+                        quality = self._quality(token, term)
+                        for key, weight in self._postings[token].items():
+                            if kinds and key[0] not in kinds:
+                                continue
+                            score = weight * quality
+                            if term_scores.get(key, 0) < score:
+                                term_scores[key] = score
+                    if scores is None:
+                        scores = term_scores
+                    else:
+                        scores = {key: scores[key] + score for key, score in term_scores.items() if key in scores}
+                if not scores:
+                    return []
+            # Se comprueba al consultar: desactivar un cliente oculta sus contactos sin reindexarlos
+            for key in [key for key in scores if key[0] in SEARCH_PARENTS]:
+                parent_kind, column = SEARCH_PARENTS[key[0]]
+                parent_id = self._docs[key][0].get(column)
+                if parent_id is not None and (parent_kind, parent_id) not in self._docs:
+                    del scores[key]
+            # Selección por puntaje con clave en C; el orden por título solo se aplica a los elegidos
+            best = sorted(heapq.nlargest(limit, scores.items(), key=itemgetter(1)),
+                          key=lambda item: (-item[1], str(self._docs[item[0]][0]['title'] or '')))
+            return [dict(self._docs[key][0], score=score) for key, score in best]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "documents": len(self._docs),
+                "tokens": len(self._postings),
+                "built_at": self._built_at.isoformat() if self._built_at else None
+            }
+
+search_index = SearchIndex()
+
+@event.listens_for(SessionLocal, 'after_flush')
+def collect_search_changes(session, flush_context):
+    """Toma los documentos de búsqueda de lo escrito por el ORM; se aplican al confirmar"""
+    changes = None
+    for obj in session.new | session.dirty:
+        source = SEARCH_SOURCES.get(type(obj))
+        if source is not None:
+            if changes is None:
+                changes = session.info.setdefault('search_changes', [])
+            changes.append(source.document(obj.__dict__))
+    for obj in session.deleted:
+        source = SEARCH_SOURCES.get(type(obj))
+        if source is not None:
+            if changes is None:
+                changes = session.info.setdefault('search_changes', [])
+            changes.append(((source.kind, obj.__dict__.get('id')), None))
+
+@event.listens_for(SessionLocal, 'after_commit')
+def sync_search_index(session):
+    changes = session.info.pop('search_changes', None)
+    if changes:
+        search_index.apply_changes(changes)
+
+@event.listens_for(SessionLocal, 'after_rollback')
+def discard_search_changes(session):
+    session.info.pop('search_changes', None)
+
+SEARCH_KINDS = {source.kind for source in SEARCH_SOURCES.values()}
+
+@api_router.get("/search")
+def global_search(q: str, types: Optional[str] = None, limit: int = 20, current_user: UserDB = Depends(get_current_user)):
+    """Búsqueda en clientes, contactos, productos, solicitudes y cotizaciones.
+
+    types: lista separada por comas (client, contact, product, request, quote).
+    Cada resultado trae type, id, title, subtitle, score y campos propios del tipo.
+    """
+    kinds = None
+    if types:
+        kinds = {t.strip() for t in types.split(',') if t.strip()}
+        unknown = kinds - SEARCH_KINDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Tipos de búsqueda desconocidos: {', '.join(sorted(unknown))}")
+    limit = min(max(limit, 1), SEARCH_MAX_LIMIT)
+
+    started = perf_counter()
+    search_index.ensure_fresh()
+    results = search_index.search(q, kinds, limit)
+    return FastJSONResponse({
+        "query": q,
+        "results": results,
+        "took_ms": round((perf_counter() - started) * 1000, 2)
+    })
+
+# ============ BULK IMPORT ============
+
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 500))
+IMPORT_MAX_ERRORS = int(os.environ.get('IMPORT_MAX_ERRORS', 1000))
+IMPORT_READ_SIZE = 64 * 1024
+
+def _import_text(value):
+    value = str(value).strip()
+    return value or None
+
+def _import_float(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return float(str(value).strip().replace(',', '.'))
+
+def _import_int(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    return int(_import_float(value))
+
+def _import_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 'si', 'sí', 'yes', 'x'):
+        return True
+    if text in ('0', 'false', 'no', ''):
+        return False
+    raise ValueError(value)
+
+def _import_date(value):
+    text = str(value).strip()
+    if 'T' in text:
+        return datetime.fromisoformat(text.replace('Z', '+00:00')).date()
+    return datetime.strptime(text, '%Y-%m-%d').date()
+
+def _import_choice(enum_cls):
+    choices = {member.value for member in enum_cls}
+    def convert(value):
+        text = str(value).strip().lower()
+        if text not in choices:
+            raise ValueError(value)
+        return text
+    return convert
+
+class ImportSpec:
+    """Describe cómo convertir un registro importado en una fila de `model`.
+
+    fields: {columna: (conversor, valor_por_defecto)}. Los valores vacíos toman
+    el valor por defecto; un conversor que lanza ValueError marca la fila como
+    inválida. finish(row) completa los campos derivados, igual que el endpoint
+    de creación individual.
+    """
+
+    def __init__(self, model, fields: dict, required: tuple, aliases: Optional[dict] = None,
+                 finish=None, catalog_table: Optional[str] = None):
+        self.model = model
+        self.fields = fields
+        self.required = required
+        self.aliases = aliases or {}
+        self.finish = finish
+        self.catalog_table = catalog_table
+        self.has_client = 'client_id' in fields
+
+    def build(self, record: dict) -> dict:
+        record = {str(k).strip().lower(): v for k, v in record.items() if k is not None}
+        for alias, column in self.aliases.items():
+            if alias in record and column not in record:
+                record[column] = record[alias]
+        row = {}
+        for name, (convert, default) in self.fields.items():
+            raw = record.get(name)
+            if raw is None or (isinstance(raw, str) and not raw.strip()):
+                row[name] = default
+                continue
+            try:
+                row[name] = convert(raw)
+            except (TypeError, ValueError):
+                raise ValueError(f"Valor inválido para '{name}': {raw}")
+        for name in self.required:
+            if row.get(name) in (None, ''):
+                raise ValueError(f"El campo '{name}' es requerido")
+        if self.finish:
+            self.finish(row)
+        row['id'] = str(uuid.uuid4())
+        return row
+
+def _finish_office(row: dict):
+    row['status'] = 'occupied' if row.get('client_id') else 'available'
+
+def _finish_product(row: dict):
+    if not row.get('sale_price'):
+        row['sale_price'] = row.get('base_price') or 0
+    row['low_stock'] = product_is_low_stock(ProductDB(**row))
+
+IMPORT_SPECS = {
+    'clients': ImportSpec(ClientDB, {
+        'company_name': (_import_text, None),
+        'rut': (_import_text, None),
+        'business_type': (_import_text, None),
+        'address': (_import_text, None),
+        'phone': (_import_text, None),
+        'email': (_import_text, None),
+        'contact_name': (_import_text, None),
+        'contact_phone': (_import_text, None),
+        'contact_email': (_import_text, None),
+        'notes': (_import_text, None),
+        'is_active': (_import_bool, True),
+    }, required=('company_name',)),
+    'offices': ImportSpec(OfficeDB, {
+        'office_number': (_import_text, None),
+        'floor': (_import_int, None),
+        'location': (_import_text, None),
+        'square_meters': (_import_float, None),
+        'capacity': (_import_int, None),
+        'client_id': (_import_text, None),
+        'sale_value_uf': (_import_float, 0.0),
+        'billed_value_uf': (_import_float, 0.0),
+        'cost_uf': (_import_float, 0.0),
+        'contract_start': (_import_date, None),
+        'contract_end': (_import_date, None),
+        'notes': (_import_text, None),
+    }, required=('office_number',), finish=_finish_office, catalog_table='offices'),
+    'parking-storage': ImportSpec(ParkingStorageDB, {
+        'number': (_import_text, None),
+        'type': (_import_choice(ParkingType), 'parking'),
+        'location': (_import_text, None),
+        'status': (_import_choice(OfficeStatus), 'available'),
+        'client_id': (_import_text, None),
+        'sale_value_uf': (_import_float, 0.0),
+        'billed_value_uf': (_import_float, 0.0),
+        'cost_uf': (_import_float, 0.0),
+        'notes': (_import_text, None),
+    }, required=('number',)),
+    'products': ImportSpec(ProductDB, {
+        'name': (_import_text, None),
+        'description': (_import_text, ''),
+        'category_id': (_import_text, None),
+        'category': (_import_text, None),
+        'base_price': (_import_float, 0.0),
+        'sale_price': (_import_float, None),
+        'cost': (_import_float, 0.0),
+        'unit': (_import_text, None),
+        'commission_percentage': (_import_float, 0.0),
+        'min_order': (_import_int, 1),
+        'provider': (_import_text, ''),
+        'image_url': (_import_text, ''),
+        'featured': (_import_bool, False),
+        'featured_text': (_import_text, ''),
+        'stock_control_enabled': (_import_bool, False),
+        'current_stock': (_import_int, 0),
+        'min_stock_alert': (_import_int, 5),
+    }, required=('name',), aliases={'cost_price': 'cost'}, finish=_finish_product, catalog_table='products'),
+}
+
+def iter_json_records(stream, read_size: int = IMPORT_READ_SIZE):
+    """Itera los objetos de un arreglo JSON o de un archivo JSON Lines leyendo por bloques"""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+    while True:
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,[]':
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            buffer, pos = stream.read(read_size), 0
+            eof = not buffer
+        if pos >= len(buffer):
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = stream.read(read_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield value
+        pos = end
+
+def iter_csv_records(stream):
+    """Itera las filas de un CSV como dicts; detecta ',' o ';' (Excel en español) en el encabezado"""
+    header = stream.readline()
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    lines = (line for chunk in ([header], stream) for line in chunk)
+    return csv.DictReader(lines, delimiter=delimiter)
+
+def iter_import_records(upload, fmt: Optional[str] = None):
+    """Elige el parser según el formato pedido, la extensión o el primer carácter del archivo"""
+    stream = codecs.getreader('utf-8-sig')(upload.file)
+    if fmt is None:
+        name = (upload.filename or '').lower()
+        if name.endswith('.csv'):
+            fmt = 'csv'
+        elif name.endswith(('.json', '.jsonl', '.ndjson')):
+            fmt = 'json'
+        else:
+            head = upload.file.read(IMPORT_READ_SIZE).decode('utf-8-sig', errors='ignore').lstrip()
+            upload.file.seek(0)
+            fmt = 'json' if head[:1] in ('[', '{') else 'csv'
+    if fmt == 'csv':
+        return iter_csv_records(stream)
+    if fmt == 'json':
+        return iter_json_records(stream)
+    raise HTTPException(status_code=400, detail="Formato no soportado (use csv o json)")
+
+class ImportReport:
+    def __init__(self, entity: str):
+        self.entity = entity
+        self.total_rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self.started = perf_counter()
+
+    def error(self, row_number: int, message: str):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"row": row_number, "error": message})
+
+    def as_dict(self) -> dict:
+        elapsed = perf_counter() - self.started
+        return {
+            "entity": self.entity,
+            "total_rows": self.total_rows,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.inserted / elapsed) if elapsed > 0 else None
+        }
+
+def _insert_import_rows(db: Session, spec: ImportSpec, rows: list, user_id: str):
+    """INSERT multi-fila más los efectos que haría el endpoint individual (rollup y stock inicial)"""
+    # Core insert: el bulk del ORM separa el executemany cada vez que cambia qué columnas son NULL
+    db.execute(insert(spec.model.__table__), rows)
+    totals = {}
+    for row in rows:
+        for key, value in rollup_snapshot(spec.model(**row)).items():
+            totals[key] = totals.get(key, 0) + value
+    apply_rollup_delta(db, {}, totals)
+    if spec.model is ProductDB:
+        movements = [
+            {'id': str(uuid.uuid4()), 'product_id': row['id'], 'quantity': row['current_stock'],
+             'reason': 'initial', 'created_by': user_id, 'created_at': datetime.utcnow()}
+            for row in rows if row.get('stock_control_enabled') and row.get('current_stock')
+        ]
+        if movements:
+            db.execute(insert(StockMovementDB), movements)
+
+def _flush_import_chunk(db: Session, spec: ImportSpec, chunk: list, report: ImportReport, user_id: str):
+    """Valida referencias del lote e inserta en una transacción; si falla, reintenta fila a fila"""
+    if spec.has_client:
+        client_ids = {row['client_id'] for _, row in chunk if row.get('client_id')}
+        existing = set()
+        if client_ids:
+            existing = {cid for (cid,) in db.query(ClientDB.id).filter(ClientDB.id.in_(client_ids))}
+        valid = []
+        for row_number, row in chunk:
+            if row.get('client_id') and row['client_id'] not in existing:
+                report.error(row_number, f"Cliente no encontrado: {row['client_id']}")
+            else:
+                valid.append((row_number, row))
+        chunk = valid
+    if not chunk:
+        return
+
+    try:
+        _insert_import_rows(db, spec, [row for _, row in chunk], user_id)
+        db.commit()
+        report.inserted += len(chunk)
+        return
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Lote de importación de {report.entity} falló ({e}); reintentando fila a fila")
+
+    for row_number, row in chunk:
+        try:
+            _insert_import_rows(db, spec, [row], user_id)
+            db.commit()
+            report.inserted += 1
+        except Exception as e:
+            db.rollback()
+            report.error(row_number, str(getattr(e, 'orig', e)))
+
+@api_router.post("/import/{entity}")
+def bulk_import(entity: str, file: UploadFile = File(...), format: Optional[str] = None,
+                db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)):
+    """Importación masiva desde CSV o JSON (arreglo o JSON Lines).
+
+    entity: clients, offices, parking-storage o products. Las columnas son las
+    mismas que acepta el endpoint de creación. Se procesa por lotes de
+    IMPORT_CHUNK_SIZE filas, cada uno en su propia transacción, y se retorna
+    un reporte con los errores por fila (numeradas desde 1, sin encabezado).
+    """
+    spec = IMPORT_SPECS.get(entity)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"Entidad de importación desconocida: {entity}")
+
+    report = ImportReport(entity)
+    chunk = []
+    try:
+        for record in iter_import_records(file, format):
+            report.total_rows += 1
+            if not isinstance(record, dict):
+                report.error(report.total_rows, "Cada registro debe ser un objeto")
+                continue
+            try:
+                chunk.append((report.total_rows, spec.build(record)))
+            except ValueError as e:
+                report.error(report.total_rows, str(e))
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                _flush_import_chunk(db, spec, chunk, report, current_user.id)
+                chunk = []
+        _flush_import_chunk(db, spec, chunk, report, current_user.id)
+    except HTTPException:
+        raise
+    except (ValueError, csv.Error) as e:
+        # Archivo mal formado: se insertan las filas válidas leídas hasta ahí y se informa dónde se detuvo
+        report.error(report.total_rows + 1, f"Archivo inválido: {e}")
+        _flush_import_chunk(db, spec, chunk, report, current_user.id)
+    finally:
+        if report.inserted and spec.catalog_table:
+            catalog_cache.bump(spec.catalog_table)
+        if report.inserted and spec.model in SEARCH_SOURCES:
+            search_index.invalidate()
+
+    logger.info(f"Importación de {entity} por {current_user.email}: {report.inserted}/{report.total_rows} filas")
+    return report.as_dict()
+
+# ============ ADMIN: SLOW QUERIES ============
+
+@api_router.get("/admin/slow-queries")
+def get_slow_queries(limit: int = 20, order: str = 'total', recent: int = 50, current_user: UserDB = Depends(get_current_user)):
+    """Sentencias lentas de este proceso agrupadas por forma normalizada (order: total, count o max)"""
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Solo administradores pueden ver las consultas lentas")
+    if order not in ('total', 'count', 'max'):
+        raise HTTPException(status_code=400, detail="order debe ser total, count o max")
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "pid": os.getpid(),
+        "top": slow_query_log.top(min(max(limit, 1), 200), order),
+        "recent": slow_query_log.recent(min(max(recent, 0), SLOW_QUERY_BUFFER_SIZE)),
+    }
+
+@api_router.delete("/admin/slow-queries")
+def reset_slow_queries(current_user: UserDB = Depends(get_current_user)):
+    if current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Solo administradores pueden limpiar las consultas lentas")
+    slow_query_log.reset()
+    return {"message": "Registro de consultas lentas reiniciado"}
+
 # ============ SEED ENDPOINTS ============
 
 @api_router.post("/seed-profiles")
@@ -2610,6 +5649,7 @@ def seed_profiles(db: Session = Depends(get_db)):
     if admin_user:
         admin_user.profile_id = admin_profile.id
         db.commit()
+        user_cache.invalidate(admin_user.id)
 
     return {"message": "Perfiles creados", "profiles": [admin_profile.name, receptionist_profile.name]}
 
@@ -2651,15 +5691,118 @@ def seed_database(db: Session = Depends(get_db)):
 
     return {"message": "Base de datos inicializada"}
 
-# ============ REGISTER ROUTER ============
+# ============ ARRANQUE EN FRÍO ============
+# Passenger lanza procesos bajo demanda y mata los inactivos: el request que
+# provoca el spawn espera toda la importación. Se mide el tiempo desde el spawn
+# hasta la primera respuesta y, en un hilo aparte, se precalienta lo que ese
+# primer request haría por primera vez: configurar los mappers, abrir conexiones
+# del pool y compilar las sentencias más usadas (quedan en la caché de SQL
+# compilado del motor).
+STARTUP_WARMUP = os.environ.get('STARTUP_WARMUP', 'true').lower() in ('1', 'true', 'yes')
+DB_POOL_WARM = min(int(os.environ.get('DB_POOL_WARM', 2)), DB_POOL_SIZE)
+
+def process_started_at() -> float:
+    """Epoch en que se lanzó este proceso (Linux); sin /proc, el inicio de la importación"""
+    import time as time_module
+    try:
+        with open('/proc/self/stat') as f:
+            # starttime (campo 22) en ticks desde el arranque del SO; el nombre del
+            # proceso va entre paréntesis y puede tener espacios
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        age = time_module.clock_gettime(time_module.CLOCK_BOOTTIME) - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return IMPORT_STARTED_AT
+    return epoch_seconds() - age if age >= 0 else IMPORT_STARTED_AT
+
+class StartupTimer:
+    """Tiempos de arranque de este proceso: spawn -> módulo importado -> primera respuesta"""
+
+    def __init__(self):
+        self.spawned_at = process_started_at()
+        self.import_seconds = None
+        self.warmup_seconds = None
+        self.first_response_seconds = None
+        self.first_response_pending = True
+        self._lock = threading.Lock()
+
+    def imported(self):
+        self.import_seconds = epoch_seconds() - self.spawned_at
+        metrics.observe('tna_process_startup_seconds', (), self.import_seconds, STARTUP_BUCKETS)
+        logger.info(f"Módulo importado {self.import_seconds:.3f}s después del spawn del proceso")
+
+    def first_response(self, path: str):
+        with self._lock:
+            if not self.first_response_pending:
+                return
+            self.first_response_pending = False
+        self.first_response_seconds = epoch_seconds() - self.spawned_at
+        metrics.observe('tna_process_first_response_seconds', (), self.first_response_seconds, STARTUP_BUCKETS)
+        logger.info(f"Primer request ({path}) atendido {self.first_response_seconds:.3f}s después del spawn del proceso")
+
+    def stats(self) -> dict:
+        def rounded(value):
+            return round(value, 3) if value is not None else None
+        return {
+            "spawned_at": datetime.fromtimestamp(self.spawned_at, timezone.utc).isoformat(),
+            "schema": schema_status,
+            "import_seconds": rounded(self.import_seconds),
+            "warmup_seconds": rounded(self.warmup_seconds),
+            "first_response_seconds": rounded(self.first_response_seconds),
+        }
+
+startup_timer = StartupTimer()
+
+# Consultas de los endpoints más usados, con la misma forma que en ellos (la
+# caché de SQL compilado se indexa por la estructura, no por los valores)
+WARMUP_QUERIES = (
+    lambda db: load_user(db, ''),
+    lambda db: find_user_by_email(db, ''),
+    lambda db: paginated_rows(db.query(TicketDB).options(selectinload(TicketDB.items)), TicketDB.ticket_date, TicketDB.id, 1, None),
+)
+
+def warm_up():
+    """Precalienta el proceso recién lanzado. El pool async no se precalienta:
+    sus conexiones quedan atadas al event loop que las abre."""
+    started = perf_counter()
+    try:
+        configure_mappers()
+        connections = []
+        try:
+            for _ in range(DB_POOL_WARM):
+                connections.append(engine.connect())
+        finally:
+            for conn in connections:
+                conn.close()
+        db = SessionLocal()
+        try:
+            for query in WARMUP_QUERIES:
+                query(db)
+        finally:
+            db.close()
+    except Exception as e:
+        logger.warning(f"Precalentamiento incompleto: {e}")
+    startup_timer.warmup_seconds = perf_counter() - started
 
-app.include_router(api_router)
+if STARTUP_WARMUP:
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+startup_timer.imported()
 
 # ============ HEALTH CHECK ============
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "database": "MariaDB", "version": "2.0.0"}
+    return {"status": "healthy", "database": "MariaDB", "version": "2.0.0", "password_pool": password_hasher.stats(),
+            "startup": startup_timer.stats()}
+
+@app.get("/metrics")
+def metrics_endpoint(request: Request):
+    """Métricas en formato Prometheus, sumadas entre todos los procesos de Passenger"""
+    # El host de cPanel es público: sin token no se exponen tráfico, latencias ni el pool
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=403, detail="Métricas deshabilitadas: definir METRICS_TOKEN")
+    if request.headers.get('authorization') != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Token de métricas inválido")
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/debug-db")
 def debug_db():